@@ -0,0 +1 @@
+"""Benchmarks and a fake 3x-UI panel for them."""
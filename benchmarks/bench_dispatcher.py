@@ -0,0 +1,381 @@
+"""End-to-end load test of the bot: synthetic updates through ``main.dp``.
+
+Usage::
+
+    python -m benchmarks.bench_dispatcher --updates 2000 --concurrency 1 8 32
+    python -m benchmarks.bench_dispatcher --mix vless=8,create=1,start=1 --tg-latency 0.05
+
+Updates go through the real dispatcher, middlewares and ``BotHandlers``.
+Outgoing Bot API calls are recorded by ``RecordingSession`` instead of being
+sent, the panel is ``FakePanel`` and the database is a temporary SQLite
+file. Reported per run: updates/sec, latency histograms per command and
+SQL statement timings, where slow writes are time spent waiting for the
+SQLite write lock.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Upper bounds of the latency histogram buckets, milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf")]
+
+
+class Histogram:
+    """Latency histogram with fixed buckets that also keeps raw samples."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS_MS)
+        self.samples: List[float] = []
+
+    def observe(self, value_ms: float) -> None:
+        self.samples.append(value_ms)
+        for index, bound in enumerate(BUCKETS_MS):
+            if value_ms <= bound:
+                self.counts[index] += 1
+                break
+
+    def percentile(self, share: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, round(share * (len(ordered) - 1)))]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": len(self.samples),
+            "total_ms": round(sum(self.samples), 3),
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p90_ms": round(self.percentile(0.90), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(max(self.samples, default=0.0), 3),
+            "buckets": {
+                ("+inf" if bound == float("inf") else f"le_{bound:g}ms"): count
+                for bound, count in zip(BUCKETS_MS, self.counts)
+                if count
+            },
+        }
+
+
+def configure_environment(workdir: str, args: argparse.Namespace) -> None:
+    """Settings for the bot process; must run before project modules load."""
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:bench")
+    os.environ.setdefault("THREEX_HASH_PANEL", "bench")
+    os.environ["PANEL_MAX_CONCURRENCY"] = str(args.panel_concurrency)
+    if not args.throttle:
+        os.environ["THROTTLE_USER_RATE"] = "1000000"
+        os.environ["THROTTLE_USER_BURST"] = "1000000"
+        os.environ["THROTTLE_COMMAND_PER_MINUTE"] = "{}"
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    # main.py adds a file log sink relative to the working directory
+    os.chdir(workdir)
+
+
+def make_session_class():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import SendMessage
+    from aiogram.types import Chat, Message
+
+    class RecordingSession(BaseSession):
+        """Bot session that records API calls instead of sending them."""
+
+        def __init__(self, latency: float = 0.0) -> None:
+            super().__init__()
+            self.latency = latency
+            self.calls: Counter = Counter()
+            self._message_id = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls[type(method).__name__] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if isinstance(method, SendMessage):
+                self._message_id += 1
+                return Message(
+                    message_id=self._message_id,
+                    date=int(time.time()),
+                    chat=Chat(id=int(method.chat_id), type="private"),
+                    text=method.text,
+                )
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            if False:
+                yield b""
+
+        async def close(self) -> None:
+            pass
+
+    return RecordingSession
+
+
+class SqlTimer:
+    """Time every SQL statement through SQLAlchemy cursor events."""
+
+    def __init__(self, engine) -> None:
+        from sqlalchemy import event
+
+        self.reads = Histogram()
+        self.writes = Histogram()
+        self.locked_errors = 0
+        self._event = event
+        self._engine = engine.sync_engine
+        self._listeners = [
+            ("before_cursor_execute", self._before),
+            ("after_cursor_execute", self._after),
+            ("handle_error", self._error),
+        ]
+        for name, listener in self._listeners:
+            event.listen(self._engine, name, listener)
+
+    def remove(self) -> None:
+        for name, listener in self._listeners:
+            self._event.remove(self._engine, name, listener)
+
+    def reset(self) -> None:
+        self.reads, self.writes, self.locked_errors = Histogram(), Histogram(), 0
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("bench_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = (time.perf_counter() - conn.info["bench_started"].pop()) * 1000
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        (self.reads if verb == "SELECT" else self.writes).observe(elapsed)
+
+    def _error(self, context) -> None:
+        context.connection.info.get("bench_started", [None]).pop()
+        if "locked" in str(context.original_exception).lower():
+            self.locked_errors += 1
+
+
+def parse_mix(value: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in value.split(","):
+        command, _, weight = part.partition("=")
+        mix.append((command.strip().lstrip("/"), int(weight or 1)))
+    return mix
+
+
+def make_updates(args: argparse.Namespace, panel_emails: List[str], run_id: int) -> List[Any]:
+    """Synthetic private-chat updates for the configured command mix.
+
+    ``/vless`` comes from users that already have a client on the panel,
+    ``/create`` and ``/start`` from fresh users so creates really provision.
+    """
+    from aiogram.types import Chat, Message, Update, User
+
+    rng = random.Random(args.seed + run_id)
+    commands, weights = zip(*parse_mix(args.mix))
+    updates = []
+    for index in range(args.updates):
+        command = rng.choices(commands, weights)[0]
+        if command == "vless" and panel_emails:
+            username = panel_emails[rng.randrange(len(panel_emails))]
+            user_id = 1_000_000 + int(username.removeprefix("user") or 0)
+        else:
+            user_id = 10_000_000 * (run_id + 1) + index
+            username = f"load{run_id}_{index}"
+        updates.append(Update(
+            update_id=index + 1,
+            message=Message(
+                message_id=index + 1,
+                date=int(time.time()),
+                chat=Chat(id=user_id, type="private", username=username),
+                from_user=User(id=user_id, is_bot=False, first_name=username, username=username),
+                text=f"/{command}",
+            ),
+        ))
+    return updates
+
+
+async def run_load(dp, bot, updates: List[Any], concurrency: int) -> Tuple[float, Dict[str, Histogram], int]:
+    """Feed ``updates`` with ``concurrency`` workers, like the webhook pool."""
+    from service.middlewares import get_command
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+    latencies: Dict[str, Histogram] = defaultdict(Histogram)
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            update = queue.get_nowait()
+            command = get_command(update.message) or "other"
+            start = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+            elapsed = (time.perf_counter() - start) * 1000
+            latencies[command].observe(elapsed)
+            latencies["all"].observe(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, errors
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from aiogram import Bot
+    from loguru import logger
+
+    import main as bot_main
+    from benchmarks.fake_panel import FakePanel
+    from database.base import db_manager
+    from database.cache import user_cache
+    from database.write_buffer import write_buffer
+    from service.panel_registry import panel_registry
+    from service.threex_ui_client import ThreeXUIClient
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    panel = FakePanel(
+        inbounds=args.inbounds,
+        clients=args.clients,
+        latency=args.panel_latency,
+        jitter=args.panel_jitter,
+        seed=args.seed,
+    )
+    client = ThreeXUIClient(name="bench", transport=panel)
+    panel_registry.nodes = {client.name: client}
+    session = make_session_class()(latency=args.tg_latency)
+    bot = Bot(token=os.environ["TELEGRAM_TOKEN"], session=session)
+
+    await db_manager.init_db()
+    write_buffer.start()
+    sql = SqlTimer(db_manager.engine)
+    panel_emails = list(panel.emails)
+    await panel_registry.get_snapshots()
+
+    runs = []
+    try:
+        for run_id, concurrency in enumerate(args.concurrency):
+            updates = make_updates(args, panel_emails, run_id)
+            user_cache.clear()
+            panel.reset_counters()
+            session.calls.clear()
+            sql.reset()
+            elapsed, latencies, errors = await run_load(bot_main.dp, bot, updates, concurrency)
+            flush_started = time.perf_counter()
+            await write_buffer.flush()
+            flush_ms = (time.perf_counter() - flush_started) * 1000
+
+            result = {
+                "concurrency": concurrency,
+                "updates": len(updates),
+                "seconds": round(elapsed, 3),
+                "updates_per_sec": round(len(updates) / elapsed, 1),
+                "errors": errors,
+                "latency": {command: hist.summary() for command, hist in sorted(latencies.items())},
+                "sql": {
+                    "reads": sql.reads.summary(),
+                    "writes": sql.writes.summary(),
+                    "locked_errors": sql.locked_errors,
+                    "final_flush_ms": round(flush_ms, 3),
+                },
+                "panel_requests": dict(panel.requests),
+                "bot_calls": dict(session.calls),
+                "user_cache": {"hits": user_cache.hits, "misses": user_cache.misses},
+            }
+            runs.append(result)
+            print_run(result)
+    finally:
+        sql.remove()
+        await write_buffer.stop()
+        await panel_registry.close()
+        await db_manager.close()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "mix": args.mix,
+            "clients": args.clients,
+            "inbounds": args.inbounds,
+            "panel_latency": args.panel_latency,
+            "tg_latency": args.tg_latency,
+            "throttle": args.throttle,
+        },
+        "runs": runs,
+    }
+
+
+def print_run(result: Dict[str, Any]) -> None:
+    print(
+        f"\nconcurrency={result['concurrency']}: {result['updates']} updates in "
+        f"{result['seconds']}s -> {result['updates_per_sec']} updates/s, errors={result['errors']}"
+    )
+    for command, summary in result["latency"].items():
+        print(
+            f"  /{command:<10} n={summary['count']:<6} p50={summary['p50_ms']:>9.3f}ms "
+            f"p90={summary['p90_ms']:>9.3f}ms p99={summary['p99_ms']:>9.3f}ms max={summary['max_ms']:>9.3f}ms"
+        )
+    sql = result["sql"]
+    for kind in ("reads", "writes"):
+        summary = sql[kind]
+        print(
+            f"  sql {kind:<7} n={summary['count']:<6} p50={summary['p50_ms']:>9.3f}ms "
+            f"p99={summary['p99_ms']:>9.3f}ms max={summary['max_ms']:>9.3f}ms total={summary['total_ms']:.0f}ms"
+        )
+    print(f"  sql locked errors={sql['locked_errors']} final flush={sql['final_flush_ms']:.1f}ms")
+    print(f"  panel requests={result['panel_requests']} bot calls={result['bot_calls']}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--updates", type=int, default=1000, help="updates per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="worker counts, one run each")
+    parser.add_argument("--mix", default="start=2,vless=6,create=2",
+                        help="command weights, e.g. vless=8,create=1,start=1")
+    parser.add_argument("--clients", type=int, default=1000, help="clients preloaded on the panel")
+    parser.add_argument("--inbounds", type=int, default=2)
+    parser.add_argument("--panel-latency", type=float, default=0.0, help="seconds per panel response")
+    parser.add_argument("--panel-jitter", type=float, default=0.0)
+    parser.add_argument("--tg-latency", type=float, default=0.0, help="seconds per Bot API call")
+    parser.add_argument("--panel-concurrency", type=int, default=1000,
+                        help="PANEL_MAX_CONCURRENCY for the run")
+    parser.add_argument("--throttle", action="store_true",
+                        help="keep the per-user rate limits from settings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="result file (default benchmarks/results/dispatcher-<ts>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    output = (args.output or RESULTS_DIR / f"dispatcher-{time.strftime('%Y%m%d-%H%M%S')}.json").resolve()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(tmp, args)
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Benchmarks of ThreeXUIClient and VlessService against the fake panel.
+
+Usage::
+
+    python -m benchmarks.bench_panel --sizes 100 1000 10000 50000
+    python -m benchmarks.bench_panel --baseline benchmarks/results/panel-<ts>.json
+
+Every operation is timed per call (p50/p90/p99/max), panel requests are
+counted per endpoint and peak memory of one extra call is measured with
+tracemalloc. Results are written as JSON; with ``--baseline`` the p50 of
+each operation is compared against an earlier run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import count
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(share * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def configure_environment(db_path: str) -> None:
+    """Point settings at a temporary database before project modules load."""
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("THREEX_HASH_PANEL", "bench")
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:bench")
+
+
+async def measure(
+    name: str,
+    clients: int,
+    operation: Callable[[int], Awaitable[Any]],
+    panel: Any,
+    iterations: int,
+) -> Dict[str, Any]:
+    """Run ``operation(i)`` ``iterations`` times and collect statistics."""
+    panel.reset_counters()
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await operation(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    requests = dict(panel.requests)
+
+    tracemalloc.start()
+    await operation(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "operation": name,
+        "clients": clients,
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p90_ms": round(percentile(latencies, 0.90), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(max(latencies), 3),
+        "requests": requests,
+        "requests_per_op": round(sum(requests.values()) / iterations, 3),
+        "peak_mem_kb": round(peak / 1024, 1),
+    }
+
+
+async def bench_size(clients: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from benchmarks.fake_panel import FakePanel
+    from database.cache import user_cache
+    from service.panel_registry import panel_registry
+    from service.threex_ui_client import ThreeXUIClient
+    from service.vless_service import VlessService
+
+    panel = FakePanel(
+        inbounds=args.inbounds,
+        clients=clients,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+    )
+    client = ThreeXUIClient(name="bench", transport=panel)
+    panel_registry.nodes = {client.name: client}
+    user_cache.clear()
+    service = VlessService()
+    iterations = max(3, min(args.iterations, args.iterations * 1000 // clients))
+    emails = list(panel.emails)
+    new_names = (f"bench-new-{clients}-{i}" for i in count())
+
+    def cold(call: Callable[[int], Awaitable[Any]]) -> Callable[[int], Awaitable[Any]]:
+        async def run(i: int) -> Any:
+            client.inbound_cache.invalidate()
+            return await call(i)
+        return run
+
+    def pick(i: int) -> str:
+        return emails[(i * 7919) % len(emails)]
+
+    operations = [
+        ("get_all_inbounds", lambda i: client.get_all_inbounds()),
+        ("get_all_inbounds_lazy", lambda i: client.get_all_inbounds_lazy()),
+        ("get_inbound", lambda i: client.get_inbound(1)),
+        ("get_client_by_username.cold", cold(lambda i: client.get_client_by_username(pick(i)))),
+        ("get_client_by_username.cached", lambda i: client.get_client_by_username(pick(i))),
+        ("get_vless_url_by_username.cached", lambda i: client.get_vless_url_by_username(pick(i))),
+        ("get_online", lambda i: client.get_online()),
+        ("VlessService.get_vless_link.db_miss", cold(lambda i: service.get_vless_link(pick(i)))),
+        ("VlessService.create_vless_client", lambda i: service.create_vless_client(next(new_names))),
+    ]
+
+    await client.login()
+    results = []
+    for name, operation in operations:
+        if args.only and not any(part in name for part in args.only):
+            continue
+        result = await measure(name, clients, operation, panel, iterations)
+        results.append(result)
+        print(
+            f"{clients:>6} {name:<40} p50={result['p50_ms']:>9.3f}ms "
+            f"p99={result['p99_ms']:>9.3f}ms req/op={result['requests_per_op']:<6} "
+            f"peak={result['peak_mem_kb']:.0f}KB",
+            flush=True,
+        )
+    await client.close()
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path) -> None:
+    baseline = {
+        (item["clients"], item["operation"]): item
+        for item in json.loads(baseline_path.read_text())["results"]
+    }
+    print(f"\nComparison with {baseline_path}:")
+    for item in results:
+        before = baseline.get((item["clients"], item["operation"]))
+        if not before or not before["p50_ms"]:
+            continue
+        ratio = item["p50_ms"] / before["p50_ms"]
+        marker = "  REGRESSION" if ratio > 1.2 else ""
+        print(
+            f"{item['clients']:>6} {item['operation']:<40} "
+            f"p50 {before['p50_ms']:.3f} -> {item['p50_ms']:.3f}ms (x{ratio:.2f}){marker}"
+        )
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import database.models  # noqa: F401  register tables before init_db
+    from database.base import db_manager
+
+    await db_manager.init_db()
+    results = []
+    for clients in args.sizes:
+        results.extend(await bench_size(clients, args))
+    await db_manager.close()
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "inbounds": args.inbounds,
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--iterations", type=int, default=50,
+                        help="calls per operation at 1k clients, scaled down for larger sizes")
+    parser.add_argument("--inbounds", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="injected panel latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--only", nargs="*", help="run operations whose name contains any of these")
+    parser.add_argument("--output", type=Path, help="result file (default benchmarks/results/panel-<ts>.json)")
+    parser.add_argument("--baseline", type=Path, help="earlier result file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(os.path.join(tmp, "bench.db"))
+        from loguru import logger
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+        report = asyncio.run(run(args))
+
+    output = args.output or RESULTS_DIR / f"panel-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+    if args.baseline:
+        compare(report["results"], args.baseline)
+
+
+if __name__ == "__main__":
+    main()
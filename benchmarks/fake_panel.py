@@ -0,0 +1,279 @@
+"""In-process stand-in for the 3x-UI panel API.
+
+``FakePanel`` is an ``httpx.MockTransport`` that keeps inbounds and clients
+in memory and serves the endpoints used by ``ThreeXUIClient``. Latency,
+errors and session expiry can be injected, and every request is counted
+per endpoint.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+import httpx
+
+SESSION_COOKIE = "3x-ui"
+
+# (method, path pattern, endpoint name, handler method)
+ENDPOINTS = [
+    ("POST", re.compile(r"/login$"), "login", "_login"),
+    ("GET", re.compile(r"/panel/api/inbounds/list$"), "list", "_list"),
+    ("GET", re.compile(r"/panel/api/inbounds/get/(?P<id>\d+)$"), "get", "_get"),
+    ("POST", re.compile(r"/panel/api/inbounds/addClient$"), "addClient", "_add_client"),
+    ("POST", re.compile(r"/panel/api/inbounds/updateClient/(?P<uuid>[^/]+)$"), "updateClient", "_update_client"),
+    ("POST", re.compile(r"/panel/api/inbounds/(?P<id>\d+)/delClient/(?P<uuid>[^/]+)$"), "delClient", "_del_client"),
+    ("POST", re.compile(r"/panel/api/inbounds/onlines$"), "onlines", "_onlines"),
+    ("POST", re.compile(r"/panel/api/inbounds/reload$"), "reload", "_reload"),
+]
+
+
+def make_client(email: str, now_ms: int) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "flow": "",
+        "email": email,
+        "limitIp": 0,
+        "totalGB": 0,
+        "expiryTime": 0,
+        "enable": True,
+        "tgId": "",
+        "subId": uuid.uuid4().hex[:16],
+        "comment": "",
+        "reset": 0,
+        "created_at": now_ms,
+        "updated_at": now_ms,
+    }
+
+
+def make_stat(
+    client: Dict[str, Any], inbound_id: int, stat_id: int, rng: random.Random
+) -> Dict[str, Any]:
+    return {
+        "id": stat_id,
+        "inboundId": inbound_id,
+        "enable": client["enable"],
+        "email": client["email"],
+        "up": rng.randint(0, 10 ** 9),
+        "down": rng.randint(0, 10 ** 10),
+        "allTime": 0,
+        "expiryTime": client["expiryTime"],
+        "total": client["totalGB"],
+        "reset": 0,
+    }
+
+
+def make_stream_settings(port: int) -> Dict[str, Any]:
+    return {
+        "network": "tcp",
+        "security": "reality",
+        "externalProxy": [],
+        "realitySettings": {
+            "show": False,
+            "xver": 0,
+            "dest": "example.com:443",
+            "serverNames": ["example.com"],
+            "privateKey": "private-key",
+            "shortIds": ["0123abcd"],
+            "settings": {
+                "publicKey": "public-key",
+                "fingerprint": "chrome",
+                "serverName": "",
+                "spiderX": "/",
+            },
+        },
+        "tcpSettings": {"acceptProxyProtocol": False, "header": {"type": "none"}},
+    }
+
+
+class FakeInbound:
+    """Inbound state; nested JSON strings are rebuilt only after a change."""
+
+    def __init__(self, inbound_id: int, port: int, rng: random.Random):
+        self.id = inbound_id
+        self.rng = rng
+        self.port = port
+        self.clients: List[Dict[str, Any]] = []
+        self.stats: List[Dict[str, Any]] = []
+        self.stream_settings = json.dumps(make_stream_settings(port))
+        self._settings_json: Optional[str] = None
+
+    def add(self, client: Dict[str, Any]) -> None:
+        self.clients.append(client)
+        self.stats.append(make_stat(client, self.id, len(self.stats) + 1, self.rng))
+        self._settings_json = None
+
+    def to_json(self) -> Dict[str, Any]:
+        if self._settings_json is None:
+            self._settings_json = json.dumps(
+                {"clients": self.clients, "decryption": "none", "fallbacks": []}
+            )
+        return {
+            "id": self.id,
+            "up": 0,
+            "down": 0,
+            "total": 0,
+            "allTime": 0,
+            "remark": f"inbound-{self.id}",
+            "enable": True,
+            "expiryTime": 0,
+            "listen": "",
+            "port": self.port,
+            "protocol": "vless",
+            "tag": f"inbound-{self.port}",
+            "clientStats": self.stats,
+            "settings": self._settings_json,
+            "streamSettings": self.stream_settings,
+            "sniffing": json.dumps({
+                "enabled": False, "destOverride": [], "metadataOnly": False, "routeOnly": False,
+            }),
+        }
+
+
+class FakePanel(httpx.MockTransport):
+    """Mock 3x-UI panel.
+
+    :param inbounds: number of vless inbounds
+    :param clients: total number of clients spread over the inbounds
+    :param latency: seconds added to every response
+    :param jitter: random extra latency up to this many seconds
+    :param error_rate: share of non-login requests answered with HTTP 500
+    :param expire_every: expire the session after this many requests (0 = never)
+    """
+
+    def __init__(
+        self,
+        inbounds: int = 1,
+        clients: int = 100,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        expire_every: int = 0,
+        online_share: float = 0.1,
+        seed: int = 0,
+    ):
+        super().__init__(self.handle)
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.expire_every = expire_every
+        self.requests: Counter = Counter()
+        self.inbounds: Dict[int, FakeInbound] = {}
+        self.emails: Dict[str, int] = {}
+        self._session: Optional[str] = None
+        self._since_login = 0
+        now_ms = int(time.time() * 1000)
+        for index in range(inbounds):
+            self.inbounds[index + 1] = FakeInbound(index + 1, 443 + index, self.rng)
+        for index in range(clients):
+            inbound = self.inbounds[index % inbounds + 1]
+            email = f"user{index}"
+            inbound.add(make_client(email, now_ms))
+            self.emails[email] = inbound.id
+        self.online = [email for email in self.emails if self.rng.random() < online_share]
+
+    def reset_counters(self) -> None:
+        self.requests.clear()
+
+    @staticmethod
+    def _json(payload: Dict[str, Any], **kwargs: Any) -> httpx.Response:
+        return httpx.Response(200, json=payload, **kwargs)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.rng.random() * self.jitter)
+        path = request.url.path
+        for method, pattern, name, handler in ENDPOINTS:
+            match = pattern.search(path)
+            if match and request.method == method:
+                break
+        else:
+            self.requests["unknown"] += 1
+            return httpx.Response(404)
+        self.requests[name] += 1
+
+        if name == "login":
+            return self._login(request, match)
+        if self._session is None or request.headers.get("cookie", "").find(self._session) < 0:
+            return self._json({"success": False, "msg": "The login time limit has expired. Please log in again."})
+        self._since_login += 1
+        if self.expire_every and self._since_login >= self.expire_every:
+            self._session = None
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return httpx.Response(500, text="injected error")
+        return getattr(self, handler)(request, match)
+
+    def _login(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        self._session = uuid.uuid4().hex
+        self._since_login = 0
+        return self._json(
+            {"success": True, "msg": "Login Successfully"},
+            headers={"set-cookie": f"{SESSION_COOKIE}={self._session}; Path=/; HttpOnly"},
+        )
+
+    def _list(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        return self._json({"success": True, "obj": [ib.to_json() for ib in self.inbounds.values()]})
+
+    def _get(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        inbound = self.inbounds.get(int(match.group("id")))
+        if inbound is None:
+            return self._json({"success": False, "msg": "record not found"})
+        return self._json({"success": True, "obj": inbound.to_json()})
+
+    def _add_client(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        form = {key: values[0] for key, values in parse_qs(request.content.decode()).items()}
+        inbound = self.inbounds.get(int(form.get("id", 0)))
+        if inbound is None:
+            return self._json({"success": False, "msg": "record not found"})
+        clients = json.loads(form["settings"])["clients"]
+        for client in clients:
+            if client["email"] in self.emails:
+                return self._json({"success": False, "msg": f"Duplicate email: {client['email']}"})
+        now_ms = int(time.time() * 1000)
+        for client in clients:
+            client.setdefault("subId", "")
+            client["created_at"] = client["updated_at"] = now_ms
+            inbound.add(client)
+            self.emails[client["email"]] = inbound.id
+        return self._json({"success": True, "msg": "Inbound client(s) have been added."})
+
+    def _update_client(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        form = {key: values[0] for key, values in parse_qs(request.content.decode()).items()}
+        inbound = self.inbounds.get(int(form.get("id", 0)))
+        if inbound is None:
+            return self._json({"success": False, "msg": "record not found"})
+        client = json.loads(form["settings"])["clients"][0]
+        for index, current in enumerate(inbound.clients):
+            if current["id"] == match.group("uuid"):
+                client["updated_at"] = int(time.time() * 1000)
+                inbound.clients[index] = {**current, **client}
+                for stat in inbound.stats:
+                    if stat["email"] == current["email"]:
+                        stat["enable"] = client.get("enable", True)
+                inbound._settings_json = None
+                return self._json({"success": True, "msg": "Inbound client has been updated."})
+        return self._json({"success": False, "msg": "client not found"})
+
+    def _del_client(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        inbound = self.inbounds.get(int(match.group("id")))
+        if inbound is None:
+            return self._json({"success": False, "msg": "record not found"})
+        for index, client in enumerate(inbound.clients):
+            if client["id"] == match.group("uuid"):
+                del inbound.clients[index]
+                inbound.stats = [stat for stat in inbound.stats if stat["email"] != client["email"]]
+                inbound._settings_json = None
+                self.emails.pop(client["email"], None)
+                return self._json({"success": True, "msg": "Inbound client has been deleted."})
+        return self._json({"success": False, "msg": "client not found"})
+
+    def _onlines(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        return self._json({"success": True, "obj": self.online or None})
+
+    def _reload(self, request: httpx.Request, match: re.Match) -> httpx.Response:
+        return self._json({"success": True, "msg": ""})
@@ -1,13 +1,57 @@
 """Configuration module for 3x-ui bot."""
 
+from typing import Dict, List
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
 
+class PanelNode(BaseModel):
+    """Connection settings of a single 3x-UI node."""
+    name: str
+    host: str
+    port: int = 8080
+    username: str = 'admin'
+    password: str = 'admin'
+    hash_panel: str = ''
+    spx: str = '2F'
+
+
 class Settings(BaseSettings):
     """Application settings."""
     
     # Telegram Bot
     TELEGRAM_TOKEN: str = ''
+    ADMIN_IDS: List[int] = []
+    # polling or webhook
+    BOT_MODE: str = 'polling'
+
+    # HTTP server (webhook and other endpoints)
+    HTTP_HOST: str = '0.0.0.0'
+    HTTP_PORT: int = 8081
+    # Prometheus endpoint; in polling mode the HTTP server runs only for it
+    METRICS_ENABLED: bool = True
+    METRICS_PATH: str = '/metrics'
+
+    # Subscriptions served at SUB_PATH/{subId}
+    SUB_ENABLED: bool = True
+    SUB_PATH: str = '/sub'
+    # Public base URL shown to users, e.g. https://bot.example.com/sub
+    SUB_URL: str = ''
+    # Hours between client refreshes, sent as Profile-Update-Interval
+    SUB_UPDATE_INTERVAL: int = 12
+    SUB_CACHE_SIZE: int = 10000
+
+    # Webhook
+    WEBHOOK_URL: str = ''
+    WEBHOOK_PATH: str = '/webhook'
+    # Required in webhook mode: Telegram sends it with every update
+    WEBHOOK_SECRET: str = ''
+    WEBHOOK_WORKERS: int = 8
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+    WEBHOOK_DRAIN_TIMEOUT: float = 10.0
+    # Only one process behind a load balancer needs to register the webhook
+    WEBHOOK_SET_ON_START: bool = True
     
     # 3x-UI Panel
     THREEX_HOST: str = '127.0.0.1'
@@ -16,19 +60,148 @@ class Settings(BaseSettings):
     THREEX_PASSWORD: str = 'admin'
     THREEX_HASH_PANEL: str = 'HASH'
     THREEX_SPX: str = '2F'
+    THREEX_TIMEOUT: float = 10.0
+    THREEX_CONNECT_TIMEOUT: float = 5.0
+    THREEX_POOL_MAX_CONNECTIONS: int = 20
+    THREEX_POOL_MAX_KEEPALIVE: int = 10
+    THREEX_KEEPALIVE_EXPIRY: float = 30.0
+    # Extra nodes as JSON list of PanelNode; empty means the single node above
+    THREEX_NODES: List[PanelNode] = []
+    THREEX_NODE_TIMEOUT: float = 5.0
+    # Retries of idempotent requests with jittered exponential back-off
+    THREEX_RETRIES: int = 2
+    THREEX_RETRY_BASE: float = 0.2
+    THREEX_RETRY_MAX: float = 2.0
+    # Consecutive failures that open a node's circuit, 0 disables it,
+    # and seconds before a probe request is let through
+    THREEX_BREAKER_THRESHOLD: int = 5
+    THREEX_BREAKER_RESET: float = 30.0
+    # Seconds before a slow read gets a duplicate request, 0 disables hedging
+    THREEX_HEDGE_DELAY: float = 2.0
+    # Panel sessions are stored in the database and renewed this many seconds
+    # before they expire; TTL is used when the cookie has no expiry
+    THREEX_SESSION_TTL: float = 3600.0
+    THREEX_SESSION_REFRESH_BEFORE: float = 300.0
     
     # Database
     DATABASE_URL: str = 'sqlite+aiosqlite:///db.sql'
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_BUSY_TIMEOUT: float = 5.0
+    USER_CACHE_SIZE: int = 10000
+    # Seconds a cached user is trusted; bounds staleness between processes
+    USER_CACHE_TTL: float = 60.0
+    DB_FLUSH_INTERVAL: float = 1.0
+    DB_FLUSH_BATCH: int = 200
     
     # Inbound
     INBOUND_ID: int = 1
+    INBOUND_CACHE_TTL: float = 30.0
+    # Max age of a snapshot served while it is refreshed or the panel is down
+    INBOUND_CACHE_MAX_STALE: float = 300.0
+
+    # Placement of new clients: least_clients, least_traffic or weighted
+    PLACEMENT_STRATEGY: str = 'least_clients'
+    # Inbound ids eligible for new clients; empty means every vless inbound
+    PLACEMENT_INBOUND_IDS: List[int] = []
+    PLACEMENT_CLIENTS_WEIGHT: float = 1.0
+    PLACEMENT_TRAFFIC_WEIGHT: float = 1.0
+    PLACEMENT_NODE_WEIGHTS: Dict[str, float] = {}
+
+    # Coalescing of addClient calls: creates arriving while a batch is in
+    # flight wait at most this many seconds for it
+    CREATE_BATCH_WINDOW: float = 0.05
+    CREATE_BATCH_MAX: int = 100
     
-    # Logging
+    # Traffic statistics
+    STATS_POLL_INTERVAL: float = 300.0
+    STATS_SAMPLE_RETENTION_DAYS: int = 7
+    STATS_HOURLY_RETENTION_DAYS: int = 31
+
+    # Background jobs (broadcasts, expiry, reconciliation, traffic stats) run
+    # in the one process holding a database lease of this many seconds;
+    # BACKGROUND_JOBS=false keeps a process from ever taking it
+    BACKGROUND_JOBS: bool = True
+    LEADER_LEASE_TTL: float = 30.0
+
+    # Panel-to-DB reconciliation, 0 disables the periodic run
+    RECONCILE_INTERVAL: float = 600.0
+    RECONCILE_BATCH: int = 500
+
+    # Xray reloads after client changes: seconds after the last change,
+    # and at most this long after the first one
+    RELOAD_WINDOW: float = 2.0
+    RELOAD_MAX_DELAY: float = 10.0
+
+    # Client export and import: users read per page, rows provisioned per batch,
+    # and max size of one exported file part sent by the bot
+    EXPORT_PAGE_SIZE: int = 1000
+    IMPORT_BATCH: int = 500
+    EXPORT_PART_SIZE: int = 45 * 1024 * 1024
+
+    # Expiry and quota enforcement
+    EXPIRY_ENABLED: bool = True
+    # Warnings sent this many seconds before a client expires
+    EXPIRY_WARN_BEFORE: List[int] = [259200, 86400]
+    # Warnings sent at these shares of the traffic quota
+    QUOTA_WARN_AT: List[float] = [0.8, 0.95]
+    # Disable expired and over-quota clients in the panel
+    EXPIRY_DISABLE: bool = True
+    # Concurrent updateClient requests when disabling clients
+    EXPIRY_BATCH: int = 20
+    # Max seconds between snapshot checks for quota changes
+    EXPIRY_REFRESH_INTERVAL: float = 60.0
+
+    # Online presence
+    PRESENCE_POLL_INTERVAL: float = 30.0
+    PRESENCE_NOTIFY_INTERVAL: float = 300.0
+    PRESENCE_PAGE_SIZE: int = 50
+
+    # Broadcasts: global and per-chat send rate, messages per second
+    BROADCAST_RATE: float = 30.0
+    BROADCAST_CHAT_RATE: float = 1.0
+    BROADCAST_CONCURRENCY: int = 10
+    # Recipients read and checkpointed per page
+    BROADCAST_PAGE_SIZE: int = 200
+    BROADCAST_MAX_RETRIES: int = 3
+
+    # Throttling of bot commands
+    THROTTLE_USER_RATE: float = 1.0
+    THROTTLE_USER_BURST: int = 5
+    THROTTLE_COMMAND_PER_MINUTE: Dict[str, int] = {'create': 3, 'remove': 3, 'vless': 20}
+    PANEL_COMMANDS: List[str] = ['vless', 'create', 'remove']
+    MUTATING_COMMANDS: List[str] = ['create', 'remove']
+    PANEL_MAX_CONCURRENCY: int = 20
+
+    # Logging: level of all sinks; file sink with JSON lines, empty LOG_FILE disables it
     LOG_LEVEL: str = 'INFO'
+    LOG_FILE: str = 'bot.log'
+    LOG_JSON: bool = True
+    LOG_ROTATION: str = '500 MB'
+    LOG_RETENTION: str = ''
+    # Share of records kept for high-volume events by sample key, and for unlisted keys
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+    LOG_SAMPLE_RATE: float = 0.1
     
     class Config:
         env_file = '.env'
         case_sensitive = True
 
+    def panel_nodes(self) -> List[PanelNode]:
+        """Configured panel nodes, falling back to the single THREEX_* node."""
+        if self.THREEX_NODES:
+            return list(self.THREEX_NODES)
+        return [
+            PanelNode(
+                name='default',
+                host=self.THREEX_HOST,
+                port=self.THREEX_PORT,
+                username=self.THREEX_USERNAME,
+                password=self.THREEX_PASSWORD,
+                hash_panel=self.THREEX_HASH_PANEL,
+                spx=self.THREEX_SPX,
+            )
+        ]
+
 
 settings = Settings()
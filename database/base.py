@@ -1,5 +1,7 @@
 """Database base configuration."""
 
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from config import settings
@@ -11,11 +13,31 @@ class Base(DeclarativeBase):
     pass
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Configure every new SQLite connection for concurrent access."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT * 1000)}")
+    cursor.close()
+
+
 class DatabaseManager:
     """Database connection manager."""
     
     def __init__(self, database_url: str = settings.DATABASE_URL):
-        self.engine = create_async_engine(database_url, echo=False)
+        url = make_url(database_url)
+        engine_kwargs = {}
+        self.is_sqlite = url.get_backend_name() == 'sqlite'
+        if self.is_sqlite and url.database not in (None, '', ':memory:'):
+            engine_kwargs.update(
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                connect_args={'timeout': settings.DB_BUSY_TIMEOUT},
+            )
+        self.engine = create_async_engine(database_url, echo=False, **engine_kwargs)
+        if self.is_sqlite:
+            event.listen(self.engine.sync_engine, 'connect', _set_sqlite_pragmas)
         self.session_maker = async_sessionmaker(
             self.engine,
             class_=AsyncSession,
@@ -30,8 +52,52 @@ class DatabaseManager:
         """Initialize database tables."""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await self._migrate(conn)
         logger.success("Database initialized")
-    
+
+    async def _migrate(self, conn) -> None:
+        """Bring databases created by older versions up to the current schema."""
+        def missing_user_indexes(sync_conn) -> bool:
+            existing = {index['name'] for index in inspect(sync_conn).get_indexes('users')}
+            return not {'ix_users_username', 'ix_users_tg_id'} <= existing
+
+        # Older versions inserted a row on every /start; the duplicates must go
+        # before the unique indexes can be created, which happens only once
+        if await conn.run_sync(missing_user_indexes):
+            await self._dedupe_users(conn)
+
+        def create_indexes(sync_conn) -> None:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(sync_conn, checkfirst=True)
+
+        await conn.run_sync(create_indexes)
+
+    async def _dedupe_users(self, conn) -> None:
+        """Drop duplicate users, keeping a copy in ``users_removed_duplicates``.
+
+        Per username the row with a link wins, then the newest one. Per
+        Telegram id the newest row wins, since it has the current username.
+        """
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS users_removed_duplicates AS SELECT * FROM users WHERE 0"
+        ))
+        for column, order in (('username', 'vless_link IS NULL, id DESC'), ('tg_id', 'id DESC')):
+            duplicates = (
+                f"SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY {column} ORDER BY {order}) AS n "
+                f"FROM users) WHERE n > 1"
+            )
+            removed = (await conn.execute(text(
+                f"SELECT id, username, tg_id, vless_link IS NOT NULL FROM users WHERE id IN ({duplicates})"
+            ))).all()
+            if not removed:
+                continue
+            await conn.execute(text(f"INSERT INTO users_removed_duplicates SELECT * FROM users WHERE id IN ({duplicates})"))
+            await conn.execute(text(f"DELETE FROM users WHERE id IN ({duplicates})"))
+            logger.warning(f"Removed {len(removed)} duplicate users by {column}, copies kept in users_removed_duplicates")
+            for user_id, username, tg_id, has_link in removed:
+                logger.warning(f"Removed duplicate user id={user_id} username={username} tg_id={tg_id} link={bool(has_link)}")
+
     async def close(self) -> None:
         """Close database connection."""
         await self.engine.dispose()
@@ -0,0 +1,83 @@
+"""In-process caches for database reads."""
+
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+from config import settings
+from database.models import Users
+from service.metrics import metrics, ratio
+
+
+class UserCache:
+    """Bounded LRU cache of users, looked up by username or tg_id.
+
+    Both keys of a user point to the same cached row; invalidating by either
+    key drops both. Writes of this process invalidate entries directly;
+    entries older than ``ttl`` seconds (0 = no limit) are re-read, which
+    bounds how long a write of another process goes unseen.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = 0.0):
+        # Max number of cached users, each takes two keys
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, Tuple[Users, float]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: Hashable) -> Optional[Users]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if self.ttl and time.monotonic() >= expires_at:
+            self.invalidate(username=user.username, tg_id=user.tg_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def get_by_username(self, username: str) -> Optional[Users]:
+        return self._get(('username', username))
+
+    def get_by_tg_id(self, tg_id: int) -> Optional[Users]:
+        return self._get(('tg_id', tg_id))
+
+    def put(self, user: Users) -> None:
+        self.invalidate(username=user.username, tg_id=user.tg_id)
+        entry = (user, time.monotonic() + self.ttl)
+        self._entries[('username', user.username)] = entry
+        self._entries[('tg_id', user.tg_id)] = entry
+        while len(self._entries) > self.maxsize * 2:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.invalidate(username=evicted.username, tg_id=evicted.tg_id)
+
+    def invalidate(self, username: Optional[str] = None, tg_id: Optional[int] = None) -> None:
+        for key in (('username', username), ('tg_id', tg_id)):
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                user = entry[0]
+                self._entries.pop(('username', user.username), None)
+                self._entries.pop(('tg_id', user.tg_id), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries) // 2
+
+
+# Shared by every UsersRepo so that writes invalidate all readers
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+metrics.callback(
+    "user_cache_requests_total", "User cache lookups by result", "counter", ("result",),
+    lambda: [(("hit",), user_cache.hits), (("miss",), user_cache.misses)],
+)
+metrics.callback(
+    "user_cache_hit_ratio", "Share of user lookups served from cache", "gauge", (),
+    lambda: [((), ratio(user_cache.hits, user_cache.misses))],
+)
+metrics.callback("user_cache_size", "Users held in cache", "gauge", (), lambda: [((), len(user_cache))])
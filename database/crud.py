@@ -1,10 +1,22 @@
 """Database repository for user operations."""
 
-from typing import Optional
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from loguru import logger
-from sqlalchemy import select, update, insert
-from database.models import Users as UserModels
+from sqlalchemy import bindparam, select, insert, delete, func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import settings
+from database.models import (
+    Users as UserModels, TrafficCounter, TrafficSample, TrafficRollup, Broadcast, BlockedUser, AppState,
+    ClientNotice, PanelSession, Lease,
+)
 from database.base import db_manager
+from database.cache import user_cache
+from database.write_buffer import write_buffer
+from service.metrics import metrics, timed
+
+DB_QUERY_SECONDS = metrics.histogram("db_query_seconds", "Database query latency", ("query",))
 
 
 class UsersRepo:
@@ -12,43 +24,420 @@ class UsersRepo:
     
     def __init__(self):
         self.db_manager = db_manager
+        self.cache = user_cache
+        self.write_buffer = write_buffer
 
     async def get_user_by_username(self, username: str) -> Optional[UserModels]:
         """Get user by username."""
+        user = self.cache.get_by_username(username)
+        if user is None:
+            user = await self._select_by_username(username)
+            if user is not None:
+                self.cache.put(user)
+        return self.write_buffer.apply(user, username=username)
+
+    @timed(DB_QUERY_SECONDS.labels("user_by_username"))
+    async def _select_by_username(self, username: str) -> Optional[UserModels]:
         async with self.db_manager.get_session() as session:
-            stmt = select(UserModels).where(UserModels.username == username)
-            result = await session.execute(stmt)
+            result = await session.execute(select(UserModels).where(UserModels.username == username))
             return result.scalar_one_or_none()
 
     async def add_new_users(self, username: str, tg_id: int) -> Optional[UserModels]:
-        """Add new user to database."""
-        async with self.db_manager.get_session() as session:
-            try:
-                stmt = insert(UserModels).values(username=username, tg_id=tg_id).returning(UserModels)
-                result = await session.execute(stmt)
-                await session.commit()
-                return result.scalar()
-            except Exception as e:
-                logger.error(f"DB Error: {e}")
-                await session.rollback()
-                return None
+        """Add new user or update username of an existing one.
+
+        The write is buffered; the returned user reflects it immediately.
+        """
+        cached = self.cache.get_by_tg_id(tg_id)
+        if cached is None or cached.username != username:
+            self.write_buffer.add_user(username, tg_id)
+        return self.write_buffer.apply(cached, tg_id=tg_id)
 
     async def update_users_vless_link(
         self, username: str, vless_link: str, vless_uuid: str
     ) -> Optional[UserModels]:
-        """Update user's VLESS link."""
+        """Update user's VLESS link.
+
+        The write is buffered; the returned user reflects it immediately.
+        """
+        self.write_buffer.set_link(username, vless_link, vless_uuid)
+        return await self.get_user_by_username(username)
+
+    @timed(DB_QUERY_SECONDS.labels("links_by_usernames"))
+    async def get_links(self, usernames: List[str], chunk: int = 500) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """(vless_link, vless_uuid) of the given users that exist in the database."""
+        links = {}
+        async with self.db_manager.get_session() as session:
+            for start in range(0, len(usernames), chunk):
+                result = await session.execute(
+                    select(UserModels.username, UserModels.vless_link, UserModels.vless_uuid)
+                    .where(UserModels.username.in_(usernames[start:start + chunk]))
+                )
+                for username, link, uuid in result:
+                    links[username] = (link, uuid)
+        return links
+
+    @timed(DB_QUERY_SECONDS.labels("linked_usernames"))
+    async def get_linked_usernames(self, after_id: int, limit: int) -> List[Tuple[int, str]]:
+        """Page of (id, username) of users that have a stored link, keyset by id."""
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(
+                select(UserModels.id, UserModels.username)
+                .where(UserModels.id > after_id, UserModels.vless_link.is_not(None))
+                .order_by(UserModels.id)
+                .limit(limit)
+            )
+            return [(user_id, username) for user_id, username in result]
+
+    @timed(DB_QUERY_SECONDS.labels("users_page"))
+    async def get_page(self, after_id: int, limit: int) -> List[Tuple[int, str, int, Optional[str], Optional[str]]]:
+        """Page of (id, username, tg_id, vless_uuid, vless_link), keyset by id."""
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(
+                select(UserModels.id, UserModels.username, UserModels.tg_id, UserModels.vless_uuid, UserModels.vless_link)
+                .where(UserModels.id > after_id)
+                .order_by(UserModels.id)
+                .limit(limit)
+            )
+            return [tuple(row) for row in result]
+
+    async def import_users(self, users: List[Tuple[str, int]]) -> int:
+        """Insert (username, tg_id) pairs, skipping any that clash with existing users; return the count added."""
+        if not users:
+            return 0
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(
+                sqlite_insert(UserModels.__table__).on_conflict_do_nothing(),
+                [{'username': username, 'tg_id': tg_id} for username, tg_id in users],
+            )
+            await session.commit()
+            return max(result.rowcount, 0)
+
+    async def set_links(self, changes: List[Tuple[str, Optional[str], Optional[str]]]) -> None:
+        """Write (username, vless_link, vless_uuid) changes in one transaction."""
+        if not changes:
+            return
+        table = UserModels.__table__
+        async with self.db_manager.get_session() as session:
+            await session.execute(
+                update(table)
+                .where(table.c.username == bindparam('b_username'))
+                .values(vless_link=bindparam('vless_link'), vless_uuid=bindparam('vless_uuid')),
+                [{'b_username': name, 'vless_link': link, 'vless_uuid': uuid} for name, link, uuid in changes],
+            )
+            await session.commit()
+        for name, _, _ in changes:
+            self.cache.invalidate(username=name)
+
+
+class TrafficRepo:
+    """Repository for traffic time-series."""
+
+    PERIODS = {'hour': 3600, 'day': 86400}
+
+    def __init__(self):
+        self.db_manager = db_manager
+
+    @timed(DB_QUERY_SECONDS.labels("record_counters"))
+    async def record_counters(
+        self, counters: List[Tuple[str, str, int, int]], ts: Optional[int] = None, chunk: int = 500
+    ) -> int:
+        """Store one poll of (node, email, up, down) panel counters.
+
+        Deltas against the previous poll go to samples and hourly/daily
+        rollups in a single transaction. Returns number of samples written.
+        """
+        ts = int(time.time()) if ts is None else ts
+        emails_by_node: Dict[str, List[str]] = {}
+        for node, email, _, _ in counters:
+            emails_by_node.setdefault(node, []).append(email)
         async with self.db_manager.get_session() as session:
             try:
-                stmt = (
-                    update(UserModels)
-                    .values(vless_uuid=vless_uuid, vless_link=vless_link)
-                    .where(UserModels.username == username)
-                    .returning(UserModels)
+                # Only the polled clients, not every client ever seen
+                previous = {}
+                for node, emails in emails_by_node.items():
+                    for start in range(0, len(emails), chunk):
+                        result = await session.execute(
+                            select(TrafficCounter.email, TrafficCounter.up, TrafficCounter.down)
+                            .where(TrafficCounter.node == node, TrafficCounter.email.in_(emails[start:start + chunk]))
+                        )
+                        for email, up, down in result:
+                            previous[(node, email)] = (up, down)
+
+                samples: Dict[str, Tuple[int, int]] = {}
+                for node, email, up, down in counters:
+                    prev_up, prev_down = previous.get((node, email), (None, None))
+                    if prev_up is None:
+                        continue
+                    # Counters go back to zero when traffic is reset in the panel
+                    delta_up = up - prev_up if up >= prev_up else up
+                    delta_down = down - prev_down if down >= prev_down else down
+                    if delta_up or delta_down:
+                        acc_up, acc_down = samples.get(email, (0, 0))
+                        samples[email] = (acc_up + delta_up, acc_down + delta_down)
+
+                if counters:
+                    stmt = sqlite_insert(TrafficCounter)
+                    await session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[TrafficCounter.node, TrafficCounter.email],
+                            set_={'up': stmt.excluded.up, 'down': stmt.excluded.down,
+                                  'updated_at': stmt.excluded.updated_at},
+                        ),
+                        [{'node': node, 'email': email, 'up': up, 'down': down, 'updated_at': ts}
+                         for node, email, up, down in counters],
+                    )
+
+                if samples:
+                    await session.execute(
+                        insert(TrafficSample),
+                        [{'ts': ts, 'email': email, 'up': up, 'down': down}
+                         for email, (up, down) in samples.items()],
+                    )
+                    for period, size in self.PERIODS.items():
+                        stmt = sqlite_insert(TrafficRollup)
+                        await session.execute(
+                            stmt.on_conflict_do_update(
+                                index_elements=[TrafficRollup.email, TrafficRollup.period, TrafficRollup.bucket],
+                                set_={'up': TrafficRollup.up + stmt.excluded.up,
+                                      'down': TrafficRollup.down + stmt.excluded.down},
+                            ),
+                            [{'email': email, 'period': period, 'bucket': ts - ts % size, 'up': up, 'down': down}
+                             for email, (up, down) in samples.items()],
+                        )
+
+                await session.execute(
+                    delete(TrafficSample).where(
+                        TrafficSample.ts < ts - settings.STATS_SAMPLE_RETENTION_DAYS * 86400
+                    )
+                )
+                await session.execute(
+                    delete(TrafficRollup).where(
+                        TrafficRollup.period == 'hour',
+                        TrafficRollup.bucket < ts - settings.STATS_HOURLY_RETENTION_DAYS * 86400,
+                    )
                 )
-                result = await session.execute(stmt)
                 await session.commit()
-                return result.scalar()
+                return len(samples)
             except Exception as e:
-                logger.error(f"Update error: {e}")
+                logger.error(f"Traffic record error: {e}")
                 await session.rollback()
+                return 0
+
+    @timed(DB_QUERY_SECONDS.labels("traffic_usage"))
+    async def get_usage(self, email: str, period: str, since: int) -> Tuple[int, int]:
+        """Sum (up, down) of a client's rollups of the given period since ``since``."""
+        async with self.db_manager.get_session() as session:
+            stmt = select(
+                func.coalesce(func.sum(TrafficRollup.up), 0),
+                func.coalesce(func.sum(TrafficRollup.down), 0),
+            ).where(
+                TrafficRollup.email == email,
+                TrafficRollup.period == period,
+                TrafficRollup.bucket >= since,
+            )
+            result = await session.execute(stmt)
+            up, down = result.one()
+            return up, down
+
+    @timed(DB_QUERY_SECONDS.labels("traffic_totals"))
+    async def get_totals(self, email: str) -> Optional[Tuple[int, int]]:
+        """Last seen (up, down) panel counters of a client summed over nodes."""
+        async with self.db_manager.get_session() as session:
+            stmt = select(
+                func.sum(TrafficCounter.up), func.sum(TrafficCounter.down)
+            ).where(TrafficCounter.email == email)
+            result = await session.execute(stmt)
+            up, down = result.one()
+            if up is None:
                 return None
+            return up, down
+
+
+class BroadcastRepo:
+    """Repository for broadcasts and chats that blocked the bot."""
+
+    def __init__(self):
+        self.db_manager = db_manager
+
+    async def create(self, text: str, created_by: int) -> Broadcast:
+        async with self.db_manager.get_session() as session:
+            broadcast = Broadcast(text=text, created_by=created_by, created_at=int(time.time()))
+            session.add(broadcast)
+            await session.commit()
+            return broadcast
+
+    async def get(self, broadcast_id: int) -> Optional[Broadcast]:
+        async with self.db_manager.get_session() as session:
+            return await session.get(Broadcast, broadcast_id)
+
+    async def get_running(self) -> List[Broadcast]:
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(
+                select(Broadcast).where(Broadcast.status == 'running').order_by(Broadcast.id)
+            )
+            return list(result.scalars())
+
+    @timed(DB_QUERY_SECONDS.labels("broadcast_recipients"))
+    async def get_recipients(self, after_user_id: int, limit: int) -> List[Tuple[int, int]]:
+        """Next page of (Users.id, tg_id) after ``after_user_id``, blocked chats excluded."""
+        async with self.db_manager.get_session() as session:
+            stmt = (
+                select(UserModels.id, UserModels.tg_id)
+                .where(
+                    UserModels.id > after_user_id,
+                    UserModels.tg_id.not_in(select(BlockedUser.tg_id)),
+                )
+                .order_by(UserModels.id)
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            return [(user_id, tg_id) for user_id, tg_id in result]
+
+    async def checkpoint(
+        self, broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int
+    ) -> None:
+        """Store progress; counters are added to the stored ones."""
+        async with self.db_manager.get_session() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(
+                    last_user_id=last_user_id,
+                    sent=Broadcast.sent + sent,
+                    failed=Broadcast.failed + failed,
+                    blocked=Broadcast.blocked + blocked,
+                )
+            )
+            await session.commit()
+
+    async def finish(self, broadcast_id: int, status: str = 'done') -> None:
+        async with self.db_manager.get_session() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == 'running')
+                .values(status=status, finished_at=int(time.time()))
+            )
+            await session.commit()
+
+    async def get_blocked_ids(self) -> List[int]:
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(select(BlockedUser.tg_id))
+            return list(result.scalars())
+
+    async def mark_blocked(self, tg_ids: List[int]) -> None:
+        if not tg_ids:
+            return
+        now = int(time.time())
+        async with self.db_manager.get_session() as session:
+            stmt = sqlite_insert(BlockedUser).on_conflict_do_nothing(index_elements=[BlockedUser.tg_id])
+            await session.execute(stmt, [{'tg_id': tg_id, 'blocked_at': now} for tg_id in tg_ids])
+            await session.commit()
+
+    async def unblock(self, tg_id: int) -> None:
+        async with self.db_manager.get_session() as session:
+            await session.execute(delete(BlockedUser).where(BlockedUser.tg_id == tg_id))
+            await session.commit()
+
+
+class StateRepo:
+    """Repository for JSON values in the key-value ``app_state`` table."""
+
+    def __init__(self):
+        self.db_manager = db_manager
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        async with self.db_manager.get_session() as session:
+            row = await session.get(AppState, key)
+            return json.loads(row.value) if row else default
+
+    async def set(self, key: str, value: Any) -> None:
+        async with self.db_manager.get_session() as session:
+            stmt = sqlite_insert(AppState)
+            await session.execute(
+                stmt.on_conflict_do_update(index_elements=[AppState.key], set_={'value': stmt.excluded.value}),
+                {'key': key, 'value': json.dumps(value)},
+            )
+            await session.commit()
+
+
+class NoticeRepo:
+    """Repository for expiry and quota notices sent to clients."""
+
+    def __init__(self):
+        self.db_manager = db_manager
+
+    async def get_all(self) -> Dict[Tuple[str, str], int]:
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(select(ClientNotice.email, ClientNotice.notice, ClientNotice.deadline))
+            return {(email, notice): deadline for email, notice, deadline in result}
+
+    async def save(self, notices: List[Tuple[str, str, int]]) -> None:
+        if not notices:
+            return
+        now = int(time.time())
+        async with self.db_manager.get_session() as session:
+            stmt = sqlite_insert(ClientNotice)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ClientNotice.email, ClientNotice.notice],
+                set_={'deadline': stmt.excluded.deadline, 'sent_at': stmt.excluded.sent_at},
+            )
+            await session.execute(stmt, [
+                {'email': email, 'notice': notice, 'deadline': deadline, 'sent_at': now}
+                for email, notice, deadline in notices
+            ])
+            await session.commit()
+
+
+class PanelSessionRepo:
+    """Repository for stored panel login sessions."""
+
+    def __init__(self):
+        self.db_manager = db_manager
+
+    async def get(self, node: str) -> Optional[PanelSession]:
+        async with self.db_manager.get_session() as session:
+            return await session.get(PanelSession, node)
+
+    async def save(
+        self, node: str, panel_url: str, username: str, cookies: List[Dict[str, str]], expires_at: int
+    ) -> None:
+        values = {
+            'node': node,
+            'panel_url': panel_url,
+            'username': username,
+            'cookies': json.dumps(cookies),
+            'expires_at': expires_at,
+            'updated_at': int(time.time()),
+        }
+        async with self.db_manager.get_session() as session:
+            stmt = sqlite_insert(PanelSession).values(values)
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[PanelSession.node],
+                set_={key: stmt.excluded[key] for key in values if key != 'node'},
+            ))
+            await session.commit()
+
+
+class LeaseRepo:
+    """Repository for leases held by bot processes."""
+
+    def __init__(self):
+        self.db_manager = db_manager
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the lease; False while another owner holds an unexpired one."""
+        now = time.time()
+        async with self.db_manager.get_session() as session:
+            stmt = sqlite_insert(Lease.__table__).values(name=name, owner=owner, expires_at=now + ttl)
+            result = await session.execute(stmt.on_conflict_do_update(
+                index_elements=[Lease.name],
+                set_={'owner': stmt.excluded.owner, 'expires_at': stmt.excluded.expires_at},
+                where=(Lease.owner == owner) | (Lease.expires_at < now),
+            ))
+            await session.commit()
+            return result.rowcount > 0
+
+    async def release(self, name: str, owner: str) -> None:
+        async with self.db_manager.get_session() as session:
+            await session.execute(delete(Lease).where(Lease.name == name, Lease.owner == owner))
+            await session.commit()
@@ -1,5 +1,6 @@
 """Database models."""
 
+from sqlalchemy import BigInteger, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from database.base import Base
 
@@ -7,8 +8,106 @@ from database.base import Base
 class Users(Base):
     """User model."""
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_username', 'username', unique=True),
+        Index('ix_users_tg_id', 'tg_id', unique=True),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     username: Mapped[str] = mapped_column(nullable=False)
     tg_id: Mapped[int] = mapped_column(nullable=False)
     vless_uuid: Mapped[str] = mapped_column(nullable=True)
-    vless_link: Mapped[str] = mapped_column(nullable=True)
\ No newline at end of file
+    vless_link: Mapped[str] = mapped_column(nullable=True)
+
+
+class TrafficCounter(Base):
+    """Last seen panel traffic counters of a client."""
+    __tablename__ = 'traffic_counters'
+    node: Mapped[str] = mapped_column(primary_key=True)
+    email: Mapped[str] = mapped_column(primary_key=True)
+    up: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    down: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[int] = mapped_column(nullable=False)
+
+
+class TrafficSample(Base):
+    """Traffic delta of a client between two polls."""
+    __tablename__ = 'traffic_samples'
+    __table_args__ = (Index('ix_traffic_samples_email_ts', 'email', 'ts'),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    ts: Mapped[int] = mapped_column(nullable=False, index=True)
+    email: Mapped[str] = mapped_column(nullable=False)
+    up: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    down: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class TrafficRollup(Base):
+    """Traffic of a client summed per hour or day bucket."""
+    __tablename__ = 'traffic_rollups'
+    email: Mapped[str] = mapped_column(primary_key=True)
+    period: Mapped[str] = mapped_column(primary_key=True)
+    bucket: Mapped[int] = mapped_column(primary_key=True)
+    up: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    down: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class Broadcast(Base):
+    """Admin announcement with its delivery progress."""
+    __tablename__ = 'broadcasts'
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(nullable=False)
+    created_by: Mapped[int] = mapped_column(nullable=False)
+    created_at: Mapped[int] = mapped_column(nullable=False)
+    # running, done or cancelled
+    status: Mapped[str] = mapped_column(nullable=False, default='running', index=True)
+    # Users.id of the last recipient handled, delivery resumes after it
+    last_user_id: Mapped[int] = mapped_column(nullable=False, default=0)
+    sent: Mapped[int] = mapped_column(nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(nullable=False, default=0)
+    blocked: Mapped[int] = mapped_column(nullable=False, default=0)
+    finished_at: Mapped[int] = mapped_column(nullable=True)
+
+
+class BlockedUser(Base):
+    """Chat that blocked the bot; skipped by broadcasts."""
+    __tablename__ = 'blocked_users'
+    tg_id: Mapped[int] = mapped_column(primary_key=True)
+    blocked_at: Mapped[int] = mapped_column(nullable=False)
+
+
+class AppState(Base):
+    """Small key-value store for state of background jobs."""
+    __tablename__ = 'app_state'
+    key: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(nullable=False)
+
+
+class ClientNotice(Base):
+    """Expiry or quota notice already sent to a client."""
+    __tablename__ = 'client_notices'
+    email: Mapped[str] = mapped_column(primary_key=True)
+    # e.g. expire:86400, quota:0.8 or disabled
+    notice: Mapped[str] = mapped_column(primary_key=True)
+    # Expiry time or quota the notice was sent for; a new value re-arms it
+    deadline: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sent_at: Mapped[int] = mapped_column(nullable=False)
+
+
+class PanelSession(Base):
+    """Login session of a panel node, reused across restarts."""
+    __tablename__ = 'panel_sessions'
+    node: Mapped[str] = mapped_column(primary_key=True)
+    # Panel URL and user the session belongs to
+    panel_url: Mapped[str] = mapped_column(nullable=False)
+    username: Mapped[str] = mapped_column(nullable=False)
+    # JSON list of cookies with name, value, domain and path
+    cookies: Mapped[str] = mapped_column(nullable=False)
+    expires_at: Mapped[int] = mapped_column(nullable=False)
+    updated_at: Mapped[int] = mapped_column(nullable=False)
+
+
+class Lease(Base):
+    """Time-limited ownership of a job shared by several bot processes."""
+    __tablename__ = 'leases'
+    name: Mapped[str] = mapped_column(primary_key=True)
+    owner: Mapped[str] = mapped_column(nullable=False)
+    expires_at: Mapped[float] = mapped_column(nullable=False)
@@ -0,0 +1,248 @@
+"""Write-behind buffer for user registrations and link updates."""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import settings
+from database.base import db_manager
+from database.cache import user_cache
+from database.models import Users as UserModels
+from service.metrics import metrics, timed
+
+DB_FLUSH_SECONDS = metrics.histogram("db_flush_seconds", "Write buffer transaction latency")
+DB_FLUSH_ROWS = metrics.counter("db_flush_rows_total", "Rows written by the write buffer")
+
+
+def released_username(tg_id: int) -> str:
+    """Placeholder username of a user whose username now belongs to another account.
+
+    Telegram usernames never contain ``#``, so it cannot clash with a real one.
+    """
+    return f"#{tg_id}"
+
+
+class UserWriteBuffer:
+    """Collect user upserts and link updates and write them in one transaction.
+
+    A flush happens every ``interval`` seconds or as soon as ``batch_size``
+    writes are pending. Pending and in-flight writes are applied on top of
+    reads with ``apply()``, so callers see their own writes immediately.
+
+    Telegram usernames move between accounts. When a username is claimed
+    by another Telegram id, the previous holder is renamed to
+    ``released_username()`` and loses the link stored under that username,
+    in the same transaction; of two pending claims the latest wins.
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.DB_FLUSH_INTERVAL,
+        batch_size: int = settings.DB_FLUSH_BATCH,
+    ):
+        self.db_manager = db_manager
+        self.cache = user_cache
+        self.interval = interval
+        self.batch_size = batch_size
+        # tg_id -> username
+        self._users: Dict[int, str] = {}
+        # username -> (vless_link, vless_uuid)
+        self._links: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._flushing_users: Dict[int, str] = {}
+        self._flushing_links: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._users) + len(self._links)
+
+    def add_user(self, username: str, tg_id: int) -> None:
+        # Re-inserted so the order of the dict is the order of the latest claims
+        self._users.pop(tg_id, None)
+        self._users[tg_id] = username
+        self._maybe_flush()
+
+    def set_link(self, username: str, vless_link: Optional[str], vless_uuid: Optional[str]) -> None:
+        self._links[username] = (vless_link, vless_uuid)
+        self._maybe_flush()
+
+    def _pending_tg_id(self, username: str) -> Optional[int]:
+        for users in (self._users, self._flushing_users):
+            for tg_id, name in reversed(users.items()):
+                if name == username:
+                    return tg_id
+        return None
+
+    def _pending_link(self, username: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        return self._links.get(username, self._flushing_links.get(username))
+
+    def apply(
+        self, user: Optional[UserModels], username: Optional[str] = None, tg_id: Optional[int] = None
+    ) -> Optional[UserModels]:
+        """Return ``user`` as it will look once pending writes are flushed.
+
+        ``user`` is the row read from the DB or cache, ``username``/``tg_id``
+        is the key it was looked up by.
+        """
+        if not (self._users or self._links or self._flushing_users or self._flushing_links):
+            return user
+        if user is not None:
+            username, tg_id = user.username, user.tg_id
+        elif tg_id is None and username is not None:
+            tg_id = self._pending_tg_id(username)
+        if tg_id is None:
+            return user
+        pending_name = self._users.get(tg_id, self._flushing_users.get(tg_id))
+        if user is None and pending_name is None:
+            return None
+        if pending_name is not None:
+            username = pending_name
+        link = self._pending_link(username)
+        if user is not None and link is None and username == user.username:
+            return user
+        merged = UserModels(
+            id=user.id if user else None,
+            username=username,
+            tg_id=tg_id,
+            vless_link=user.vless_link if user else None,
+            vless_uuid=user.vless_uuid if user else None,
+        )
+        if link is not None:
+            merged.vless_link, merged.vless_uuid = link
+        return merged
+
+    def _maybe_flush(self) -> None:
+        if self.pending >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> int:
+        """Write all pending changes; return number of rows written."""
+        async with self._lock:
+            if not self.pending:
+                return 0
+            self._flushing_users, self._users = self._users, {}
+            self._flushing_links, self._links = self._links, {}
+            # Of several pending claims of one username the latest wins
+            owners = {name: tg_id for tg_id, name in self._flushing_users.items()}
+            users = [
+                {'tg_id': tg_id, 'username': name if owners[name] == tg_id else released_username(tg_id)}
+                for tg_id, name in self._flushing_users.items()
+            ]
+            links = [
+                {'b_username': name, 'vless_link': link, 'vless_uuid': uuid}
+                for name, (link, uuid) in self._flushing_links.items()
+            ]
+            released: List[Tuple[int, str]] = []
+            try:
+                released = await self._write(users, links)
+            except Exception as e:
+                logger.warning(f"Batch flush failed, writing rows one by one: {e}")
+                for row in users:
+                    released.extend(await self._write_safe([row], []))
+                for row in links:
+                    await self._write_safe([], [row])
+            finally:
+                for tg_id, name in self._flushing_users.items():
+                    self.cache.invalidate(username=name, tg_id=tg_id)
+                for name in self._flushing_links:
+                    self.cache.invalidate(username=name)
+                for tg_id, name in released:
+                    self.cache.invalidate(username=name, tg_id=tg_id)
+                self._flushing_users, self._flushing_links = {}, {}
+            for tg_id, name in released:
+                logger.info(f"Username {name} was taken by another account, user {tg_id} "
+                            f"renamed to {released_username(tg_id)}")
+            DB_FLUSH_ROWS.inc(len(users) + len(links))
+            logger.debug("Flushed {} user upserts and {} link updates", len(users), len(links))
+            return len(users) + len(links)
+
+    @timed(DB_FLUSH_SECONDS.labels())
+    async def _write(self, users: list, links: list) -> List[Tuple[int, str]]:
+        """Write one transaction; return (tg_id, username) of users whose username was taken."""
+        released: List[Tuple[int, str]] = []
+        table = UserModels.__table__
+        async with self.db_manager.get_session() as session:
+            try:
+                if users:
+                    claims = {row['username']: row['tg_id'] for row in users}
+                    result = await session.execute(
+                        select(table.c.tg_id, table.c.username).where(table.c.username.in_(list(claims)))
+                    )
+                    stale = [(tg_id, name) for tg_id, name in result if claims[name] != tg_id]
+                    if stale:
+                        # Holders renamed by this batch get their new name from the upsert below
+                        renamed = set(claims.values())
+                        released = [(tg_id, name) for tg_id, name in stale if tg_id not in renamed]
+                        await session.execute(
+                            update(table)
+                            .where(table.c.tg_id == bindparam('b_tg_id'))
+                            .values(username=bindparam('b_username')),
+                            [{'b_tg_id': tg_id, 'b_username': released_username(tg_id)} for tg_id, _ in stale],
+                        )
+                    if released:
+                        await session.execute(
+                            update(table)
+                            .where(table.c.tg_id.in_([tg_id for tg_id, _ in released]))
+                            .values(vless_link=None, vless_uuid=None)
+                        )
+                    stmt = sqlite_insert(UserModels)
+                    await session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[UserModels.tg_id],
+                            set_={'username': stmt.excluded.username},
+                        ),
+                        users,
+                    )
+                if links:
+                    await session.execute(
+                        update(table)
+                        .where(table.c.username == bindparam('b_username'))
+                        .values(vless_link=bindparam('vless_link'), vless_uuid=bindparam('vless_uuid')),
+                        links,
+                    )
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        return released
+
+    async def _write_safe(self, users: list, links: list) -> List[Tuple[int, str]]:
+        try:
+            return await self._write(users, links)
+        except Exception as e:
+            logger.error(f"DB Error: {e}")
+            return []
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(f"Write buffer flush failed: {e}")
+
+    async def stop(self) -> None:
+        """Stop periodic flushing and write everything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+write_buffer = UserWriteBuffer()
+
+metrics.callback(
+    "db_write_buffer_pending", "Writes waiting in the write buffer", "gauge", (),
+    lambda: [((), write_buffer.pending)],
+)
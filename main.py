@@ -1,22 +1,34 @@
 """3x-UI Telegram Bot - Main Application."""
 
 import asyncio
-import logging
+import signal
 from loguru import logger
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters.command import Command
 from config import settings
 from database.base import db_manager
+from database.write_buffer import write_buffer
+from service.broadcast import broadcaster
+from service.expiry import expiry_scheduler
 from service.handlers import BotHandlers
+from service.leader import LeaderElection
+from service.log import setup_logging
+from service.middlewares import PanelGuardMiddleware
+from service.panel_registry import panel_registry
+from service.presence import presence_tracker
+from service.reconcile import reconciler
+from service.stats_collector import stats_collector
+from service.subscriptions import subscription_service
+from service.web import WebServer, WebhookUpdateServer
 
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
-logger.add("bot.log", rotation="500 MB", level="DEBUG")
+setup_logging()
 
 # Initialize bot and dispatcher
 bot = Bot(token=settings.TELEGRAM_TOKEN)
 dp = Dispatcher()
+dp.message.middleware(PanelGuardMiddleware(panel_available=lambda: panel_registry.available))
 
 # Initialize handlers
 handlers = BotHandlers()
@@ -53,21 +65,147 @@ async def remove_handler(message: types.Message):
     await handlers.remove_client(message)
 
 
+@dp.message(Command('bulkcreate'))
+async def bulk_create_handler(message: types.Message):
+    """Handle /bulkcreate command."""
+    await handlers.bulk_create(message)
+
+
+@dp.message(Command('bulkremove'))
+async def bulk_remove_handler(message: types.Message):
+    """Handle /bulkremove command."""
+    await handlers.bulk_remove(message)
+
+
 @dp.message(Command('online'))
 async def online_handler(message: types.Message):
     """Handle /online command."""
     await handlers.get_online(message)
 
 
+@dp.message(Command('watch'))
+async def watch_handler(message: types.Message):
+    """Handle /watch command."""
+    await handlers.watch_online(message)
+
+
+@dp.message(Command('stats'))
+async def stats_handler(message: types.Message):
+    """Handle /stats command."""
+    await handlers.get_stats(message)
+
+
+@dp.message(Command('broadcast'))
+async def broadcast_handler(message: types.Message):
+    """Handle /broadcast command."""
+    await handlers.broadcast(message)
+
+
+@dp.message(Command('reconcile'))
+async def reconcile_handler(message: types.Message):
+    """Handle /reconcile command."""
+    await handlers.reconcile(message)
+
+
+@dp.message(Command('export'))
+async def export_handler(message: types.Message):
+    """Handle /export command."""
+    await handlers.export_clients(message)
+
+
+@dp.message(Command('import'))
+async def import_handler(message: types.Message):
+    """Handle /import command."""
+    await handlers.import_clients(message)
+
+
+@dp.message(Command('metrics'))
+async def metrics_handler(message: types.Message):
+    """Handle /metrics command."""
+    await handlers.get_metrics(message)
+
+
+def create_web_server() -> WebServer:
+    """HTTP server with the endpoints enabled in settings."""
+    web_server = WebServer()
+    if settings.SUB_ENABLED:
+        subscription_service.register(web_server.app)
+    return web_server
+
+
+async def run_webhook() -> None:
+    """Serve updates over a webhook until SIGINT/SIGTERM."""
+    web_server = create_web_server()
+    webhook = WebhookUpdateServer(dp, bot)
+    webhook.register(web_server.app)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    await webhook.start()
+    await web_server.start()
+    try:
+        await stop_event.wait()
+        logger.info("Stopping webhook server...")
+    finally:
+        await web_server.stop()
+        await webhook.stop()
+
+
+async def run_polling() -> None:
+    """Long polling; the HTTP server runs alongside for metrics and subscriptions."""
+    web_server = create_web_server()
+    if settings.METRICS_ENABLED or settings.SUB_ENABLED:
+        await web_server.start()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await web_server.stop()
+
+
+async def start_jobs() -> None:
+    """Start jobs that must run in one process only."""
+    stats_collector.start()
+    await broadcaster.resume()
+    reconciler.start()
+    await expiry_scheduler.start()
+
+
+async def stop_jobs() -> None:
+    """Stop jobs started by ``start_jobs``."""
+    await stats_collector.stop()
+    await broadcaster.stop()
+    await reconciler.stop()
+    await expiry_scheduler.stop()
+
+
+leader = LeaderElection(on_elected=start_jobs, on_demoted=stop_jobs)
+
+
 async def main() -> None:
     """Start the bot."""
     logger.info("Starting bot...")
     await db_manager.init_db()
+    write_buffer.start()
+    panel_registry.start()
+    # Every process answers /online from its own poll and notifies its own /watch subscribers
+    presence_tracker.start(bot)
+    await broadcaster.start(bot)
+    leader.start()
     try:
-        await dp.start_polling(bot)
+        if settings.BOT_MODE == 'webhook':
+            await run_webhook()
+        else:
+            await run_polling()
     finally:
+        await leader.stop()
+        await presence_tracker.stop()
+        await broadcaster.stop()
         await bot.session.close()
+        await panel_registry.close()
+        await write_buffer.stop()
         await db_manager.close()
+        await logger.complete()
 
 
 if __name__ == "__main__":
@@ -1,3 +1,5 @@
+import secrets
+import string
 import uuid
 from typing import Optional, List
 from pydantic import BaseModel, Field
@@ -43,6 +45,14 @@ class CreateClient(BaseModel):
     settings: str
 
 
+SUB_ID_ALPHABET = string.ascii_lowercase + string.digits
+
+
+def generate_sub_id(length: int = 16) -> str:
+    """Random subscription id in the format the 3x-UI panel generates."""
+    return "".join(secrets.choice(SUB_ID_ALPHABET) for _ in range(length))
+
+
 class CreateClientSettings(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     flow: str = ""
@@ -52,5 +62,6 @@ class CreateClientSettings(BaseModel):
     expiryTime: int = 0
     enable: bool = True
     tgId: str = ""
+    subId: str = Field(default_factory=generate_sub_id)
     comment: str = ""
     reset: int = 0
@@ -1,8 +1,10 @@
 """Pydantic models for 3x-UI inbounds."""
 
-from typing import List
+import json
+from functools import cached_property
+from typing import Any, Dict, Iterator, List, Optional
 from pydantic import BaseModel, Json, Field
-from schemas.clients import ClientStat, InboundSettings
+from schemas.clients import ClientStat, InboundSettings, XUIClient
 from schemas.settings import StreamSettings, SniffingSettings
 
 
@@ -28,4 +30,119 @@ class InboundModel(BaseModel):
     sniffing: Json[SniffingSettings]
 
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+
+def _decode(value: Any) -> Any:
+    """Decode a nested JSON string field, pass already decoded values through."""
+    if isinstance(value, (str, bytes)):
+        return json.loads(value) if value else {}
+    return value
+
+
+class LazyInbound:
+    """3x-UI inbound kept as raw panel JSON.
+
+    Nested ``settings``/``streamSettings``/``sniffing`` strings are decoded
+    only when accessed, and clients are validated one at a time on lookup.
+    ``to_model()`` gives the fully validated ``InboundModel``.
+    """
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.raw = raw
+
+    @property
+    def id(self) -> int:
+        return self.raw["id"]
+
+    @property
+    def up(self) -> int:
+        return self.raw.get("up", 0)
+
+    @property
+    def down(self) -> int:
+        return self.raw.get("down", 0)
+
+    @property
+    def total(self) -> int:
+        return self.raw.get("total", 0)
+
+    @property
+    def allTime(self) -> int:
+        return self.raw.get("allTime", 0)
+
+    @property
+    def remark(self) -> str:
+        return self.raw.get("remark", "")
+
+    @property
+    def enable(self) -> bool:
+        return self.raw.get("enable", True)
+
+    @property
+    def expiryTime(self) -> int:
+        return self.raw.get("expiryTime", 0)
+
+    @property
+    def port(self) -> int:
+        return self.raw["port"]
+
+    @property
+    def protocol(self) -> str:
+        return self.raw["protocol"]
+
+    @property
+    def tag(self) -> str:
+        return self.raw.get("tag", "")
+
+    @property
+    def listen(self) -> str:
+        return self.raw.get("listen", "")
+
+    @cached_property
+    def raw_settings(self) -> Dict[str, Any]:
+        return _decode(self.raw.get("settings"))
+
+    @property
+    def raw_clients(self) -> List[Dict[str, Any]]:
+        return self.raw_settings.get("clients") or []
+
+    @property
+    def raw_client_stats(self) -> List[Dict[str, Any]]:
+        return self.raw.get("clientStats") or []
+
+    @cached_property
+    def settings(self) -> InboundSettings:
+        return InboundSettings.model_validate(self.raw_settings)
+
+    @cached_property
+    def stream_settings(self) -> StreamSettings:
+        return StreamSettings.model_validate(_decode(self.raw.get("streamSettings")))
+
+    @cached_property
+    def sniffing(self) -> SniffingSettings:
+        return SniffingSettings.model_validate(_decode(self.raw.get("sniffing")))
+
+    @cached_property
+    def stats_by_email(self) -> Dict[str, Dict[str, Any]]:
+        """Raw client traffic stats indexed by email."""
+        return {stat.get("email"): stat for stat in self.raw_client_stats}
+
+    @cached_property
+    def clientStats(self) -> List[ClientStat]:
+        return [ClientStat.model_validate(stat) for stat in self.raw_client_stats]
+
+    def iter_emails(self) -> Iterator[str]:
+        for client in self.raw_clients:
+            yield client.get("email", "")
+
+    def find_client(self, email: str) -> Optional[XUIClient]:
+        """Validate and return only the client with the given email."""
+        for client in self.raw_clients:
+            if client.get("email") == email:
+                return XUIClient.model_validate(client)
+        return None
+
+    def to_model(self) -> InboundModel:
+        """Fully validate into ``InboundModel``."""
+        return InboundModel.model_validate(self.raw)
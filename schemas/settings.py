@@ -1,6 +1,6 @@
 """Pydantic models for stream settings."""
 
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import BaseModel
 
 
@@ -25,19 +25,72 @@ class RealitySettings(BaseModel):
     mldsa65Seed: Optional[str] = ""
 
 
+class TlsInner(BaseModel):
+    """TLS client-side settings model."""
+    allowInsecure: bool = False
+    fingerprint: str = ""
+
+
+class TlsSettings(BaseModel):
+    """TLS settings model."""
+    serverName: str = ""
+    alpn: List[str] = []
+    settings: TlsInner = TlsInner()
+
+
 class TcpSettings(BaseModel):
     """TCP settings model."""
     acceptProxyProtocol: bool
     header: dict
 
 
+class WsSettings(BaseModel):
+    """WebSocket settings model."""
+    path: str = "/"
+    host: str = ""
+    headers: Dict[str, str] = {}
+
+
+class GrpcSettings(BaseModel):
+    """gRPC settings model."""
+    serviceName: str = ""
+    authority: str = ""
+    multiMode: bool = False
+
+
+class HttpUpgradeSettings(BaseModel):
+    """HTTPUpgrade settings model."""
+    path: str = "/"
+    host: str = ""
+
+
+class XHttpSettings(BaseModel):
+    """XHTTP (SplitHTTP) settings model."""
+    path: str = "/"
+    host: str = ""
+    mode: str = "auto"
+
+
+class ExternalProxy(BaseModel):
+    """Address clients connect to instead of the panel host."""
+    forceTls: str = "same"
+    dest: str
+    port: int
+    remark: str = ""
+
+
 class StreamSettings(BaseModel):
     """Stream settings model."""
     network: str
     security: str
     realitySettings: Optional[RealitySettings] = None
+    tlsSettings: Optional[TlsSettings] = None
     tcpSettings: Optional[TcpSettings] = None
-    externalProxy: List = []
+    wsSettings: Optional[WsSettings] = None
+    grpcSettings: Optional[GrpcSettings] = None
+    httpupgradeSettings: Optional[HttpUpgradeSettings] = None
+    xhttpSettings: Optional[XHttpSettings] = None
+    externalProxy: List[ExternalProxy] = []
 
 
 class SniffingSettings(BaseModel):
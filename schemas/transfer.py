@@ -0,0 +1,43 @@
+"""Row model of client export and import files."""
+
+from typing import Any, Optional
+from uuid import UUID
+from pydantic import BaseModel, Field, model_validator
+
+FIELDS = (
+    "username", "tg_id", "node", "inbound_id", "uuid", "sub_id",
+    "enable", "expiry_time", "total_gb", "up", "down", "link",
+)
+
+
+class ClientRow(BaseModel):
+    """One client with its stored link and panel state."""
+    username: str = Field(min_length=1, max_length=64, pattern=r"^[\w.@+-]+$")
+    tg_id: Optional[int] = None
+    # Empty node means the client was not found on any panel
+    node: str = ""
+    inbound_id: Optional[int] = None
+    uuid: Optional[UUID] = None
+    sub_id: str = Field("", max_length=64)
+    enable: bool = True
+    # Milliseconds, 0 for no expiry
+    expiry_time: int = 0
+    # Bytes, 0 for no quota
+    total_gb: int = Field(0, ge=0)
+    up: int = 0
+    down: int = 0
+    link: str = ""
+
+    @model_validator(mode="before")
+    @classmethod
+    def drop_empty(cls, data: Any) -> Any:
+        """Empty CSV cells fall back to defaults."""
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value not in ("", None)}
+        return data
+
+    def to_record(self) -> dict:
+        """Plain values in ``FIELDS`` order; also works on unvalidated rows."""
+        record = {name: getattr(self, name) for name in FIELDS}
+        record["uuid"] = str(self.uuid) if self.uuid else ""
+        return record
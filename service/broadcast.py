@@ -0,0 +1,226 @@
+"""Admin broadcasts paced to Telegram flood limits."""
+
+import asyncio
+import time
+from typing import Dict, Optional, Set
+from loguru import logger
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+from config import settings
+from database.crud import BroadcastRepo
+from database.models import Broadcast
+from service.metrics import metrics
+from service.rate_limit import BucketMap, TokenBucket
+
+BROADCAST_MESSAGES = metrics.counter(
+    "broadcast_messages_total", "Broadcast deliveries by result", ("result",))
+
+SENT, FAILED, BLOCKED = "sent", "failed", "blocked"
+# Seconds between checks for broadcasts created or cancelled by other processes
+SYNC_INTERVAL = 5.0
+
+
+class Broadcaster:
+    """Deliver broadcasts to every registered user.
+
+    Recipients are read from the database page by page in ``Users.id``
+    order. Sends go through a global token bucket and per-chat buckets, and
+    a ``RetryAfter`` from Telegram pauses all sending for the requested
+    time. Progress is checkpointed after every page, so after a restart a
+    running broadcast resumes from the last page instead of starting over.
+    Chats that blocked the bot are recorded and skipped from then on.
+    """
+
+    def __init__(
+        self,
+        repo: Optional[BroadcastRepo] = None,
+        rate: float = settings.BROADCAST_RATE,
+        chat_rate: float = settings.BROADCAST_CHAT_RATE,
+        concurrency: int = settings.BROADCAST_CONCURRENCY,
+        page_size: int = settings.BROADCAST_PAGE_SIZE,
+        max_retries: int = settings.BROADCAST_MAX_RETRIES,
+    ):
+        self.repo = repo or BroadcastRepo()
+        self.bucket = TokenBucket(rate, rate)
+        self.chat_buckets = BucketMap(chat_rate, 1)
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.blocked: Set[int] = set()
+        self._paused_until = 0.0
+        self._bot: Optional[Bot] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+        self._results = {result: BROADCAST_MESSAGES.labels(result) for result in (SENT, FAILED, BLOCKED)}
+
+    async def start(self, bot: Bot) -> None:
+        """Load blocked chats; sending is possible from now on."""
+        self._bot = bot
+        self.blocked = set(await self.repo.get_blocked_ids())
+
+    async def resume(self) -> None:
+        """Run stored broadcasts in this process, which holds the leader lease.
+
+        Broadcasts created or cancelled by other processes are picked up
+        every ``SYNC_INTERVAL`` seconds.
+        """
+        if self._sync_task is None:
+            await self._sync()
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        if self._sync_task is not None:
+            tasks.append(self._sync_task)
+            self._sync_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = {}
+
+    async def _sync(self) -> None:
+        # Tasks that finish or start during the query are left alone
+        local = dict(self._tasks)
+        running = {broadcast.id: broadcast for broadcast in await self.repo.get_running()}
+        for broadcast_id, broadcast in running.items():
+            if broadcast_id not in local and broadcast_id not in self._tasks:
+                logger.info(f"Resuming broadcast {broadcast_id} after user {broadcast.last_user_id}")
+                self._spawn(broadcast)
+        for broadcast_id, task in local.items():
+            if broadcast_id not in running:
+                logger.info(f"Broadcast {broadcast_id} was cancelled elsewhere, stopping")
+                task.cancel()
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            try:
+                await self._sync()
+            except Exception as e:
+                logger.exception(f"Broadcast sync failed: {e}")
+
+    async def create(self, text: str, admin_id: int) -> Broadcast:
+        """Store a broadcast; the leader process sends it."""
+        broadcast = await self.repo.create(text, admin_id)
+        logger.info(f"Broadcast {broadcast.id} created by {admin_id}")
+        if self._sync_task is not None:
+            self._spawn(broadcast)
+        return broadcast
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Stop a running broadcast; the leader notices one cancelled in another process."""
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        else:
+            broadcast = await self.repo.get(broadcast_id)
+            if broadcast is None or broadcast.status != 'running':
+                return False
+        await self.repo.finish(broadcast_id, 'cancelled')
+        return True
+
+    async def unblock(self, tg_id: int) -> None:
+        """Forget a blocked chat that wrote to the bot again."""
+        if tg_id in self.blocked:
+            self.blocked.discard(tg_id)
+            await self.repo.unblock(tg_id)
+
+    async def notify(self, chat_id: int, text: str) -> str:
+        """Send one message under the broadcast rate limits."""
+        if self._bot is None or chat_id in self.blocked:
+            return BLOCKED
+        result = await self._send(chat_id, text)
+        if result == BLOCKED:
+            await self.repo.mark_blocked([chat_id])
+        return result
+
+    def _spawn(self, broadcast: Broadcast) -> None:
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast.id, None))
+
+    async def _run(self, broadcast: Broadcast) -> None:
+        cursor = broadcast.last_user_id
+        totals = {SENT: broadcast.sent, FAILED: broadcast.failed, BLOCKED: broadcast.blocked}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id: int) -> str:
+            async with semaphore:
+                return await self._send(chat_id, broadcast.text)
+
+        try:
+            while True:
+                page = await self.repo.get_recipients(cursor, self.page_size)
+                if not page:
+                    break
+                results = await asyncio.gather(*(deliver(tg_id) for _, tg_id in page))
+                page_counts = {result: results.count(result) for result in (SENT, FAILED, BLOCKED)}
+                blocked = [tg_id for (_, tg_id), result in zip(page, results) if result == BLOCKED]
+                await self.repo.mark_blocked(blocked)
+                cursor = page[-1][0]
+                await self.repo.checkpoint(
+                    broadcast.id, cursor, page_counts[SENT], page_counts[FAILED], page_counts[BLOCKED]
+                )
+                for result, count in page_counts.items():
+                    totals[result] += count
+            await self.repo.finish(broadcast.id)
+        except asyncio.CancelledError:
+            logger.info(f"Broadcast {broadcast.id} stopped after user {cursor}")
+            raise
+        except Exception as e:
+            logger.exception(f"Broadcast {broadcast.id} failed: {e}")
+            return
+        logger.info(f"Broadcast {broadcast.id} finished: {totals}")
+        await self._report(broadcast, totals)
+
+    async def _acquire(self, chat_id: int) -> None:
+        chat_bucket = self.chat_buckets.get(chat_id)
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if not self.bucket.consume():
+                await asyncio.sleep(self.bucket.delay())
+                continue
+            if not chat_bucket.consume():
+                await asyncio.sleep(chat_bucket.delay())
+                continue
+            return
+
+    async def _send(self, chat_id: int, text: str) -> str:
+        for _ in range(self.max_retries + 1):
+            await self._acquire(chat_id)
+            try:
+                await self._bot.send_message(chat_id, text)
+                result = SENT
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood limit hit, pausing broadcasts for {e.retry_after}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                continue
+            except TelegramForbiddenError:
+                self.blocked.add(chat_id)
+                result = BLOCKED
+            except TelegramAPIError as e:
+                logger.debug("Broadcast to {} failed: {}", chat_id, e)
+                result = FAILED
+            self._results[result].inc()
+            return result
+        self._results[FAILED].inc()
+        return FAILED
+
+    async def _report(self, broadcast: Broadcast, totals: Dict[str, int]) -> None:
+        try:
+            await self._bot.send_message(
+                broadcast.created_by,
+                f"📣 Рассылка #{broadcast.id} завершена\n"
+                f"Доставлено: {totals[SENT]}\n"
+                f"Заблокировали бота: {totals[BLOCKED]}\n"
+                f"Ошибки: {totals[FAILED]}",
+            )
+        except TelegramAPIError as e:
+            logger.warning(f"Cannot report broadcast {broadcast.id}: {e}")
+
+
+broadcaster = Broadcaster()
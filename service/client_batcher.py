@@ -0,0 +1,166 @@
+"""Coalescing queue for client creation on the panel."""
+
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+from loguru import logger
+from config import settings
+from schemas.clients import CreateClientSettings
+from service.threex_ui_client import ThreeXUIClient
+
+DUPLICATE_EMAIL_RE = re.compile(r"Duplicate email:\s*(\S+)", re.IGNORECASE)
+
+
+@dataclass
+class ClientCreateResult:
+    """Outcome of creating a single client."""
+    email: str
+    success: bool
+    node: str
+    inbound_id: int
+    client_id: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def duplicate(self) -> bool:
+        return bool(self.error and self.error.startswith("Duplicate email"))
+
+
+PendingCreate = Tuple[CreateClientSettings, asyncio.Future]
+
+
+class ClientCreationQueue:
+    """Gather client creates per inbound and send them as one addClient call.
+
+    A create for an idle inbound is sent at once. Creates arriving while a
+    batch of that inbound is in flight are gathered and sent when it
+    completes, when ``max_size`` is reached or ``window`` seconds after the
+    first of them arrived, whichever comes first. Every caller gets its own
+    result back. Since
+    the panel rejects a whole batch on a duplicate email, the offending
+    client is failed and the rest of the batch is resent.
+    """
+
+    def __init__(
+        self,
+        window: float = settings.CREATE_BATCH_WINDOW,
+        max_size: int = settings.CREATE_BATCH_MAX,
+    ):
+        self.window = window
+        self.max_size = max_size
+        self._pending: Dict[Tuple[str, int], List[PendingCreate]] = {}
+        self._panels: Dict[str, ThreeXUIClient] = {}
+        self._timers: Dict[Tuple[str, int], asyncio.TimerHandle] = {}
+        self._in_flight: Dict[Tuple[str, int], int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(
+        self, panel: ThreeXUIClient, inbound_id: int, client: CreateClientSettings
+    ) -> ClientCreateResult:
+        """Queue one client and wait for its own result."""
+        loop = asyncio.get_running_loop()
+        key = (panel.name, inbound_id)
+        future = loop.create_future()
+        self._panels[panel.name] = panel
+        batch = self._pending.setdefault(key, [])
+        batch.append((client, future))
+        if len(batch) >= self.max_size or not self._in_flight.get(key):
+            self._schedule_flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._schedule_flush, key)
+        return await future
+
+    async def submit_many(
+        self, panel: ThreeXUIClient, inbound_id: int, clients: List[CreateClientSettings]
+    ) -> List[ClientCreateResult]:
+        """Create many clients directly in chunks of ``max_size``, bypassing the window."""
+        results = []
+        for start in range(0, len(clients), self.max_size):
+            results.extend(await self._send(panel, inbound_id, clients[start:start + self.max_size]))
+        return results
+
+    def _schedule_flush(self, key: Tuple[str, int]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            task = asyncio.ensure_future(self._flush(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, key: Tuple[str, int], batch: List[PendingCreate]) -> None:
+        try:
+            await self._send_batch(key, batch)
+        finally:
+            self._in_flight[key] -= 1
+            if not self._in_flight[key]:
+                del self._in_flight[key]
+            # Creates gathered while this batch was in flight go out now
+            if self._pending.get(key):
+                self._schedule_flush(key)
+
+    async def _send_batch(self, key: Tuple[str, int], batch: List[PendingCreate]) -> None:
+        name, inbound_id = key
+        try:
+            results = await self._send(self._panels[name], inbound_id, [client for client, _ in batch])
+        except Exception as e:
+            logger.exception(f"Client batch failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _send(
+        self, panel: ThreeXUIClient, inbound_id: int, clients: List[CreateClientSettings]
+    ) -> List[ClientCreateResult]:
+        """Send one batch; return results in the order of ``clients``."""
+        results: Dict[int, ClientCreateResult] = {}
+
+        def fail(index: int, error: str) -> None:
+            results[index] = ClientCreateResult(
+                email=clients[index].email, success=False,
+                node=panel.name, inbound_id=inbound_id, error=error,
+            )
+
+        snapshot = panel.inbound_cache.peek() if panel.inbound_cache.is_fresh() else None
+        known = snapshot.by_email if snapshot else {}
+        remaining: Dict[str, int] = {}
+        for index, client in enumerate(clients):
+            if client.email in remaining or client.email in known:
+                fail(index, f"Duplicate email: {client.email}")
+            else:
+                remaining[client.email] = index
+
+        while remaining:
+            batch = [clients[index] for index in remaining.values()]
+            response = await panel.add_clients(inbound_id, batch)
+            success, msg = response if response else (False, "Auth failed")
+            if success:
+                for index in remaining.values():
+                    results[index] = ClientCreateResult(
+                        email=clients[index].email, success=True, node=panel.name,
+                        inbound_id=inbound_id, client_id=clients[index].id,
+                    )
+                break
+            match = DUPLICATE_EMAIL_RE.search(msg or "")
+            if match and match.group(1) in remaining:
+                fail(remaining.pop(match.group(1)), f"Duplicate email: {match.group(1)}")
+                continue
+            for index in remaining.values():
+                fail(index, msg or "Panel error")
+            break
+
+        logger.info(
+            f"addClient batch on {panel.name}/{inbound_id}: "
+            f"{sum(r.success for r in results.values())}/{len(clients)} created"
+        )
+        return [results[index] for index in range(len(clients))]
+
+
+client_queue = ClientCreationQueue()
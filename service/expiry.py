@@ -0,0 +1,306 @@
+"""Expiry and traffic quota enforcement driven by a timer heap."""
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+from config import settings
+from database.crud import NoticeRepo, UsersRepo
+from service.broadcast import FAILED, Broadcaster, broadcaster
+from service.inbound_cache import InboundSnapshot
+from service.metrics import metrics
+from service.panel_registry import PanelRegistry, panel_registry
+
+EXPIRY_NOTICES = metrics.counter("expiry_notices_total", "Expiry and quota notices sent to users", ("notice",))
+EXPIRY_DISABLED = metrics.counter("expiry_disabled_total", "Clients disabled by the expiry scheduler", ("reason",))
+
+WARN_EXPIRY, WARN_QUOTA, DISABLE = "warn_expiry", "warn_quota", "disable"
+EXPIRED, OVER_QUOTA = "expired", "quota"
+# Seconds before a failed disable is retried
+RETRY_DELAY = 60.0
+GB = 1024 ** 3
+
+DISABLED_TEXT = {
+    EXPIRED: "⛔️ Срок действия доступа к VPN истёк, подключение отключено.",
+    OVER_QUOTA: "⛔️ Трафик исчерпан, подключение к VPN отключено.",
+}
+
+# (due, seq, node, email, version, action, param)
+Entry = Tuple[float, int, str, str, int, str, Any]
+# (state, notice, deadline, text)
+Notice = Tuple['ClientState', str, int, str]
+
+
+@dataclass
+class ClientState:
+    """Limits and usage of one client of one node."""
+    email: str
+    inbound_id: int
+    raw: Dict[str, Any]
+    # Expiry time in ms, 0 for none
+    expiry: int
+    # Traffic quota in bytes, 0 for none
+    total: int
+    used: int
+    # Heap entries with another version are outdated
+    version: int
+    # Highest quota share already queued
+    quota_level: float = 0.0
+
+
+def format_duration(seconds: float) -> str:
+    if seconds >= 86400:
+        return f"{round(seconds / 86400)} дн."
+    if seconds >= 3600:
+        return f"{round(seconds / 3600)} ч."
+    return f"{max(round(seconds / 60), 1)} мин."
+
+
+class ExpiryScheduler:
+    """Warn and disable clients that expire or run out of traffic.
+
+    Expiries and expiry warnings are kept in a min-heap by due time, so the
+    loop sleeps until the next one instead of scanning every client. The
+    heap is fed from inbound snapshot refreshes: only clients whose expiry,
+    quota or usage changed are rescheduled, and outdated entries are
+    dropped by version when popped. Quota thresholds depend on usage, not
+    time, so crossing one queues an entry that is due at once. Due clients
+    are disabled per node in batches; the Xray reload is left to the node's
+    reload debouncer, so a wave of disables costs a single reload. Sent
+    notices are stored, so a restart does not repeat them.
+    """
+
+    def __init__(
+        self,
+        registry: PanelRegistry = panel_registry,
+        notifier: Broadcaster = broadcaster,
+        enabled: bool = settings.EXPIRY_ENABLED,
+        warn_before: Sequence[int] = settings.EXPIRY_WARN_BEFORE,
+        quota_warn_at: Sequence[float] = settings.QUOTA_WARN_AT,
+        disable: bool = settings.EXPIRY_DISABLE,
+        batch_size: int = settings.EXPIRY_BATCH,
+        refresh_interval: float = settings.EXPIRY_REFRESH_INTERVAL,
+    ):
+        self.registry = registry
+        self.notifier = notifier
+        self.enabled = enabled
+        self.warn_before = sorted(warn_before, reverse=True)
+        self.quota_warn_at = sorted(quota_warn_at)
+        self.disable = disable
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self.users_repo = UsersRepo()
+        self.notice_repo = NoticeRepo()
+        self._clients: Dict[str, Dict[str, ClientState]] = {}
+        self._heap: List[Entry] = []
+        self._seq = itertools.count()
+        self._sent: Dict[Tuple[str, str], int] = {}
+        self._wakeup = asyncio.Event()
+        self._listening = False
+        self._task: Optional[asyncio.Task] = None
+        self._notices = {notice: EXPIRY_NOTICES.labels(notice) for notice in ("expire", "quota", "disabled")}
+        self._disabled = {reason: EXPIRY_DISABLED.labels(reason) for reason in (EXPIRED, OVER_QUOTA)}
+
+    async def start(self) -> None:
+        if self._task is not None or not self.enabled:
+            return
+        self._sent = await self.notice_repo.get_all()
+        if not self._listening:
+            for name, client in self.registry.nodes.items():
+                client.inbound_cache.add_listener(lambda snapshot, name=name: self.update(name, snapshot))
+                snapshot = client.inbound_cache.peek()
+                if snapshot is not None:
+                    self.update(name, snapshot)
+            self._listening = True
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Expiry scheduler started, warnings {self.warn_before}s and {self.quota_warn_at}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def update(self, node: str, snapshot: InboundSnapshot) -> None:
+        """Reschedule clients of the node that changed since its previous snapshot."""
+        known = self._clients.get(node, {})
+        current: Dict[str, ClientState] = {}
+        now = time.time()
+        for ib in snapshot.inbounds:
+            stats = ib.stats_by_email
+            for raw in ib.raw_clients:
+                email = raw.get("email")
+                stat = stats.get(email) or {}
+                if not (email and raw.get("enable", True) and stat.get("enable", True)):
+                    continue
+                expiry = raw.get("expiryTime") or 0
+                total = raw.get("totalGB") or 0
+                used = stat.get("up", 0) + stat.get("down", 0)
+                state = known.get(email)
+                if state is not None and (state.inbound_id, state.expiry, state.total) == (ib.id, expiry, total):
+                    state.raw = raw
+                    if state.used != used:
+                        state.used = used
+                        self._schedule_quota(node, state, now)
+                    current[email] = state
+                    continue
+                state = current[email] = ClientState(email, ib.id, raw, expiry, total, used, next(self._seq))
+                self._schedule_expiry(node, state, now)
+                self._schedule_quota(node, state, now)
+        self._clients[node] = current
+        self._compact()
+
+    def _push(self, due: float, node: str, state: ClientState, action: str, param: Any) -> None:
+        heapq.heappush(self._heap, (due, next(self._seq), node, state.email, state.version, action, param))
+        self._wakeup.set()
+
+    def _schedule_expiry(self, node: str, state: ClientState, now: float) -> None:
+        # Negative expiry counts down from the first connection and is not known yet
+        if state.expiry <= 0:
+            return
+        expires_at = state.expiry / 1000
+        passed = [seconds for seconds in self.warn_before if expires_at - seconds <= now]
+        for seconds in self.warn_before:
+            if expires_at - seconds > now:
+                self._push(expires_at - seconds, node, state, WARN_EXPIRY, seconds)
+        if passed and expires_at > now:
+            self._push(now, node, state, WARN_EXPIRY, passed[-1])
+        if self.disable:
+            self._push(expires_at, node, state, DISABLE, EXPIRED)
+
+    def _schedule_quota(self, node: str, state: ClientState, now: float) -> None:
+        if state.total <= 0:
+            return
+        share = state.used / state.total
+        if share >= 1 and self.disable:
+            level, action, param = 1.0, DISABLE, OVER_QUOTA
+        else:
+            reached = [level for level in self.quota_warn_at if level <= share]
+            level = reached[-1] if reached else 0.0
+            action, param = WARN_QUOTA, level
+        if level > state.quota_level:
+            self._push(now, node, state, action, param)
+        state.quota_level = level
+
+    def _lookup(self, node: str, email: str, version: int) -> Optional[ClientState]:
+        state = self._clients.get(node, {}).get(email)
+        return state if state is not None and state.version == version else None
+
+    def _compact(self) -> None:
+        """Drop outdated entries once they outnumber the live ones."""
+        live = sum(len(clients) for clients in self._clients.values())
+        if len(self._heap) > (len(self.warn_before) + 2) * live + 1024:
+            self._heap = [entry for entry in self._heap if self._lookup(*entry[2:5]) is not None]
+            heapq.heapify(self._heap)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Refreshes stale snapshots, which feeds update() through the listeners
+                await self.registry.get_snapshots()
+                await self.process_due()
+            except Exception as e:
+                logger.exception(f"Expiry check failed: {e}")
+            self._wakeup.clear()
+            delay = self.refresh_interval
+            if self._heap:
+                delay = min(delay, max(self._heap[0][0] - time.time(), 0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_due(self) -> None:
+        """Send warnings and disable clients whose entries are due."""
+        now = time.time()
+        warnings: List[Notice] = []
+        due: Dict[str, List[Tuple[ClientState, str]]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, _, node, email, version, action, param = heapq.heappop(self._heap)
+            state = self._lookup(node, email, version)
+            if state is None:
+                continue
+            if action == DISABLE:
+                due.setdefault(node, []).append((state, param))
+            elif action == WARN_EXPIRY:
+                left = state.expiry / 1000 - now
+                # A closer warning point is due as well, only that one is sent
+                if any(seconds < param and left <= seconds for seconds in self.warn_before):
+                    continue
+                text = (f"⏳ Доступ к VPN закончится через {format_duration(left)}\n"
+                        f"Продлите его, чтобы не потерять подключение.")
+                warnings.append((state, f"expire:{param}", state.expiry, text))
+            elif state.quota_level == param:
+                text = (f"📊 Использовано {state.used / state.total:.0%} трафика: "
+                        f"{state.used / GB:.1f} из {state.total / GB:.1f} ГБ")
+                warnings.append((state, f"quota:{param}", state.total, text))
+        sent = await self._warn(warnings)
+        for node, items in due.items():
+            sent.extend(await self._disable(node, items))
+        await self.notice_repo.save(sent)
+
+    async def _chat_id(self, state: ClientState) -> Optional[int]:
+        tg_id = str(state.raw.get("tgId") or "")
+        if tg_id.lstrip("-").isdigit():
+            return int(tg_id)
+        user = await self.users_repo.get_user_by_username(state.email)
+        return user.tg_id if user else None
+
+    async def _warn(self, warnings: List[Notice]) -> List[Tuple[str, str, int]]:
+        """Send notices not sent yet for the same deadline; return those delivered."""
+        pending: Dict[Tuple[str, str], Tuple[ClientState, int, str]] = {}
+        for state, notice, deadline, text in warnings:
+            if self._sent.get((state.email, notice)) != deadline:
+                pending[(state.email, notice)] = (state, deadline, text)
+
+        async def send(state: ClientState, text: str) -> bool:
+            chat_id = await self._chat_id(state)
+            if chat_id is None:
+                return False
+            return await self.notifier.notify(chat_id, text) != FAILED
+
+        results = await asyncio.gather(*(send(state, text) for state, _, text in pending.values()))
+        sent = []
+        for ((email, notice), (_, deadline, _)), ok in zip(pending.items(), results):
+            if ok:
+                self._sent[(email, notice)] = deadline
+                self._notices[notice.split(":")[0]].inc()
+                sent.append((email, notice, deadline))
+        return sent
+
+    async def _disable(self, node: str, items: List[Tuple[ClientState, str]]) -> List[Tuple[str, str, int]]:
+        client = self.registry.get(node)
+        if client is None:
+            return []
+        sent = []
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            results = await asyncio.gather(*(
+                client.update_client(state.inbound_id, {**state.raw, "enable": False}) for state, _ in batch
+            ))
+            disabled = [(state, reason) for (state, reason), ok in zip(batch, results) if ok]
+            retry_at = time.time() + RETRY_DELAY
+            for (state, reason), ok in zip(batch, results):
+                if not ok:
+                    self._push(retry_at, node, state, DISABLE, reason)
+            logger.info(f"Disabled {len(disabled)} of {len(batch)} due clients on {node}")
+            notices = []
+            for state, reason in disabled:
+                self._clients.get(node, {}).pop(state.email, None)
+                self._disabled[reason].inc()
+                deadline = state.expiry if reason == EXPIRED else state.total
+                notices.append((state, f"disabled:{reason}", deadline, DISABLED_TEXT[reason]))
+            sent.extend(await self._warn(notices))
+        return sent
+
+
+expiry_scheduler = ExpiryScheduler()
@@ -1,11 +1,38 @@
 """Telegram bot handlers."""
 
+import os
+import tempfile
+import time
 from typing import Optional
 from loguru import logger
 from aiogram import types
 from aiogram.filters.command import Command
-from database.crud import UsersRepo
-from service.vless_service import VlessService
+from config import settings
+from database.cache import user_cache
+from database.crud import UsersRepo, TrafficRepo
+from service.broadcast import broadcaster
+from service.metrics import metrics, ratio, timed
+from service.middlewares import PANEL_UNAVAILABLE
+from service.panel_registry import panel_registry
+from service.presence import presence_tracker
+from service.reconcile import reconciler
+from service.transfer import FORMATS, client_transfer
+from service.vless_service import FAILED, NOT_FOUND, REMOVED, VlessService
+
+# Largest file a bot may download through the Bot API
+MAX_DOWNLOAD_SIZE = 20 * 1024 * 1024
+
+HANDLER_SECONDS = metrics.histogram("bot_handler_seconds", "Command handler latency", ("command",))
+
+
+def format_bytes(size: int) -> str:
+    """Human readable traffic size."""
+    value = float(size)
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} ТБ"
 
 
 class BotHandlers:
@@ -14,41 +41,53 @@ class BotHandlers:
     def __init__(self):
         self.users_repo = UsersRepo()
         self.vless_service = VlessService()
+        self.traffic_repo = TrafficRepo()
     
+    @timed(HANDLER_SECONDS.labels("start"))
     async def start(self, message: types.Message) -> None:
         """Handle /start command."""
         try:
             welcome_msg = "Вас привествует бот yuukich1\nТут вы можете получить свой vless ключ"
             await message.answer(welcome_msg)
             await self.users_repo.add_new_users(message.chat.username, message.chat.id)
+            await broadcaster.unblock(message.chat.id)
             logger.info(f"New user: {message.chat.username} ({message.chat.id})")
         except Exception as e:
             logger.error(f"Error in start handler: {e}")
             await message.answer("Произошла ошибка. Попробуйте позже.")
     
+    @timed(HANDLER_SECONDS.labels("help"))
     async def help_command(self, message: types.Message) -> None:
         """Handle /help command."""
         help_message = (
             "/vless - получить свой vless\n"
             "/create - создать свой vless ключ\n"
             "/remove - удалить свой vless ключ\n"
-            "/online - посмотреть список клиентов которые онлайн"
+            "/online - посмотреть список клиентов которые онлайн\n"
+            "/stats - статистика трафика"
         )
         await message.answer(help_message)
-        logger.debug(f"Help requested by {message.chat.username}")
+        logger.debug("Help requested by {}", message.chat.username)
     
+    @timed(HANDLER_SECONDS.labels("vless"))
     async def get_vless(self, message: types.Message) -> None:
         """Handle /vless command."""
         try:
             vless_link = await self.vless_service.get_vless_link(message.chat.username)
             if vless_link:
                 await message.answer(f"Ваш VLESS ключ:\n\n ```\n{vless_link}\n```", parse_mode='MarkdownV2')
+                sub_url = await self.vless_service.get_subscription_url(message.chat.username)
+                if sub_url:
+                    await message.answer(f"Ссылка на подписку (обновляется автоматически):\n{sub_url}")
+            elif not panel_registry.available:
+                await message.answer(PANEL_UNAVAILABLE)
             else:
                 await message.answer("У вас нет ни одного профиля. Создайте его с помощью /create")
         except Exception as e:
             logger.error(f"Error getting VLESS link: {e}")
             await message.answer("Произошла ошибка при получении ключа.")
     
+    @timed(HANDLER_SECONDS.labels("create"))
     async def create_client(self, message: types.Message) -> None:
         """Handle /create command."""
         try:
@@ -62,10 +101,234 @@ class BotHandlers:
                 logger.error(f"Error creating client: {err}")
                 await message.answer("❌ Ошибка при создании клиента. Попробуйте позже.")
     
+    @timed(HANDLER_SECONDS.labels("remove"))
     async def remove_client(self, message: types.Message) -> None:
         """Handle /remove command."""
-        await message.answer("❌ Эта функция еще не реализована")
+        try:
+            removed = await self.vless_service.remove_vless_client(message.chat.username)
+        except Exception as e:
+            logger.error(f"Error removing client: {e}")
+            await message.answer("❌ Ошибка при удалении клиента. Попробуйте позже.")
+            return
+        if removed == REMOVED:
+            await message.answer("✅ Профиль удалён")
+            logger.info(f"Client removed for {message.chat.username}")
+        elif removed == FAILED:
+            await message.answer("❌ Не удалось удалить профиль: сервер недоступен. Попробуйте позже.")
+        else:
+            await message.answer("У вас нет ни одного профиля")
+
+    @timed(HANDLER_SECONDS.labels("bulkcreate"))
+    async def bulk_create(self, message: types.Message) -> None:
+        """Handle /bulkcreate command: create clients for usernames."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        usernames = list(dict.fromkeys((message.text or "").split()[1:]))
+        if not usernames:
+            await message.answer("Использование: /bulkcreate <username> [username ...]")
+            return
+        try:
+            results = await self.vless_service.bulk_create_clients(usernames)
+        except Exception as e:
+            logger.error(f"Error in bulk create: {e}")
+            await message.answer("Произошла ошибка при создании.")
+            return
+        existing = [result.email for result in results if result.duplicate]
+        failed = [result.email for result in results if not result.success and not result.duplicate]
+        created = len(usernames) - len(existing) - len(failed)
+        answer = f"➕ Создано: {created} из {len(usernames)}"
+        if existing:
+            answer += f"\nУже существуют: {', '.join(existing)}"
+        if failed:
+            answer += f"\nНе созданы: {', '.join(failed)}"
+        await message.answer(answer)
+
+    @timed(HANDLER_SECONDS.labels("bulkremove"))
+    async def bulk_remove(self, message: types.Message) -> None:
+        """Handle /bulkremove command: delete clients by username."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        usernames = list(dict.fromkeys((message.text or "").split()[1:]))
+        if not usernames:
+            await message.answer("Использование: /bulkremove <username> [username ...]")
+            return
+        try:
+            results = await self.vless_service.remove_vless_clients(usernames)
+        except Exception as e:
+            logger.error(f"Error in bulk remove: {e}")
+            await message.answer("Произошла ошибка при удалении.")
+            return
+        missing = [username for username, result in results.items() if result == NOT_FOUND]
+        failed = [username for username, result in results.items() if result == FAILED]
+        removed = len(usernames) - len(missing) - len(failed)
+        answer = f"🗑 Удалено: {removed} из {len(usernames)}"
+        if missing:
+            answer += f"\nНе найдены: {', '.join(missing)}"
+        if failed:
+            answer += f"\nНе удалены, повторите позже: {', '.join(failed)}"
+        await message.answer(answer)
     
+    @timed(HANDLER_SECONDS.labels("online"))
     async def get_online(self, message: types.Message) -> None:
         """Handle /online command."""
-        await message.answer("⏳ Функция в разработке")
+        if presence_tracker.updated_at is None:
+            await message.answer("⏳ Данные об онлайне ещё собираются, попробуйте позже")
+            return
+        args = (message.text or "").split()
+        page = int(args[1]) if len(args) > 1 and args[1].isdigit() else 1
+        emails, pages = presence_tracker.page(page)
+        page = min(max(page, 1), pages)
+        header = f"🟢 Онлайн: {len(presence_tracker.online)}"
+        if pages > 1:
+            header += f" (стр. {page}/{pages}, /online N)"
+        await message.answer("\n".join([header, *emails]))
+
+    @timed(HANDLER_SECONDS.labels("watch"))
+    async def watch_online(self, message: types.Message) -> None:
+        """Handle /watch command: toggle join/leave notifications for admins."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        if presence_tracker.subscribe(message.chat.id):
+            await message.answer("🔔 Уведомления о подключениях включены")
+        else:
+            await message.answer("🔕 Уведомления о подключениях выключены")
+
+    @timed(HANDLER_SECONDS.labels("stats"))
+    async def get_stats(self, message: types.Message) -> None:
+        """Handle /stats command."""
+        try:
+            username = message.chat.username
+            totals = await self.traffic_repo.get_totals(username)
+            if totals is None:
+                await message.answer("Статистика пока недоступна")
+                return
+            now = int(time.time())
+            day_up, day_down = await self.traffic_repo.get_usage(username, 'hour', now - 86400)
+            month_up, month_down = await self.traffic_repo.get_usage(username, 'day', now - 30 * 86400)
+            await message.answer(
+                "📊 Ваш трафик\n\n"
+                f"За 24 часа: ↑ {format_bytes(day_up)} ↓ {format_bytes(day_down)}\n"
+                f"За 30 дней: ↑ {format_bytes(month_up)} ↓ {format_bytes(month_down)}\n"
+                f"Всего: ↑ {format_bytes(totals[0])} ↓ {format_bytes(totals[1])}"
+            )
+        except Exception as e:
+            logger.error(f"Error getting stats: {e}")
+            await message.answer("Произошла ошибка при получении статистики.")
+
+    @timed(HANDLER_SECONDS.labels("metrics"))
+    async def get_metrics(self, message: types.Message) -> None:
+        """Handle /metrics command: send metrics in Prometheus format to admins."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        lines = [
+            "📈 Метрики",
+            f"Кэш пользователей: {ratio(user_cache.hits, user_cache.misses):.1%} попаданий",
+        ]
+        for name, client in panel_registry.nodes.items():
+            cache = client.inbound_cache
+            lines.append(f"Кэш inbound'ов {name}: {ratio(cache.hits, cache.misses):.1%} попаданий")
+        await message.answer_document(
+            types.BufferedInputFile(metrics.render().encode(), filename="metrics.txt"),
+            caption="\n".join(lines),
+        )
+
+    @timed(HANDLER_SECONDS.labels("broadcast"))
+    async def broadcast(self, message: types.Message) -> None:
+        """Handle /broadcast command: start, inspect or cancel announcements."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        parts = (message.text or "").split(maxsplit=1)
+        arg = parts[1].strip() if len(parts) > 1 else ""
+        if not arg:
+            await message.answer(
+                "/broadcast <текст> - разослать сообщение всем пользователям\n"
+                "/broadcast status - активные рассылки\n"
+                "/broadcast cancel <id> - остановить рассылку"
+            )
+            return
+        if arg == "status":
+            lines = []
+            for item in await broadcaster.repo.get_running():
+                lines.append(
+                    f"#{item.id}: доставлено {item.sent}, заблокировали {item.blocked}, ошибки {item.failed}"
+                )
+            await message.answer("\n".join(lines) if lines else "Активных рассылок нет")
+            return
+        command, _, value = arg.partition(" ")
+        if command == "cancel" and value.strip().isdigit():
+            if await broadcaster.cancel(int(value)):
+                await message.answer(f"⏹ Рассылка #{value.strip()} остановлена")
+            else:
+                await message.answer("Рассылка не найдена среди активных")
+            return
+        item = await broadcaster.create(arg, message.chat.id)
+        await message.answer(f"📣 Рассылка #{item.id} запущена")
+
+    @timed(HANDLER_SECONDS.labels("reconcile"))
+    async def reconcile(self, message: types.Message) -> None:
+        """Handle /reconcile command: sync stored links with the panels now."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        full = (message.text or "").split()[1:2] == ["full"]
+        try:
+            report = await reconciler.reconcile(full=full)
+        except Exception as e:
+            logger.error(f"Error in reconcile: {e}")
+            await message.answer("Произошла ошибка при сверке.")
+            return
+        await message.answer(report.summary())
+
+    @timed(HANDLER_SECONDS.labels("export"))
+    async def export_clients(self, message: types.Message) -> None:
+        """Handle /export command: send all clients as gzipped CSV or JSONL."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        args = (message.text or "").split()[1:2]
+        fmt = args[0] if args and args[0] in FORMATS else "csv"
+        await message.answer("⏳ Готовлю выгрузку...")
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                paths, count = await client_transfer.export_file(
+                    os.path.join(directory, f"clients.{fmt}.gz"), fmt, part_size=settings.EXPORT_PART_SIZE
+                )
+                for index, path in enumerate(paths, 1):
+                    caption = f"📤 Клиентов: {count}" + (f" (часть {index}/{len(paths)})" if len(paths) > 1 else "")
+                    await message.answer_document(types.FSInputFile(path), caption=caption)
+        except Exception as e:
+            logger.error(f"Error in export: {e}")
+            await message.answer("Произошла ошибка при выгрузке.")
+
+    @timed(HANDLER_SECONDS.labels("import"))
+    async def import_clients(self, message: types.Message) -> None:
+        """Handle /import command: create clients from an attached CSV or JSONL file."""
+        if message.chat.id not in settings.ADMIN_IDS:
+            await message.answer("❌ Команда доступна только администраторам")
+            return
+        document = message.document or (message.reply_to_message and message.reply_to_message.document)
+        if document is None:
+            await message.answer(
+                "Использование: отправьте CSV или JSONL файл (можно .gz) с подписью /import "
+                "или ответьте /import на сообщение с файлом"
+            )
+            return
+        if (document.file_size or 0) > MAX_DOWNLOAD_SIZE:
+            await message.answer("❌ Файл больше 20 МБ, используйте python -m service.transfer import")
+            return
+        await message.answer("⏳ Импортирую клиентов...")
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, os.path.basename(document.file_name or "clients.csv"))
+                await message.bot.download(document, destination=path)
+                report = await client_transfer.import_file(path)
+        except Exception as e:
+            logger.error(f"Error in import: {e}")
+            await message.answer("Произошла ошибка при импорте.")
+            return
+        await message.answer(report.summary())
@@ -0,0 +1,158 @@
+"""Shared in-memory snapshot of panel inbounds."""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+from config import settings
+from schemas.clients import XUIClient
+from schemas.inbounds import LazyInbound
+
+
+@dataclass
+class InboundSnapshot:
+    """Inbound list fetched at one point in time, indexed by client email.
+
+    The indexes hold raw client dicts; ``find()`` validates a single client.
+    One subscription id may be shared by clients of several inbounds.
+    """
+    inbounds: List[LazyInbound]
+    fetched_at: float
+    generation: int
+    by_email: Dict[str, Tuple[LazyInbound, Dict[str, Any]]] = field(default_factory=dict)
+    by_sub_id: Dict[str, List[Tuple[LazyInbound, Dict[str, Any]]]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, inbounds: List[LazyInbound], generation: int) -> 'InboundSnapshot':
+        by_email = {}
+        by_sub_id: Dict[str, List[Tuple[LazyInbound, Dict[str, Any]]]] = {}
+        for ib in inbounds:
+            for cl in ib.raw_clients:
+                by_email[cl.get("email")] = (ib, cl)
+                sub_id = cl.get("subId")
+                if sub_id:
+                    by_sub_id.setdefault(sub_id, []).append((ib, cl))
+        return cls(
+            inbounds=inbounds,
+            fetched_at=time.monotonic(),
+            generation=generation,
+            by_email=by_email,
+            by_sub_id=by_sub_id,
+        )
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def find(self, email: str) -> Optional[Tuple[LazyInbound, XUIClient]]:
+        entry = self.by_email.get(email)
+        if entry is None:
+            return None
+        ib, raw_client = entry
+        return ib, XUIClient.model_validate(raw_client)
+
+
+class InboundCache:
+    """TTL cache of the inbound snapshot with single-flight refresh.
+
+    Concurrent callers share one in-flight request to the panel. Writes call
+    ``invalidate()``, after which callers never reuse a refresh started
+    before the write. Listeners are called with every snapshot that
+    becomes current.
+
+    A snapshot past its TTL but younger than ``max_stale`` is returned at
+    once while it is refreshed in the background, and is also returned if
+    the refresh fails. Snapshots invalidated by a write are only served on
+    failure.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[Optional[List[LazyInbound]]]],
+        ttl: float = settings.INBOUND_CACHE_TTL,
+        max_stale: float = settings.INBOUND_CACHE_MAX_STALE,
+    ):
+        self._loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._snapshot: Optional[InboundSnapshot] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self._listeners: List[Callable[[InboundSnapshot], None]] = []
+
+    def add_listener(self, callback: Callable[[InboundSnapshot], None]) -> None:
+        self._listeners.append(callback)
+
+    def peek(self) -> Optional[InboundSnapshot]:
+        """Return the last snapshot without refreshing, even if stale."""
+        return self._snapshot
+
+    def is_fresh(self) -> bool:
+        snapshot = self._snapshot
+        return (
+            snapshot is not None
+            and snapshot.generation == self._generation
+            and snapshot.age < self.ttl
+        )
+
+    def invalidate(self) -> None:
+        """Mark current snapshot stale and detach any in-flight refresh."""
+        self._generation += 1
+        self._inflight = None
+
+    async def get(self) -> Optional[InboundSnapshot]:
+        """Return a fresh snapshot, refreshing from the panel if needed."""
+        snapshot = self._snapshot
+        if self.is_fresh():
+            self.hits += 1
+            return snapshot
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh(self._generation))
+        usable = snapshot is not None and snapshot.age < self.max_stale
+        if usable and snapshot.generation == self._generation:
+            self.stale_hits += 1
+            return snapshot
+        self.misses += 1
+        fresh = await asyncio.shield(self._inflight)
+        if fresh is None and usable:
+            self.stale_hits += 1
+            return snapshot
+        return fresh
+
+    async def get_fresh(self) -> Optional[InboundSnapshot]:
+        """Load a snapshot from the panel now; None if the panel did not answer."""
+        self.invalidate()
+        generation = self._generation
+        snapshot = await self.get()
+        if snapshot is None or snapshot.generation < generation:
+            return None
+        return snapshot
+
+    async def _refresh(self, generation: int) -> Optional[InboundSnapshot]:
+        self.refreshes += 1
+        try:
+            try:
+                inbounds = await self._loader()
+            except Exception as e:
+                logger.error(f"Inbound snapshot refresh failed: {e!r}")
+                return None
+            if inbounds is None:
+                return None
+            snapshot = InboundSnapshot.build(inbounds, generation)
+            if generation == self._generation:
+                self._snapshot = snapshot
+                for callback in self._listeners:
+                    try:
+                        callback(snapshot)
+                    except Exception as e:
+                        logger.exception(f"Snapshot listener failed: {e}")
+            logger.debug("Inbound snapshot refreshed: {} clients", len(snapshot.by_email))
+            return snapshot
+        finally:
+            if self._inflight is asyncio.current_task():
+                self._inflight = None
@@ -0,0 +1,94 @@
+"""Election of the one bot process that runs background jobs."""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+from config import settings
+from database.crud import LeaseRepo
+from service.metrics import metrics
+
+LEASE_NAME = "background_jobs"
+
+IS_LEADER = metrics.gauge("bot_leader", "1 while this process runs background jobs")
+
+
+class LeaderElection:
+    """Hold a database lease so only one of several processes runs the jobs.
+
+    The lease is renewed every third of ``ttl``. A process that cannot
+    renew it for ``ttl`` seconds stops its jobs, and another process takes
+    over once the lease has expired. On a clean shutdown the lease is
+    released at once. With ``enabled`` off the process never runs jobs.
+    """
+
+    def __init__(
+        self,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        ttl: float = settings.LEADER_LEASE_TTL,
+        enabled: bool = settings.BACKGROUND_JOBS,
+    ):
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.ttl = ttl
+        self.enabled = enabled
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.repo = LeaseRepo()
+        self.is_leader = False
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Leader election started as {self.owner}, lease {self.ttl}s")
+        elif not self.enabled:
+            logger.info("Background jobs disabled in this process")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            await self._demote()
+            try:
+                await self.repo.release(LEASE_NAME, self.owner)
+            except Exception as e:
+                logger.error(f"Failed to release leader lease: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                acquired = await self.repo.acquire(LEASE_NAME, self.owner, self.ttl)
+            except Exception as e:
+                logger.error(f"Leader lease renewal failed: {e}")
+                # Keep the jobs only while the lease we hold can still be valid
+                acquired = self.is_leader and time.monotonic() - self._renewed_at < self.ttl
+            else:
+                if acquired:
+                    self._renewed_at = time.monotonic()
+            try:
+                if acquired and not self.is_leader:
+                    logger.info(f"{self.owner} is now the leader, starting background jobs")
+                    self.is_leader = True
+                    IS_LEADER.set(1)
+                    await self.on_elected()
+                elif not acquired and self.is_leader:
+                    logger.warning(f"{self.owner} lost the leader lease, stopping background jobs")
+                    await self._demote()
+            except Exception as e:
+                logger.exception(f"Leader transition failed: {e}")
+            await asyncio.sleep(self.ttl / 3)
+
+    async def _demote(self) -> None:
+        self.is_leader = False
+        IS_LEADER.set(0)
+        await self.on_demoted()
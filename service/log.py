@@ -0,0 +1,157 @@
+"""Logging setup: level from settings, background sinks and sampling."""
+
+import inspect
+import json
+import logging
+import sys
+from typing import Any, Dict, Optional
+from loguru import logger
+from config import settings
+from service.metrics import metrics
+
+SAMPLED_OUT = metrics.counter(
+    "log_records_sampled_out_total", "Log records dropped by sampling", ("key",))
+
+CONSOLE_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+
+
+class Sampler:
+    """Keep one of every ``1 / rate`` records of each sample key.
+
+    Records below ``min_level`` are neither counted nor kept. Counting
+    instead of drawing random numbers keeps the output evenly spread and
+    the cost negligible.
+    """
+
+    def __init__(self, rates: Dict[str, float], default: float = 1.0, min_level: int = 0):
+        self.rates = rates
+        self.default = default
+        self.min_level = min_level
+        self._every: Dict[str, int] = {}
+        self._seen: Dict[str, int] = {}
+
+    def configure(self, rates: Dict[str, float], default: float, min_level: int) -> None:
+        self.rates, self.default, self.min_level = rates, default, min_level
+        self._every.clear()
+
+    def keep(self, key: str, level_no: int) -> bool:
+        if level_no < self.min_level:
+            return False
+        every = self._every.get(key)
+        if every is None:
+            rate = self.rates.get(key, self.default)
+            every = self._every[key] = 0 if rate <= 0 else max(1, round(1 / rate))
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        if every and seen % every == 0:
+            return True
+        SAMPLED_OUT.labels(key).inc()
+        return False
+
+
+sampler = Sampler(settings.LOG_SAMPLE_RATES, settings.LOG_SAMPLE_RATE)
+
+
+class SampledLogger:
+    """Logger of a high-volume event; only a share of its records is written.
+
+    The share is ``LOG_SAMPLE_RATES[key]``, or ``LOG_SAMPLE_RATE`` for
+    unlisted keys. The decision is taken before loguru sees the record, so
+    a dropped record is never formatted; pass arguments as ``{}``
+    placeholders rather than f-strings.
+    """
+
+    LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20}
+
+    def __init__(self, key: str):
+        self.key = key
+        self._logger = logger.bind(sample=key)
+
+    def _log(self, level: str, message: str, *args: Any, **kwargs: Any) -> None:
+        if sampler.keep(self.key, self.LEVELS[level]):
+            self._logger.opt(depth=2).log(level, message, *args, **kwargs)
+
+    def trace(self, message: str, *args: Any, **kwargs: Any) -> None:
+        self._log("TRACE", message, *args, **kwargs)
+
+    def debug(self, message: str, *args: Any, **kwargs: Any) -> None:
+        self._log("DEBUG", message, *args, **kwargs)
+
+    def info(self, message: str, *args: Any, **kwargs: Any) -> None:
+        self._log("INFO", message, *args, **kwargs)
+
+
+def sampled(key: str) -> SampledLogger:
+    """Sampled logger for the high-volume event ``key``."""
+    return SampledLogger(key)
+
+
+def json_format(record: Dict[str, Any]) -> str:
+    """Loguru format function writing each record as one JSON line."""
+    payload = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    extra = {key: value for key, value in record["extra"].items() if key != "json"}
+    if extra:
+        payload["extra"] = extra
+    exception = record["exception"]
+    if exception is not None:
+        payload["exception"] = f"{exception.type.__name__}: {exception.value}" if exception.type else None
+    record["extra"]["json"] = json.dumps(payload, ensure_ascii=False, default=str)
+    return "{extra[json]}\n{exception}" if exception is not None else "{extra[json]}\n"
+
+
+class InterceptHandler(logging.Handler):
+    """Route records of stdlib loggers (aiogram, aiohttp, asyncio) to loguru."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level: Any = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        # Report the caller of the stdlib logger, not the logging module
+        frame, depth = inspect.currentframe(), 0
+        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+def setup_logging(
+    level: str = settings.LOG_LEVEL,
+    file: Optional[str] = settings.LOG_FILE,
+    json_file: bool = settings.LOG_JSON,
+) -> None:
+    """Replace the default loguru sink with enqueued console and file sinks.
+
+    Sinks are written by a background thread, so a slow disk never stalls
+    the event loop; ``logger.complete()`` waits for pending records.
+    """
+    level = level.upper()
+    sampler.configure(settings.LOG_SAMPLE_RATES, settings.LOG_SAMPLE_RATE, logger.level(level).no)
+    logger.remove()
+    logger.add(sys.stderr, level=level, format=CONSOLE_FORMAT, enqueue=True)
+    if file:
+        logger.add(
+            file,
+            level=level,
+            format=json_format if json_file else CONSOLE_FORMAT,
+            enqueue=True,
+            rotation=settings.LOG_ROTATION,
+            retention=settings.LOG_RETENTION or None,
+            colorize=False,
+        )
+    stdlib_level = logging.getLevelName(level)
+    logging.basicConfig(
+        handlers=[InterceptHandler()],
+        level=stdlib_level if isinstance(stdlib_level, int) else logging.INFO,
+        force=True,
+    )
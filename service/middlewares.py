@@ -0,0 +1,109 @@
+"""Dispatcher middlewares."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from loguru import logger
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+from config import settings
+from service.rate_limit import BucketMap
+
+PANEL_UNAVAILABLE = "⚠️ Панель временно недоступна, попробуйте позже"
+
+
+def get_command(message: Message) -> Optional[str]:
+    """Command name of a message without slash and bot mention."""
+    text = message.text or ""
+    if not text.startswith("/"):
+        return None
+    return text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+
+
+class PanelGuardMiddleware(BaseMiddleware):
+    """Shed load before it reaches the panel.
+
+    - a repeated mutating command of a user joins the one already running
+      instead of starting a second one;
+    - token buckets limit commands per user and per user and command;
+    - panel-touching commands share a global concurrency cap and get a fast
+      "busy" answer when it is saturated;
+    - mutating commands are refused at once while no panel is available.
+    """
+
+    def __init__(
+        self,
+        user_rate: float = settings.THROTTLE_USER_RATE,
+        user_burst: int = settings.THROTTLE_USER_BURST,
+        command_per_minute: Optional[Dict[str, int]] = None,
+        panel_commands: Iterable[str] = settings.PANEL_COMMANDS,
+        mutating_commands: Iterable[str] = settings.MUTATING_COMMANDS,
+        max_concurrency: int = settings.PANEL_MAX_CONCURRENCY,
+        panel_available: Callable[[], bool] = lambda: True,
+    ):
+        self.user_buckets = BucketMap(user_rate, user_burst)
+        per_minute = command_per_minute if command_per_minute is not None else settings.THROTTLE_COMMAND_PER_MINUTE
+        self.command_buckets = {
+            command: BucketMap(limit / 60, limit) for command, limit in per_minute.items()
+        }
+        self.panel_commands = frozenset(panel_commands)
+        self.mutating_commands = frozenset(mutating_commands)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.panel_available = panel_available
+        self._inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Message):
+            return await handler(event, data)
+        command = get_command(event)
+        if command is None:
+            return await handler(event, data)
+        user_id = event.from_user.id if event.from_user else event.chat.id
+
+        key = (user_id, command)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            logger.debug("Joining in-flight /{} of {}", command, user_id)
+            return await asyncio.shield(inflight)
+
+        if not self.user_buckets.consume(user_id):
+            await event.answer("⏳ Слишком много запросов, попробуйте позже")
+            return None
+        command_buckets = self.command_buckets.get(command)
+        if command_buckets is not None and not command_buckets.consume(user_id):
+            await event.answer(f"⏳ Слишком часто /{command}, попробуйте позже")
+            return None
+
+        if command not in self.mutating_commands:
+            return await self._guarded(command, handler, event, data)
+        if not self.panel_available():
+            await event.answer(PANEL_UNAVAILABLE)
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._guarded(command, handler, event, data)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so waiter-less futures don't warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _guarded(self, command, handler, event: Message, data: Dict[str, Any]) -> Any:
+        if command not in self.panel_commands:
+            return await handler(event, data)
+        if self.semaphore.locked():
+            logger.warning(f"Panel concurrency limit reached, rejecting /{command}")
+            await event.answer("⏳ Сервер занят, повторите через несколько секунд")
+            return None
+        async with self.semaphore:
+            return await handler(event, data)
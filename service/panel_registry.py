@@ -0,0 +1,132 @@
+"""Registry of 3x-UI panel nodes with concurrent fan-out reads."""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+from loguru import logger
+from config import settings
+from schemas.clients import XUIClient
+from schemas.inbounds import InboundModel
+from service.inbound_cache import InboundSnapshot
+from service.metrics import metrics, ratio
+from service.resilience import OPEN
+from service.threex_ui_client import ThreeXUIClient
+
+T = TypeVar('T')
+
+
+class PanelRegistry:
+    """Set of ``ThreeXUIClient`` instances, one per configured node.
+
+    Read operations query every node concurrently with a per-node timeout.
+    A slow or failing node is skipped, so the merged result degrades
+    instead of blocking.
+    """
+
+    def __init__(self, clients: List[ThreeXUIClient], node_timeout: float = settings.THREEX_NODE_TIMEOUT):
+        if not clients:
+            raise ValueError("At least one panel node is required")
+        self.nodes: Dict[str, ThreeXUIClient] = {client.name: client for client in clients}
+        self.node_timeout = node_timeout
+
+    @classmethod
+    def from_settings(cls) -> 'PanelRegistry':
+        return cls([ThreeXUIClient.from_node(node) for node in settings.panel_nodes()])
+
+    @property
+    def primary(self) -> ThreeXUIClient:
+        """First configured node, used for writes without explicit placement."""
+        return next(iter(self.nodes.values()))
+
+    def get(self, name: str) -> Optional[ThreeXUIClient]:
+        return self.nodes.get(name)
+
+    @property
+    def available(self) -> bool:
+        """False when the circuit of every node is open."""
+        return any(client.breaker.state != OPEN for client in self.nodes.values())
+
+    async def _fan_out(self, call: Callable[[ThreeXUIClient], Awaitable[Optional[T]]]) -> Dict[str, T]:
+        """Run ``call`` on every node, return results of nodes that answered in time."""
+        names = list(self.nodes)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(call(self.nodes[name]), self.node_timeout) for name in names),
+            return_exceptions=True,
+        )
+        merged: Dict[str, T] = {}
+        for name, result in zip(names, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning(f"Node {name} timed out after {self.node_timeout}s")
+            elif isinstance(result, BaseException):
+                logger.error(f"Node {name} failed: {result!r}")
+            elif result is not None:
+                merged[name] = result
+        return merged
+
+    async def get_snapshots(self) -> Dict[str, InboundSnapshot]:
+        return await self._fan_out(lambda client: client.inbound_cache.get())
+
+    async def get_fresh_snapshots(self) -> Dict[str, InboundSnapshot]:
+        """Snapshots loaded from the panels now, never cached ones; for decisions on absence."""
+        return await self._fan_out(lambda client: client.inbound_cache.get_fresh())
+
+    async def get_all_inbounds(self) -> Dict[str, List[InboundModel]]:
+        return await self._fan_out(lambda client: client.get_all_inbounds())
+
+    async def get_client_by_username(self, username: str) -> Optional[XUIClient]:
+        snapshots = await self.get_snapshots()
+        for snapshot in snapshots.values():
+            entry = snapshot.find(username)
+            if entry:
+                return entry[1]
+        return None
+
+    async def get_vless_url_by_username(self, username: str) -> List[str]:
+        links = await self._fan_out(lambda client: client.get_vless_url_by_username(username))
+        return [link for node_links in links.values() for link in node_links]
+
+    async def get_online_by_node(self) -> Dict[str, List[str]]:
+        """Online emails of every node that answered."""
+        return await self._fan_out(lambda client: client.get_online())
+
+    async def get_online(self) -> List[str]:
+        onlines = await self.get_online_by_node()
+        return list(dict.fromkeys(email for emails in onlines.values() for email in emails))
+
+    def start(self) -> None:
+        """Start session keeping of every node."""
+        for client in self.nodes.values():
+            client.start()
+
+    async def close(self) -> None:
+        await asyncio.gather(*(client.close() for client in self.nodes.values()))
+
+
+panel_registry = PanelRegistry.from_settings()
+
+metrics.callback(
+    "inbound_cache_requests_total", "Inbound snapshot lookups by result", "counter", ("node", "result"),
+    lambda: [
+        ((name, result), value)
+        for name, client in panel_registry.nodes.items()
+        for result, value in (
+            ("hit", client.inbound_cache.hits),
+            ("stale", client.inbound_cache.stale_hits),
+            ("miss", client.inbound_cache.misses),
+        )
+    ],
+)
+metrics.callback(
+    "inbound_cache_refreshes_total", "Inbound snapshot loads from the panel", "counter", ("node",),
+    lambda: [((name,), client.inbound_cache.refreshes) for name, client in panel_registry.nodes.items()],
+)
+metrics.callback(
+    "inbound_cache_hit_ratio", "Share of inbound snapshot lookups served from cache", "gauge", ("node",),
+    lambda: [
+        ((name,), ratio(client.inbound_cache.hits, client.inbound_cache.misses))
+        for name, client in panel_registry.nodes.items()
+    ],
+)
+metrics.callback(
+    "panel_circuit_open", "1 while the circuit breaker of the node is open", "gauge", ("node",),
+    lambda: [((name,), int(client.breaker.state == OPEN)) for name, client in panel_registry.nodes.items()],
+)
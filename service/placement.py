@@ -0,0 +1,193 @@
+"""Placement of new clients across inbounds and nodes."""
+
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from config import settings
+from schemas.inbounds import LazyInbound
+from service.inbound_cache import InboundSnapshot
+from service.panel_registry import PanelRegistry, panel_registry
+from service.threex_ui_client import ThreeXUIClient
+
+
+@dataclass
+class InboundLoad:
+    """Load figures of one inbound taken from the inbound snapshot."""
+    node: str
+    inbound_id: int
+    clients: int
+    up: int
+    down: int
+    all_time: int
+    enable: bool
+    total: int
+    inbound_traffic: int
+
+    @property
+    def traffic(self) -> int:
+        return self.up + self.down
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """Remaining inbound quota in bytes, None when unlimited.
+
+        The quota applies to the inbound's own counters, which keep the
+        traffic of deleted clients and reset stats that clientStats lose.
+        """
+        return self.total - self.inbound_traffic if self.total else None
+
+    @property
+    def available(self) -> bool:
+        remaining = self.remaining
+        return self.enable and (remaining is None or remaining > 0)
+
+    @classmethod
+    def from_inbound(cls, node: str, ib: LazyInbound) -> 'InboundLoad':
+        up = down = all_time = 0
+        for stat in ib.raw_client_stats:
+            up += stat.get("up", 0)
+            down += stat.get("down", 0)
+            all_time += stat.get("allTime", 0)
+        return cls(
+            node=node,
+            inbound_id=ib.id,
+            clients=len(ib.raw_clients),
+            up=up,
+            down=down,
+            all_time=all_time,
+            enable=ib.enable,
+            total=ib.total,
+            inbound_traffic=ib.up + ib.down,
+        )
+
+
+class PlacementStrategy:
+    """Base strategy: pick the candidate with the lowest score."""
+    name = ""
+
+    def choose(self, loads: List[InboundLoad]) -> InboundLoad:
+        return min(loads, key=self.score)
+
+    def score(self, load: InboundLoad) -> float:
+        raise NotImplementedError
+
+
+class LeastClientsStrategy(PlacementStrategy):
+    name = "least_clients"
+
+    def score(self, load: InboundLoad) -> float:
+        return load.clients
+
+
+class LeastTrafficStrategy(PlacementStrategy):
+    name = "least_traffic"
+
+    def score(self, load: InboundLoad) -> float:
+        return load.all_time or load.traffic
+
+
+class WeightedStrategy(PlacementStrategy):
+    """Blend of normalized client count and traffic, scaled by node weight."""
+    name = "weighted"
+
+    def __init__(
+        self,
+        clients_weight: float = settings.PLACEMENT_CLIENTS_WEIGHT,
+        traffic_weight: float = settings.PLACEMENT_TRAFFIC_WEIGHT,
+        node_weights: Optional[Dict[str, float]] = None,
+    ):
+        self.clients_weight = clients_weight
+        self.traffic_weight = traffic_weight
+        self.node_weights = node_weights if node_weights is not None else settings.PLACEMENT_NODE_WEIGHTS
+
+    def choose(self, loads: List[InboundLoad]) -> InboundLoad:
+        max_clients = max(load.clients for load in loads) or 1
+        max_traffic = max(load.all_time or load.traffic for load in loads) or 1
+
+        def weighted(load: InboundLoad) -> float:
+            score = (
+                self.clients_weight * load.clients / max_clients
+                + self.traffic_weight * (load.all_time or load.traffic) / max_traffic
+            )
+            return score / (self.node_weights.get(load.node, 1.0) or 1.0)
+
+        return min(loads, key=weighted)
+
+
+STRATEGIES: Dict[str, type] = {
+    strategy.name: strategy
+    for strategy in (LeastClientsStrategy, LeastTrafficStrategy, WeightedStrategy)
+}
+
+
+def get_strategy(name: str) -> PlacementStrategy:
+    try:
+        return STRATEGIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown placement strategy: {name}") from None
+
+
+class PlacementEngine:
+    """Choose the node and inbound for a new client.
+
+    Works only on already cached inbound snapshots, so placement never adds
+    a panel round-trip. Loads are recomputed when a snapshot changes;
+    placements made since then are counted locally so a burst of creates is
+    spread instead of landing on the same inbound.
+    """
+
+    def __init__(
+        self,
+        registry: PanelRegistry = panel_registry,
+        strategy: Optional[PlacementStrategy] = None,
+        inbound_ids: Optional[List[int]] = None,
+    ):
+        self.registry = registry
+        self.strategy = strategy or get_strategy(settings.PLACEMENT_STRATEGY)
+        self.inbound_ids = set(inbound_ids if inbound_ids is not None else settings.PLACEMENT_INBOUND_IDS)
+        self._loads: Dict[str, Tuple[InboundSnapshot, List[InboundLoad]]] = {}
+        self._pending: Dict[Tuple[str, int], int] = {}
+
+    def _node_loads(self, name: str, client: ThreeXUIClient) -> List[InboundLoad]:
+        snapshot = client.inbound_cache.peek()
+        if snapshot is None:
+            return []
+        cached = self._loads.get(name)
+        if cached and cached[0] is snapshot:
+            return cached[1]
+        loads = [
+            InboundLoad.from_inbound(name, ib)
+            for ib in snapshot.inbounds
+            if ib.protocol == "vless" and (not self.inbound_ids or ib.id in self.inbound_ids)
+        ]
+        self._loads[name] = (snapshot, loads)
+        for key in [key for key in self._pending if key[0] == name]:
+            del self._pending[key]
+        return loads
+
+    def candidates(self) -> List[InboundLoad]:
+        candidates = []
+        for name, client in self.registry.nodes.items():
+            for load in self._node_loads(name, client):
+                if not load.available:
+                    continue
+                pending = self._pending.get((name, load.inbound_id), 0)
+                if pending:
+                    load = replace(load, clients=load.clients + pending)
+                candidates.append(load)
+        return candidates
+
+    def choose(self) -> Tuple[ThreeXUIClient, int]:
+        """Return target client and inbound id for a new client."""
+        candidates = self.candidates()
+        if not candidates:
+            logger.warning("No placement data cached, using default inbound")
+            return self.registry.primary, settings.INBOUND_ID
+        target = self.strategy.choose(candidates)
+        key = (target.node, target.inbound_id)
+        self._pending[key] = self._pending.get(key, 0) + 1
+        logger.debug("Placement ({}): node={} inbound={}", self.strategy.name, target.node, target.inbound_id)
+        return self.registry.nodes[target.node], target.inbound_id
+
+
+placement_engine = PlacementEngine()
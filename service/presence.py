@@ -0,0 +1,147 @@
+"""Online presence tracking with batched join/leave notifications."""
+
+import asyncio
+import time
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+from loguru import logger
+from aiogram import Bot
+from config import settings
+from service.panel_registry import PanelRegistry, panel_registry
+
+# Max emails listed per section of a notification message
+NOTIFY_LIST_LIMIT = 50
+
+
+class PresenceTracker:
+    """Keep the current online set in memory and a feed of changes.
+
+    A single poller queries the panels, so ``/online`` answers from memory
+    no matter how many people ask. Joins and leaves are accumulated and sent
+    to subscribed admins as one message per notify interval.
+    """
+
+    def __init__(
+        self,
+        registry: PanelRegistry = panel_registry,
+        interval: float = settings.PRESENCE_POLL_INTERVAL,
+        notify_interval: float = settings.PRESENCE_NOTIFY_INTERVAL,
+    ):
+        self.registry = registry
+        self.interval = interval
+        self.notify_interval = notify_interval
+        self.subscribers: Set[int] = set()
+        self.updated_at: Optional[float] = None
+        self._by_node: Dict[str, FrozenSet[str]] = {}
+        self._online: List[str] = []
+        self._joined: Set[str] = set()
+        self._left: Set[str] = set()
+        self._bot: Optional[Bot] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def online(self) -> List[str]:
+        return self._online
+
+    def start(self, bot: Bot) -> None:
+        if self._tasks:
+            return
+        self._bot = bot
+        self._tasks = [
+            asyncio.create_task(self._poll_loop()),
+            asyncio.create_task(self._notify_loop()),
+        ]
+        logger.info(f"Presence tracker started, interval {self.interval}s")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def subscribe(self, chat_id: int) -> bool:
+        """Toggle notifications for a chat; return True if now subscribed."""
+        if chat_id in self.subscribers:
+            self.subscribers.discard(chat_id)
+            return False
+        self.subscribers.add(chat_id)
+        return True
+
+    def page(self, number: int, size: int = settings.PRESENCE_PAGE_SIZE) -> Tuple[List[str], int]:
+        """Return emails on a 1-based page and total page count."""
+        pages = max(1, -(-len(self._online) // size))
+        number = min(max(number, 1), pages)
+        start = (number - 1) * size
+        return self._online[start:start + size], pages
+
+    async def poll(self) -> None:
+        """Query every node once and update the online set and change feed."""
+        results = await self.registry.get_online_by_node()
+        if not results:
+            logger.warning("Presence poll: no node answered, keeping previous state")
+            return
+        first_poll = self.updated_at is None
+        previous = set(self._online)
+        # Nodes that failed this tick keep their previous online set
+        for node, emails in results.items():
+            self._by_node[node] = frozenset(emails)
+        current: Set[str] = set().union(*self._by_node.values())
+        self._online = sorted(current)
+        self.updated_at = time.time()
+        if first_poll:
+            return
+        for email in current - previous:
+            if email in self._left:
+                self._left.discard(email)
+            else:
+                self._joined.add(email)
+        for email in previous - current:
+            if email in self._joined:
+                self._joined.discard(email)
+            else:
+                self._left.add(email)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.exception(f"Presence poll failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _notify_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.notify_interval)
+            try:
+                await self._notify()
+            except Exception as e:
+                logger.exception(f"Presence notify failed: {e}")
+
+    @staticmethod
+    def _format_section(title: str, emails: Set[str]) -> str:
+        listed = sorted(emails)[:NOTIFY_LIST_LIMIT]
+        line = f"{title} ({len(emails)}): {', '.join(listed)}"
+        if len(emails) > NOTIFY_LIST_LIMIT:
+            line += f" и ещё {len(emails) - NOTIFY_LIST_LIMIT}"
+        return line
+
+    async def _notify(self) -> None:
+        if not (self._joined or self._left):
+            return
+        joined, left = self._joined, self._left
+        self._joined, self._left = set(), set()
+        if not self.subscribers or self._bot is None:
+            return
+        sections = []
+        if joined:
+            sections.append(self._format_section("🟢 Подключились", joined))
+        if left:
+            sections.append(self._format_section("🔴 Отключились", left))
+        text = "\n".join(sections)
+        for chat_id in list(self.subscribers):
+            try:
+                await self._bot.send_message(chat_id, text)
+            except Exception as e:
+                logger.error(f"Presence notify to {chat_id} failed: {e}")
+
+
+presence_tracker = PresenceTracker()
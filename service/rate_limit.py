@@ -0,0 +1,69 @@
+"""Token-bucket rate limiting primitives."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``rate`` tokens per second."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, tokens: float = 1.0) -> bool:
+        """Take tokens if available, without waiting."""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """Seconds until ``tokens`` are available."""
+        self._refill()
+        missing = tokens - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until tokens are available and take them."""
+        while not self.consume(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+
+class BucketMap:
+    """Token buckets per key with LRU eviction.
+
+    An evicted bucket has had time to refill, so recreating it full is
+    equivalent to keeping it.
+    """
+
+    def __init__(self, rate: float, capacity: float, maxsize: int = 100000):
+        self.rate = rate
+        self.capacity = capacity
+        self.maxsize = maxsize
+        self._buckets: 'OrderedDict[Hashable, TokenBucket]' = OrderedDict()
+
+    def get(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def consume(self, key: Hashable, tokens: float = 1.0) -> bool:
+        return self.get(key).consume(tokens)
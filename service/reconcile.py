@@ -0,0 +1,231 @@
+"""Incremental reconciliation of stored user links with the panels."""
+
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from loguru import logger
+from config import settings
+from database.crud import StateRepo, UsersRepo
+from database.write_buffer import write_buffer
+from service.inbound_cache import InboundSnapshot
+from service.panel_registry import PanelRegistry, panel_registry
+
+STATE_KEY = "reconcile"
+
+
+def inbound_fingerprint(host: str, ib) -> str:
+    """Hash of everything a link of the inbound depends on besides the client."""
+    raw = ib.raw
+    payload = json.dumps(
+        [host, raw.get("protocol"), raw.get("port"), raw.get("streamSettings"), ib.raw_settings.get("decryption")],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def emails_fingerprint(snapshot: InboundSnapshot) -> str:
+    digest = hashlib.sha1()
+    for email in sorted(snapshot.by_email):
+        digest.update(email.encode() + b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class ReconcileReport:
+    """What a reconciliation run found and changed."""
+    full: bool = False
+    clients: int = 0
+    dirty: int = 0
+    updated: List[str] = field(default_factory=list)
+    cleared: List[str] = field(default_factory=list)
+    changed_inbounds: List[str] = field(default_factory=list)
+    deletions_checked: bool = False
+    deletions_skipped: bool = False
+    error: Optional[str] = None
+    duration: float = 0.0
+
+    def summary(self) -> str:
+        if self.error:
+            return f"❌ Сверка не выполнена: {self.error}"
+        if self.deletions_checked:
+            deletions = ""
+        elif self.deletions_skipped:
+            deletions = " (проверка отложена: нода не ответила)"
+        else:
+            deletions = " (список клиентов не менялся)"
+        lines = [
+            f"🔄 Сверка {'(полная) ' if self.full else ''}за {self.duration:.1f} с",
+            f"Клиентов в панели: {self.clients}, проверено: {self.dirty}",
+            f"Обновлено ссылок: {len(self.updated)}",
+            f"Удалено ссылок: {len(self.cleared)}{deletions}",
+        ]
+        if self.changed_inbounds:
+            lines.append(f"Изменённые inbound'ы: {', '.join(self.changed_inbounds)}")
+        return "\n".join(lines)
+
+
+class Reconciler:
+    """Bring ``Users.vless_link`` in line with the panels.
+
+    Only clients changed since the last run are rebuilt: those with
+    ``updated_at`` at or after the stored per-node high-water mark and all
+    clients of inbounds whose link settings (port, stream settings) changed.
+    Users whose client was deleted are found by a keyset scan of linked
+    users, done only when the set of client emails on some node changed and
+    against snapshots loaded right then: a cached one may predate clients
+    created since. Nothing is changed unless every node answered.
+    """
+
+    def __init__(
+        self,
+        registry: PanelRegistry = panel_registry,
+        interval: float = settings.RECONCILE_INTERVAL,
+        batch_size: int = settings.RECONCILE_BATCH,
+    ):
+        self.registry = registry
+        self.interval = interval
+        self.batch_size = batch_size
+        self.users_repo = UsersRepo()
+        self.state_repo = StateRepo()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Reconciler started, interval {self.interval}s")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                report = await self.reconcile()
+                if report.updated or report.cleared:
+                    logger.info(f"Reconcile: {len(report.updated)} updated, {len(report.cleared)} cleared")
+            except Exception as e:
+                logger.exception(f"Reconciliation failed: {e}")
+
+    async def reconcile(self, full: bool = False) -> ReconcileReport:
+        """Run once; ``full`` ignores the stored state and checks every client."""
+        async with self._lock:
+            started = time.monotonic()
+            report = await self._reconcile(full)
+            report.duration = time.monotonic() - started
+            return report
+
+    async def _reconcile(self, full: bool) -> ReconcileReport:
+        report = ReconcileReport(full=full)
+        await write_buffer.flush()
+        snapshots = await self.registry.get_snapshots()
+        missing = [name for name in self.registry.nodes if name not in snapshots]
+        if missing:
+            report.error = f"нет ответа от нод: {', '.join(missing)}"
+            logger.warning(f"Reconcile skipped, nodes did not answer: {missing}")
+            return report
+
+        state = {} if full else await self.state_repo.get(STATE_KEY, {})
+        high_water: Dict[str, int] = state.get("high_water", {})
+        inbound_fps: Dict[str, Dict[str, str]] = state.get("inbounds", {})
+        email_fps: Dict[str, str] = state.get("emails", {})
+        new_state = {"high_water": {}, "inbounds": {}, "emails": {}}
+
+        dirty: Set[str] = set()
+        emails_changed = full
+        for name, snapshot in snapshots.items():
+            client = self.registry.nodes[name]
+            mark = high_water.get(name, 0)
+            newest = mark
+            node_fps = {}
+            for ib in snapshot.inbounds:
+                fp = node_fps[str(ib.id)] = inbound_fingerprint(client.host, ib)
+                inbound_changed = inbound_fps.get(name, {}).get(str(ib.id)) != fp
+                if inbound_changed and not full and name in inbound_fps:
+                    report.changed_inbounds.append(f"{name}/{ib.id}")
+                for raw in ib.raw_clients:
+                    updated_at = raw.get("updated_at") or 0
+                    newest = max(newest, updated_at)
+                    if inbound_changed or updated_at >= mark:
+                        dirty.add(raw.get("email"))
+                report.clients += len(ib.raw_clients)
+            email_fp = emails_fingerprint(snapshot)
+            emails_changed = emails_changed or email_fps.get(name) != email_fp
+            new_state["high_water"][name] = newest
+            new_state["inbounds"][name] = node_fps
+            new_state["emails"][name] = email_fp
+        dirty.discard(None)
+        report.dirty = len(dirty)
+
+        changes = await self._link_changes(sorted(dirty), snapshots, report)
+        if emails_changed:
+            fresh = await self.registry.get_fresh_snapshots()
+            missing = [name for name in self.registry.nodes if name not in fresh]
+            if missing:
+                # Keep the old fingerprints so the next run checks again
+                logger.warning(f"Reconcile deletions skipped, nodes did not answer: {missing}")
+                new_state["emails"] = email_fps
+                report.deletions_skipped = True
+            else:
+                changes.extend(await self._deleted_users(fresh, report))
+                new_state["emails"] = {name: emails_fingerprint(snapshot) for name, snapshot in fresh.items()}
+                report.deletions_checked = True
+        for start in range(0, len(changes), self.batch_size):
+            await self.users_repo.set_links(changes[start:start + self.batch_size])
+        await self.state_repo.set(STATE_KEY, new_state)
+        return report
+
+    async def _link_changes(
+        self, emails: List[str], snapshots: Dict[str, InboundSnapshot], report: ReconcileReport
+    ) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        changes = []
+        stored = await self.users_repo.get_links(emails)
+        for email in emails:
+            if email not in stored:
+                continue
+            links: List[str] = []
+            sub_id = None
+            for name, snapshot in snapshots.items():
+                entry = snapshot.by_email.get(email)
+                if entry is None:
+                    continue
+                ib, raw = entry
+                links.extend(self.registry.nodes[name].links.links(ib, raw))
+                sub_id = sub_id or raw.get("subId") or None
+            if not links:
+                continue
+            link = "\n".join(links)
+            stored_link, stored_sub_id = stored[email]
+            if stored_link != link or (sub_id and stored_sub_id != sub_id):
+                changes.append((email, link, sub_id or stored_sub_id))
+                report.updated.append(email)
+        return changes
+
+    async def _deleted_users(
+        self, snapshots: Dict[str, InboundSnapshot], report: ReconcileReport
+    ) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        changes = []
+        after_id = 0
+        while True:
+            page = await self.users_repo.get_linked_usernames(after_id, self.batch_size)
+            if not page:
+                break
+            for _, username in page:
+                if not any(username in snapshot.by_email for snapshot in snapshots.values()):
+                    changes.append((username, None, None))
+                    report.cleared.append(username)
+            after_id = page[-1][0]
+        return changes
+
+
+reconciler = Reconciler()
@@ -0,0 +1,96 @@
+"""Coalescing of Xray reloads after client changes."""
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+from config import settings
+from service.metrics import metrics
+
+RELOAD_REQUESTS = metrics.counter(
+    "xray_reload_requests_total", "Changes that asked for an Xray reload", ("node",))
+RELOADS = metrics.counter(
+    "xray_reloads_total", "Xray reloads sent to the panel", ("node", "result"))
+
+
+class ReloadDebouncer:
+    """Turn many reload requests of one node into a single Xray reload.
+
+    The reload runs ``window`` seconds after the latest request, but never
+    later than ``max_delay`` after the first request it covers, so a steady
+    stream of changes still gets reloaded. Requests that arrive while a
+    reload is running are covered by the next one. A failed reload is
+    retried after ``max_delay``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        reload: Callable[[], Awaitable[bool]],
+        window: float = settings.RELOAD_WINDOW,
+        max_delay: float = settings.RELOAD_MAX_DELAY,
+    ):
+        self.name = name
+        self.window = window
+        self.max_delay = max_delay
+        self._reload = reload
+        self._lock = asyncio.Lock()
+        self._pending = 0
+        self._first: Optional[float] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._requests = RELOAD_REQUESTS.labels(name)
+        self._ok = RELOADS.labels(name, "success")
+        self._failed = RELOADS.labels(name, "failure")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def schedule(self) -> None:
+        """Ask for a reload covering a change that was just made."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._requests.inc()
+        self._pending += 1
+        if self._first is None:
+            self._first = now
+        self._arm(min(now + self.window, self._first + self.max_delay))
+
+    def _arm(self, when: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_at(when, self._fire)
+
+    def _fire(self) -> None:
+        self._timer = None
+        self._task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> bool:
+        """Reload now if any change is waiting; return False if the reload failed."""
+        async with self._lock:
+            if not self._pending:
+                return True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            covered, self._pending, self._first = self._pending, 0, None
+            ok = await self._reload()
+            if ok:
+                self._ok.inc()
+                logger.info(f"Xray reloaded on {self.name} for {covered} change(s)")
+                return True
+            self._failed.inc()
+            logger.warning(f"Xray reload on {self.name} failed, retrying in {self.max_delay}s")
+            self._pending += covered
+            loop = asyncio.get_running_loop()
+            if self._first is None:
+                self._first = loop.time()
+            self._arm(loop.time() + self.max_delay)
+            return False
+
+    async def close(self) -> None:
+        """Send a reload still waiting for its window and stop retrying."""
+        await self.flush()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,109 @@
+"""Retries, circuit breaking and request hedging for panel calls."""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+from loguru import logger
+
+T = TypeVar('T')
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a node whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker of one panel node.
+
+    After ``threshold`` failures in a row the circuit opens and calls fail
+    fast for ``reset_timeout`` seconds. Then one probe call at a time is let
+    through: a success closes the circuit, a failure opens it again. A
+    threshold of 0 disables the breaker.
+    """
+
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        # A probe that never reported back (e.g. cancelled) expires after the reset timeout
+        now = time.monotonic()
+        if self._probe_at is None or now - self._probe_at >= self.reset_timeout:
+            self._probe_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"Panel {self.name} is back, circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_at = None
+        if self.threshold <= 0:
+            return
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"Panel {self.name} failed {self.failures} times in a row, circuit opened")
+            self.opened_at = time.monotonic()
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential back-off before retry number ``attempt`` (from 0)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: float,
+    on_hedge: Optional[Callable[[], None]] = None,
+) -> T:
+    """Await ``call()``; if it takes longer than ``delay``, race a second copy.
+
+    The first successful result wins and the other copy is cancelled. If
+    both fail, the last error is raised.
+    """
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    error: Optional[BaseException] = None
+    # The finally also covers cancellation of the caller: no copy outlives it
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+        if on_hedge is not None:
+            on_hedge()
+        pending.add(asyncio.ensure_future(call()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,63 @@
+"""Background collector of client traffic statistics."""
+
+import asyncio
+from typing import List, Optional, Tuple
+from loguru import logger
+from config import settings
+from database.crud import TrafficRepo
+from service.panel_registry import PanelRegistry, panel_registry
+
+
+class StatsCollector:
+    """Periodically store panel client counters as local time-series.
+
+    Counters are taken from the shared inbound snapshots, so a poll costs at
+    most one list request per node and ``/stats`` never calls the panel.
+    """
+
+    def __init__(
+        self,
+        registry: PanelRegistry = panel_registry,
+        interval: float = settings.STATS_POLL_INTERVAL,
+    ):
+        self.registry = registry
+        self.interval = interval
+        self.traffic_repo = TrafficRepo()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Stats collector started, interval {self.interval}s")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.collect()
+            except Exception as e:
+                logger.exception(f"Stats collection failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def collect(self) -> int:
+        """Poll every node once and record counters; return samples written."""
+        snapshots = await self.registry.get_snapshots()
+        counters: List[Tuple[str, str, int, int]] = []
+        for node, snapshot in snapshots.items():
+            for ib in snapshot.inbounds:
+                for stat in ib.raw_client_stats:
+                    counters.append((node, stat["email"], stat.get("up", 0), stat.get("down", 0)))
+        written = await self.traffic_repo.record_counters(counters)
+        logger.debug("Stats collected: {} counters, {} samples", len(counters), written)
+        return written
+
+
+stats_collector = StatsCollector()
@@ -0,0 +1,135 @@
+"""Subscription endpoint serving client links by subscription id."""
+
+import base64
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from aiohttp import web
+from config import settings
+from service.inbound_cache import InboundSnapshot
+from service.metrics import metrics
+from service.panel_registry import PanelRegistry, panel_registry
+
+SUB_REQUESTS = metrics.counter("sub_requests_total", "Subscription requests by response status", ("status",))
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """Rendered subscription response."""
+    body: bytes
+    etag: str
+    userinfo: str
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Evaluate If-None-Match against a strong ETag."""
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class SubscriptionService:
+    """Build subscriptions from cached inbound snapshots.
+
+    A subscription is rendered once per set of node snapshots and served
+    from an LRU cache until one of them is replaced, which happens on TTL
+    refresh or when a client write invalidates the inbound cache. Polls
+    never reach the panel directly; at most one refresh per node and TTL
+    is shared by all of them.
+    """
+
+    def __init__(
+        self,
+        registry: PanelRegistry = panel_registry,
+        cache_size: int = settings.SUB_CACHE_SIZE,
+        update_interval: int = settings.SUB_UPDATE_INTERVAL,
+    ):
+        self.registry = registry
+        self.cache_size = cache_size
+        self.update_interval = update_interval
+        self._cache: 'OrderedDict[str, Tuple[tuple, Optional[Subscription]]]' = OrderedDict()
+        self._ok = SUB_REQUESTS.labels("200")
+        self._not_modified = SUB_REQUESTS.labels("304")
+        self._not_found = SUB_REQUESTS.labels("404")
+
+    async def _snapshots(self) -> Dict[str, InboundSnapshot]:
+        """Fresh snapshots, falling back to the last known one of a slow node."""
+        snapshots = await self.registry.get_snapshots()
+        for name, client in self.registry.nodes.items():
+            if name not in snapshots:
+                stale = client.inbound_cache.peek()
+                if stale is not None:
+                    snapshots[name] = stale
+        return snapshots
+
+    def render(self, sub_id: str, snapshots: Dict[str, InboundSnapshot]) -> Optional[Subscription]:
+        links: List[str] = []
+        upload = download = total = 0
+        unlimited = False
+        expire = 0
+        for name, snapshot in snapshots.items():
+            builder = self.registry.nodes[name].links
+            for ib, client in snapshot.by_sub_id.get(sub_id, ()):
+                if not client.get("enable", True):
+                    continue
+                links.extend(builder.links(ib, client))
+                stat = ib.stats_by_email.get(client.get("email"), {})
+                upload += stat.get("up", 0)
+                download += stat.get("down", 0)
+                quota = client.get("totalGB", 0)
+                unlimited = unlimited or not quota
+                total += quota
+                expiry = client.get("expiryTime", 0)
+                if expiry > 0:
+                    expire = min(expire, expiry) if expire else expiry
+        if not links:
+            return None
+        body = base64.b64encode("\n".join(links).encode())
+        userinfo = (
+            f"upload={upload}; download={download}; "
+            f"total={0 if unlimited else total}; expire={expire // 1000}"
+        )
+        digest = hashlib.sha256(body + b"\n" + userinfo.encode()).hexdigest()[:32]
+        return Subscription(body=body, etag=f'"{digest}"', userinfo=userinfo)
+
+    async def get(self, sub_id: str) -> Optional[Subscription]:
+        snapshots = await self._snapshots()
+        key = tuple(
+            (name, snapshot.generation, snapshot.fetched_at) for name, snapshot in sorted(snapshots.items())
+        )
+        cached = self._cache.get(sub_id)
+        if cached is not None and cached[0] == key:
+            self._cache.move_to_end(sub_id)
+            return cached[1]
+        subscription = self.render(sub_id, snapshots)
+        self._cache[sub_id] = (key, subscription)
+        self._cache.move_to_end(sub_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return subscription
+
+    def register(self, app: web.Application, path: str = settings.SUB_PATH) -> None:
+        app.router.add_get(path.rstrip("/") + "/{sub_id}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        subscription = await self.get(request.match_info["sub_id"])
+        if subscription is None:
+            self._not_found.inc()
+            return web.Response(status=404)
+        headers = {
+            "ETag": subscription.etag,
+            "Subscription-Userinfo": subscription.userinfo,
+            "Profile-Update-Interval": str(self.update_interval),
+            "Cache-Control": "no-cache",
+        }
+        if _etag_matches(request.headers.get("If-None-Match", ""), subscription.etag):
+            self._not_modified.inc()
+            return web.Response(status=304, headers=headers)
+        self._ok.inc()
+        return web.Response(body=subscription.body, headers=headers, content_type="text/plain", charset="utf-8")
+
+
+subscription_service = SubscriptionService()
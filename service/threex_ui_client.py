@@ -1,35 +1,76 @@
 """3x-UI Panel API client."""
 
+import asyncio
 import json
-import uuid
+import re
+import time
 from functools import wraps
-from typing import Callable, TypeVar, Any, List, Optional
+from typing import AsyncIterator, Callable, Dict, TypeVar, Any, List, Optional, Tuple
 import httpx
 from loguru import logger
-from config import settings
+from config import settings, PanelNode
+from database.crud import PanelSessionRepo
 from schemas.clients import CreateClient, CreateClientSettings
-from schemas.inbounds import InboundModel
-from schemas.vless import VlessURL
+from schemas.inbounds import InboundModel, LazyInbound
+from service.inbound_cache import InboundCache
+from service.log import sampled
+from service.metrics import metrics
+from service.reload_debouncer import ReloadDebouncer
+from service.resilience import CircuitBreaker, CircuitOpenError, backoff, hedged
+from service.vless_links import VlessLinkBuilder
 
 F = TypeVar('F', bound=Callable[..., Any])
 
+# Fragments of the "session expired" message 3x-UI returns for AJAX calls
+SESSION_EXPIRED_MARKERS = ("login", "log in", "登录", "войдите")
+
+PANEL_REQUEST_SECONDS = metrics.histogram(
+    "panel_request_seconds", "3x-UI API request latency", ("node", "endpoint"))
+PANEL_REQUESTS = metrics.counter(
+    "panel_requests_total", "3x-UI API requests by response status", ("node", "endpoint", "status"))
+PANEL_LOGINS = metrics.counter(
+    "panel_logins_total", "Logins to the 3x-UI panel", ("node", "result"))
+PANEL_RELOGINS = metrics.counter(
+    "panel_relogins_total", "Re-logins after an expired panel session", ("node",))
+PANEL_RETRIES = metrics.counter(
+    "panel_retries_total", "Retried idempotent panel requests", ("node",))
+PANEL_HEDGES = metrics.counter(
+    "panel_hedged_requests_total", "Duplicate requests sent for slow panel reads", ("node",))
+
+# Seconds between retries of a failed background session refresh
+SESSION_RETRY_DELAY = 30.0
+# Panel payload dumps at DEBUG, written only for a share of requests
+payload_logger = sampled("panel_payload")
+
+# Numeric ids and client UUIDs in API paths
+_ID_SEGMENT_RE = re.compile(r"/(?:\d+|[0-9a-fA-F-]{32,36})(?=/|$)")
+_ENDPOINT_CACHE_SIZE = 1024
+_endpoints: Dict[str, str] = {}
+
+
+def endpoint_label(path: str) -> str:
+    """Path with ids replaced, so label values stay bounded."""
+    label = _endpoints.get(path)
+    if label is None:
+        if len(_endpoints) >= _ENDPOINT_CACHE_SIZE:
+            _endpoints.clear()
+        label = _endpoints[path] = _ID_SEGMENT_RE.sub("/:id", path)
+    return label
+
 
 def ensure_auth(func: F) -> F:
     """Decorator to ensure authentication before API calls."""
     @wraps(func)
     async def wrapper(self: 'ThreeXUIClient', *args: Any, **kwargs: Any) -> Any:
-        if not self.cookies:
-            logger.info("Session missing, attempting to login...")
-            success = await self.login()
-            if not success:
-                logger.error("Operation aborted: Auth failed")
-                return None
+        if not await self.ensure_session():
+            logger.error("Operation aborted: Auth failed")
+            return None
         return await func(self, *args, **kwargs)
     return wrapper  # type: ignore
 
 
 class ThreeXUIClient:
-    
+
     def __init__(
         self,
         host: str = settings.THREEX_HOST,
@@ -38,7 +79,10 @@ class ThreeXUIClient:
         password: str = settings.THREEX_PASSWORD,
         hash_panel: str = settings.THREEX_HASH_PANEL,
         spx: str = settings.THREEX_SPX,
+        name: str = 'default',
+        transport: Optional[httpx.AsyncBaseTransport] = None,
     ):
+        self.name = name
         self.host = host
         self.port = port
         self.username = username
@@ -47,167 +91,469 @@ class ThreeXUIClient:
         base_path = f"/{hash_panel}" if hash_panel else ""
         self.panel_url = f"http://{self.host}:{self.port}{base_path}"
         self.cookies: Optional[httpx.Cookies] = None
+        self.session_expires_at = 0.0
+        self.session_refresh_before = settings.THREEX_SESSION_REFRESH_BEFORE
+        self.session_repo = PanelSessionRepo()
+        self._session_id = 0
+        self._session_loaded = False
+        self._login_lock = asyncio.Lock()
+        self._session_task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport = transport
+        self.inbound_cache = InboundCache(self.get_all_inbounds_lazy)
+        self.links = VlessLinkBuilder(host, spx)
+        self.reloads = ReloadDebouncer(name, self.reload_xray)
+        self._login_ok = PANEL_LOGINS.labels(name, "success")
+        self._login_failed = PANEL_LOGINS.labels(name, "failure")
+        self._relogins = PANEL_RELOGINS.labels(name)
+        self._retries = PANEL_RETRIES.labels(name)
+        self._hedges = PANEL_HEDGES.labels(name)
+        self.breaker = CircuitBreaker(name, settings.THREEX_BREAKER_THRESHOLD, settings.THREEX_BREAKER_RESET)
+        self.retries = settings.THREEX_RETRIES
+        self.hedge_delay = settings.THREEX_HEDGE_DELAY
+        self._endpoint_metrics: Dict[str, Any] = {}
 
-    async def login(self) -> bool:
-        auth_data = {"username": self.username, "password": self.password}
-        async with httpx.AsyncClient() as client:
+    @classmethod
+    def from_node(
+        cls, node: PanelNode, transport: Optional[httpx.AsyncBaseTransport] = None
+    ) -> 'ThreeXUIClient':
+        return cls(
+            host=node.host,
+            port=node.port,
+            username=node.username,
+            password=node.password,
+            hash_panel=node.hash_panel,
+            spx=node.spx,
+            name=node.name,
+            transport=transport,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Long-lived pooled HTTP client, created on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.panel_url,
+                limits=httpx.Limits(
+                    max_connections=settings.THREEX_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.THREEX_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.THREEX_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    settings.THREEX_TIMEOUT,
+                    connect=settings.THREEX_CONNECT_TIMEOUT,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    def start(self) -> None:
+        """Log in (or restore the stored session) and keep the session fresh."""
+        if self._session_task is None:
+            self._session_task = asyncio.create_task(self._keep_session())
+
+    async def close(self) -> None:
+        """Send a pending Xray reload and close pooled connections."""
+        if self._session_task is not None:
+            self._session_task.cancel()
+            await asyncio.gather(self._session_task, return_exceptions=True)
+            self._session_task = None
+        await self.reloads.close()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.cookies = None
+
+    @staticmethod
+    def _session_expired(response: httpx.Response) -> bool:
+        """Check whether the panel rejected the request because of the session."""
+        if response.status_code == 401 or response.is_redirect:
+            return True
+        if response.status_code != 200:
+            return False
+        try:
+            data = response.json()
+        except ValueError:
+            return False
+        if not isinstance(data, dict) or data.get("success", True):
+            return False
+        msg = str(data.get("msg", "")).lower()
+        return any(marker in msg for marker in SESSION_EXPIRED_MARKERS)
+
+    async def _send(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """Send one HTTP request through the circuit breaker, record latency and status."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Panel {self.name} is unavailable")
+        endpoint = endpoint_label(path)
+        bound = self._endpoint_metrics.get(endpoint)
+        if bound is None:
+            bound = self._endpoint_metrics[endpoint] = (
+                PANEL_REQUEST_SECONDS.labels(self.name, endpoint), {}
+            )
+        latency, statuses = bound
+        status: Any = "error"
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        else:
+            status = response.status_code
+            if status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+        finally:
+            latency.observe(time.perf_counter() - started)
+            counter = statuses.get(status)
+            if counter is None:
+                counter = statuses[status] = PANEL_REQUESTS.labels(self.name, endpoint, status)
+            counter.inc()
+
+    async def _attempt(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """Send request to the panel, re-login and retry once on expired session.
+
+        Slow GET requests get a hedged duplicate while the node has no recent failures.
+        """
+        session_id = self._session_id
+        if method == "GET" and self.hedge_delay > 0 and self.breaker.failures == 0:
+            response = await hedged(
+                lambda: self._send(method, path, **kwargs), self.hedge_delay, self._hedges.inc
+            )
+        else:
+            response = await self._send(method, path, **kwargs)
+        if self._session_expired(response):
+            logger.warning(f"Panel session expired on {self.name}{path}, re-login...")
+            self._relogins.inc()
+            if await self.renew_session(session_id):
+                response = await self._send(method, path, **kwargs)
+        return response
+
+    async def _request(
+        self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs: Any
+    ) -> httpx.Response:
+        """Send request to the panel.
+
+        Idempotent requests (GET by default) are retried with jittered
+        back-off on connection errors and 5xx answers. An open circuit
+        raises ``CircuitOpenError`` without touching the network.
+        """
+        if idempotent is None:
+            idempotent = method == "GET"
+        retries = self.retries if idempotent else 0
+        attempt = 0
+        while True:
             try:
-                response = await client.post(f"{self.panel_url}/login", data=auth_data)
-                if response.status_code == 200 and response.json().get("success"):
-                    self.cookies = response.cookies
-                    logger.success("Authorized in 3x-ui")
+                response = await self._attempt(method, path, **kwargs)
+                if response.status_code < 500 or attempt >= retries:
+                    return response
+                reason = f"answered {response.status_code}"
+            except httpx.TransportError as e:
+                if attempt >= retries:
+                    raise
+                reason = f"failed: {e!r}"
+            logger.warning(f"{method} {path} on {self.name} {reason}, retrying")
+            await asyncio.sleep(backoff(attempt, settings.THREEX_RETRY_BASE, settings.THREEX_RETRY_MAX))
+            attempt += 1
+            self._retries.inc()
+
+    def session_valid(self) -> bool:
+        return bool(self.cookies) and time.time() < self.session_expires_at
+
+    async def ensure_session(self) -> bool:
+        """Make sure a valid session exists; concurrent callers share one login."""
+        if self.session_valid():
+            return True
+        async with self._login_lock:
+            if self.session_valid():
+                return True
+            if not self._session_loaded:
+                self._session_loaded = True
+                if await self._restore_session():
                     return True
-                logger.error(f"Login failed: {response.text}")
-            except Exception as e:
-                logger.error(f"Connection error: {e}")
+            logger.info(f"Session missing on {self.name}, attempting to login...")
+            return await self._login()
+
+    async def renew_session(self, session_id: int) -> bool:
+        """Log in again after the panel rejected session ``session_id``.
+
+        Requests that failed with the same session share one login; if the
+        session was already replaced, the new one is used as is.
+        """
+        async with self._login_lock:
+            if self._session_id != session_id and self.session_valid():
+                return True
+            self.cookies = None
+            return await self._login()
+
+    async def login(self) -> bool:
+        async with self._login_lock:
+            return await self._login()
+
+    async def _login(self) -> bool:
+        auth_data = {"username": self.username, "password": self.password}
+        try:
+            self.client.cookies.clear()
+            response = await self._send("POST", "/login", data=auth_data)
+            if response.status_code == 200 and response.json().get("success"):
+                self._set_session(response.cookies)
+                self._login_ok.inc()
+                logger.success(f"Authorized in 3x-ui ({self.name})")
+                await self._store_session()
+                return True
+            logger.error(f"Login failed ({self.name}): {response.text}")
+        except Exception as e:
+            logger.error(f"Connection error: {e}")
+        self._login_failed.inc()
+        return False
+
+    def _set_session(self, cookies: httpx.Cookies) -> None:
+        expires = [cookie.expires for cookie in cookies.jar if cookie.expires]
+        self.cookies = cookies
+        self.session_expires_at = min(expires) if expires else time.time() + settings.THREEX_SESSION_TTL
+        self._session_id += 1
+
+    async def _store_session(self) -> None:
+        cookies = [
+            {"name": cookie.name, "value": cookie.value or "", "domain": cookie.domain, "path": cookie.path}
+            for cookie in self.cookies.jar
+        ]
+        try:
+            await self.session_repo.save(
+                self.name, self.panel_url, self.username, cookies, int(self.session_expires_at)
+            )
+        except Exception as e:
+            logger.warning(f"Cannot store panel session of {self.name}: {e}")
+
+    async def _restore_session(self) -> bool:
+        """Reuse the stored session if it belongs to this panel and user and is not about to expire."""
+        try:
+            stored = await self.session_repo.get(self.name)
+        except Exception as e:
+            logger.warning(f"Cannot load panel session of {self.name}: {e}")
             return False
+        if stored is None or (stored.panel_url, stored.username) != (self.panel_url, self.username):
+            return False
+        if stored.expires_at - time.time() <= self.session_refresh_before:
+            return False
+        cookies = httpx.Cookies()
+        for cookie in json.loads(stored.cookies):
+            cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
+        self.client.cookies.clear()
+        self.client.cookies.update(cookies)
+        self.cookies = cookies
+        self.session_expires_at = stored.expires_at
+        self._session_id += 1
+        logger.info(f"Restored panel session of {self.name}, valid for {stored.expires_at - time.time():.0f}s")
+        return True
+
+    async def _keep_session(self) -> None:
+        """Renew the session shortly before it expires, so requests never wait for a login."""
+        while True:
+            if not await self.ensure_session():
+                await asyncio.sleep(SESSION_RETRY_DELAY)
+                continue
+            delay = self.session_expires_at - self.session_refresh_before - time.time()
+            if delay > 0:
+                # The session may be replaced meanwhile, so check again at least once a minute
+                await asyncio.sleep(min(delay, 60.0))
+                continue
+            async with self._login_lock:
+                due = self.session_expires_at - self.session_refresh_before - time.time() <= 0
+                ok = await self._login() if due else True
+            if not ok:
+                await asyncio.sleep(SESSION_RETRY_DELAY)
 
     @ensure_auth
+    async def get_all_inbounds_lazy(self) -> Optional[List[LazyInbound]]:
+        """Fetch inbounds without validating nested settings and clients."""
+        try:
+            response = await self._request("GET", "/panel/api/inbounds/list")
+            if response.status_code == 200:
+                data = response.json()
+                return [LazyInbound(item) for item in data.get("obj") or []]
+        except CircuitOpenError as e:
+            logger.debug("get inbounds skipped: {}", e)
+        except httpx.TransportError as e:
+            logger.error(f"get inbounds error: {e!r}")
+        except Exception as e:
+            logger.exception(f"get inbounds error: {e}")
+        return None
+
     async def get_all_inbounds(self) -> Optional[List[InboundModel]]:
-        async with httpx.AsyncClient(cookies=self.cookies) as client:
-            try:
-                response = await client.get(f"{self.panel_url}/panel/api/inbounds/list")
-                if response.status_code == 200:
-                    data = response.json()
-                    return [InboundModel(**item) for item in data.get("obj", [])]
-            except Exception as e:
-                logger.exception(f"get inbounds error: {e}")
+        inbounds = await self.get_all_inbounds_lazy()
+        if inbounds is None:
             return None
+        try:
+            return [ib.to_model() for ib in inbounds]
+        except Exception as e:
+            logger.exception(f"get inbounds error: {e}")
+        return None
 
     @ensure_auth
+    async def get_inbound_lazy(self, inbound_id: int) -> Optional[LazyInbound]:
+        try:
+            response = await self._request("GET", f"/panel/api/inbounds/get/{inbound_id}")
+            if response.status_code == 200:
+                data = response.json()
+                return LazyInbound(data.get("obj"))
+        except Exception as e:
+            logger.error(f"get inbound error: {e}")
+        return None
+
     async def get_inbound(self, inbound_id: int) -> Optional[InboundModel]:
-        async with httpx.AsyncClient(cookies=self.cookies) as client:
-            try:
-                response = await client.get(f"{self.panel_url}/panel/api/inbounds/get/{inbound_id}")
-                if response.status_code == 200:
-                    data = response.json()
-                    inbound = InboundModel(**data.get("obj"))
-                    logger.debug(f"inbound: {inbound}")
-                    return inbound
-            except Exception as e:
-                logger.error(f"get inbound error: {e}")
+        inbound = await self.get_inbound_lazy(inbound_id)
+        if inbound is None:
             return None
+        try:
+            model = inbound.to_model()
+            payload_logger.debug("inbound: {}", model)
+            return model
+        except Exception as e:
+            logger.error(f"get inbound error: {e}")
+        return None
 
     async def client_list_by_inbound(self, inbound_id: int) -> Optional[List[str]]:
-        inbound = await self.get_inbound(inbound_id)
+        inbound = await self.get_inbound_lazy(inbound_id)
         if not inbound:
             return None
-        clients_email_list = [client.email for client in inbound.settings.clients]
-        logger.debug(f"clients email_list: {clients_email_list}")
+        clients_email_list = list(inbound.iter_emails())
+        payload_logger.debug("clients email_list: {}", clients_email_list)
         return clients_email_list
 
     async def get_client_by_username(self, username: str) -> Any:
-        inbounds = await self.get_all_inbounds()
-        if not inbounds:
+        snapshot = await self.inbound_cache.get()
+        if not snapshot:
             return None
-        for ib in inbounds:
-            logger.debug(f"inbound: {ib}")
-            for cl in ib.settings.clients:
-                if cl.email == username:
-                    return cl
-        return None
+        entry = snapshot.find(username)
+        return entry[1] if entry else None
 
     async def get_vless_url_by_username(self, username: str) -> List[str]:
-        vless_urls = []
-        inbounds = await self.get_all_inbounds()
-        if not inbounds:
-            return vless_urls
-        
-        for ib in inbounds:
-            for cl in ib.settings.clients:
-                if cl.email == username:
-                    reality = ib.stream_settings.realitySettings
-                    config = VlessURL(
-                        protocol=ib.protocol,
-                        email=cl.email,
-                        port=ib.port,
-                        user_id=cl.id,
-                        type=ib.stream_settings.network,
-                        fp=reality.settings.fingerprint,
-                        security=ib.stream_settings.security,
-                        sni=reality.serverNames[0] if reality.serverNames else "",
-                        pbk=reality.settings.publicKey,
-                        sid=reality.shortIds[0] if reality.shortIds else ""
-                    )
-                    vless_urls.append(self._build_vless_url(config))
-        return vless_urls
+        snapshot = await self.inbound_cache.get()
+        if not snapshot:
+            return []
+        entry = snapshot.by_email.get(username)
+        if entry is None:
+            return []
+        ib, raw_client = entry
+        return self.links.links(ib, raw_client)
+
+    async def iter_vless_links(self, inbound_id: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+        """Yield ``(email, link)`` for all clients, or those of one inbound."""
+        snapshot = await self.inbound_cache.get()
+        if not snapshot:
+            return
+        for ib in snapshot.inbounds:
+            if inbound_id is None or ib.id == inbound_id:
+                for item in self.links.iter_inbound(ib):
+                    yield item
 
     @ensure_auth
-    async def add_client(self, username: str, inbound_id: int, tg_id: str = '') -> bool:
-        async with httpx.AsyncClient(cookies=self.cookies) as client:
-            try:
-                client_data = {
-                    "id": str(uuid.uuid4()),
-                    "flow": "",
-                    "email": username,
-                    "limitIp": 0,
-                    "totalGB": 0,
-                    "expiryTime": 0,
-                    "enable": True,
-                    "tgId": str(tg_id),
-                    "comment": "",
-                    "reset": 0
-                }
-                payload = {
-                    "id": str(inbound_id),
-                    "settings": json.dumps({"clients": [client_data]})
-                }
-                response = await client.post(
-                    f"{self.panel_url}/panel/api/inbounds/addClient",
-                    data=payload
-                )
-                if response.status_code == 200:
-                    res = response.json()
-                    if res.get("success"):
-                        logger.success(f"Client {username} created. ID: {client_data['id']}")
-                        return True
+    async def add_clients(
+        self, inbound_id: int, clients: List[CreateClientSettings]
+    ) -> Tuple[bool, str]:
+        """Add several clients to an inbound in one request.
+
+        Returns success flag and panel message. The panel rejects the whole
+        request if any email is a duplicate.
+        """
+        try:
+            payload = CreateClient(
+                id=inbound_id,
+                settings=json.dumps({"clients": [client.model_dump() for client in clients]}),
+            )
+            response = await self._request(
+                "POST",
+                "/panel/api/inbounds/addClient",
+                data=payload.model_dump()
+            )
+            if response.status_code == 200:
+                res = response.json()
+                if res.get("success"):
+                    self.inbound_cache.invalidate()
+                    self.reloads.schedule()
+                    logger.success(f"{len(clients)} client(s) added to inbound {inbound_id} on {self.name}")
+                    return True, res.get("msg", "")
                 logger.error(f"Error from panel: {response.text}")
-                return False
-            except Exception as e:
-                logger.error(f"Request failed: {e}")
-                return False
+                return False, res.get("msg", "")
+            logger.error(f"Error from panel: {response.status_code} {response.text}")
+            return False, f"HTTP {response.status_code}"
+        except Exception as e:
+            logger.error(f"Request failed: {e}")
+            return False, str(e)
 
-    async def reload_xray(self) -> bool:
-        async with httpx.AsyncClient(cookies=self.cookies) as client:
-            try:
-                response = await client.post(f"{self.panel_url}/panel/api/inbounds/reload")
-                if response.status_code == 200:
-                    logger.info("Inbound reloaded successfully")
-                    return True
-                else:
-                    logger.error(f"Failed to reload inbound: {response.status_code} {response.text}")
-            except Exception as e:
-                logger.error(f"Exception while reloading inbound: {e}")
-            return False
+    async def add_client(self, username: str, inbound_id: int, tg_id: str = '') -> bool:
+        client = CreateClientSettings(email=username, tgId=str(tg_id))
+        result = await self.add_clients(inbound_id, [client])
+        if result and result[0]:
+            logger.success(f"Client {username} created. ID: {client.id}")
+            return True
+        return False
 
     @ensure_auth
-    async def get_online(self) -> Optional[List[Any]]:
-        async with httpx.AsyncClient(cookies=self.cookies) as client:
-            try:
-                response = await client.post(f"{self.panel_url}/panel/api/inbounds/onlines")
-                if response.status_code == 200:
-                    data = response.json()
-                    logger.debug(f"onlines: {data.get('obj')}")
-                    return data.get("obj", [])
-            except Exception as e:
-                logger.error(f"Get online error: {e}")
-            return None
-
-    def _build_vless_url(self, client_config: VlessURL) -> str:
-        params = (
-            f"type={client_config.type}"
-            f"&security={client_config.security}"
-            f"&pbk={client_config.pbk}"
-            f"&fp={client_config.fp}"
-            f"&sni={client_config.sni}"
-            f"&sid={client_config.sid}"
-            f"&spx=%{self.spx}"
-        )
+    async def update_client(self, inbound_id: int, client: Dict[str, Any]) -> bool:
+        """Replace one client of an inbound with the given raw client dict."""
+        try:
+            payload = CreateClient(id=inbound_id, settings=json.dumps({"clients": [client]}))
+            response = await self._request(
+                "POST",
+                f"/panel/api/inbounds/updateClient/{client['id']}",
+                idempotent=True,
+                data=payload.model_dump()
+            )
+            if response.status_code == 200 and response.json().get("success"):
+                self.inbound_cache.invalidate()
+                self.reloads.schedule()
+                return True
+            logger.error(f"Error from panel: {response.status_code} {response.text}")
+        except Exception as e:
+            logger.error(f"Update client failed: {e}")
+        return False
 
-        return (
-            f"{client_config.protocol}://{client_config.user_id}@{self.host}:{client_config.port}"
-            f"?{params}#{client_config.email}"
-        )
+    @ensure_auth
+    async def del_client(self, inbound_id: int, client_id: str) -> bool:
+        """Delete a client of an inbound by its UUID."""
+        try:
+            response = await self._request(
+                "POST", f"/panel/api/inbounds/{inbound_id}/delClient/{client_id}", idempotent=True
+            )
+            if response.status_code == 200 and response.json().get("success"):
+                self.inbound_cache.invalidate()
+                self.reloads.schedule()
+                logger.info(f"Client {client_id} deleted from inbound {inbound_id} on {self.name}")
+                return True
+            logger.error(f"Error from panel: {response.status_code} {response.text}")
+        except Exception as e:
+            logger.error(f"Delete client failed: {e}")
+        return False
 
+    @ensure_auth
+    async def reload_xray(self) -> bool:
+        """Reload Xray right away; client changes should use ``reloads.schedule()``."""
+        try:
+            response = await self._request("POST", "/panel/api/inbounds/reload", idempotent=True)
+            if response.status_code == 200:
+                logger.info("Inbound reloaded successfully")
+                return True
+            else:
+                logger.error(f"Failed to reload inbound: {response.status_code} {response.text}")
+        except Exception as e:
+            logger.error(f"Exception while reloading inbound: {e}")
+        return False
 
-three_x_ui_client = ThreeXUIClient()
+    @ensure_auth
+    async def get_online(self) -> Optional[List[Any]]:
+        try:
+            response = await self._request("POST", "/panel/api/inbounds/onlines", idempotent=True)
+            if response.status_code == 200:
+                data = response.json()
+                payload_logger.debug("onlines: {}", data.get('obj'))
+                return data.get("obj") or []
+        except Exception as e:
+            logger.error(f"Get online error: {e}")
+        return None
@@ -0,0 +1,348 @@
+"""Streaming export and import of clients.
+
+Usage: python -m service.transfer export|import PATH [--format csv|jsonl]
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import AsyncIterator, Dict, IO, Iterator, List, Optional, Tuple
+from loguru import logger
+from pydantic import ValidationError
+from config import settings
+from database.crud import UsersRepo
+from database.write_buffer import write_buffer
+from schemas.clients import CreateClientSettings
+from schemas.transfer import FIELDS, ClientRow
+from service.inbound_cache import InboundSnapshot
+from service.log import setup_logging
+from service.panel_registry import panel_registry
+from service.reconcile import reconciler
+from service.vless_service import VlessService
+
+FORMATS = ("csv", "jsonl")
+# Invalid rows reported back in detail
+MAX_REPORTED_ERRORS = 20
+
+
+def detect_format(path: str) -> str:
+    """Format by file extension, ``.gz`` ignored; CSV when unknown."""
+    name = path[:-3] if path.endswith(".gz") else path
+    return "jsonl" if name.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+
+def encode_rows(rows: List[ClientRow], fmt: str, header: bool = False) -> bytes:
+    """Serialize rows as one chunk of a CSV or JSONL file."""
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+        if header:
+            writer.writeheader()
+        writer.writerows(row.to_record() for row in rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(row.to_record(), ensure_ascii=False))
+            buffer.write("\n")
+    return buffer.getvalue().encode()
+
+
+class ExportWriter:
+    """Write encoded chunks to ``path``, starting a new part past ``part_size``.
+
+    Parts are gzip-compressed when the path ends with ``.gz`` and the size
+    limit applies to the compressed file. Every CSV part has its own header.
+    """
+
+    def __init__(self, path: str, fmt: str, part_size: int = 0):
+        self.path = path
+        self.fmt = fmt
+        self.part_size = part_size
+        self.paths: List[str] = []
+        self._raw: Optional[IO[bytes]] = None
+        self._file: Optional[IO[bytes]] = None
+
+    def _part_path(self, index: int) -> str:
+        if index == 0:
+            return self.path
+        base, gz = (self.path[:-3], ".gz") if self.path.endswith(".gz") else (self.path, "")
+        stem, ext = os.path.splitext(base)
+        return f"{stem}.part{index + 1}{ext}{gz}"
+
+    def _open(self) -> None:
+        path = self._part_path(len(self.paths))
+        self.paths.append(path)
+        self._raw = open(path, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb") if path.endswith(".gz") else self._raw
+
+    def write(self, rows: List[ClientRow]) -> None:
+        if self._file is not None and self.part_size and self._raw.tell() >= self.part_size:
+            self.close()
+        new_part = self._file is None
+        if new_part:
+            self._open()
+        self._file.write(encode_rows(rows, self.fmt, header=new_part))
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            if self._raw is not self._file:
+                self._raw.close()
+            self._file = self._raw = None
+
+
+@dataclass
+class ImportReport:
+    """Counts and first errors of an import."""
+    created: int = 0
+    skipped: int = 0
+    failed: int = 0
+    invalid: int = 0
+    users: int = 0
+    links: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def error(self, line_num: int, error) -> None:
+        if isinstance(error, ValidationError):
+            self.invalid += 1
+            error = "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+        elif isinstance(error, ValueError):
+            self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"строка {line_num}: {error}")
+
+    def summary(self) -> str:
+        lines = [
+            "📥 Импорт завершён",
+            f"Создано клиентов: {self.created}",
+            f"Уже существовали: {self.skipped}",
+            f"Ошибки панели: {self.failed}",
+            f"Некорректные строки: {self.invalid}",
+            f"Добавлено пользователей: {self.users}, обновлено ссылок: {self.links}",
+        ]
+        if self.errors:
+            lines.append("")
+            lines.extend(self.errors)
+        return "\n".join(lines)
+
+
+class ClientTransfer:
+    """Export of users joined with panel data, and import of such files.
+
+    Export pages the ``Users`` table by id and looks clients up in the
+    cached inbound snapshots, then appends panel clients without a user, so
+    memory stays bounded by the page size on top of the snapshots the bot
+    keeps anyway. Import reads and validates rows in batches and creates
+    the missing clients with batched addClient calls.
+    """
+
+    def __init__(
+        self,
+        page_size: int = settings.EXPORT_PAGE_SIZE,
+        import_batch: int = settings.IMPORT_BATCH,
+    ):
+        self.page_size = page_size
+        self.import_batch = import_batch
+        self.users_repo = UsersRepo()
+        self.vless_service = VlessService()
+
+    async def iter_rows(self) -> AsyncIterator[List[ClientRow]]:
+        """Yield export rows page by page."""
+        await write_buffer.flush()
+        snapshots = await panel_registry.get_snapshots()
+        after_id = 0
+        while True:
+            page = await self.users_repo.get_page(after_id, self.page_size)
+            if not page:
+                break
+            rows = []
+            for _, username, tg_id, sub_id, link in page:
+                rows.extend(self._user_rows(snapshots, username, tg_id, sub_id, link))
+            yield rows
+            after_id = page[-1][0]
+
+        for node, snapshot in snapshots.items():
+            emails = iter(snapshot.by_email)
+            while chunk := list(islice(emails, self.page_size)):
+                known = await self.users_repo.get_links(chunk)
+                rows = [
+                    self._client_row(node, snapshot, email, None)
+                    for email in chunk if email and email not in known
+                ]
+                if rows:
+                    yield rows
+
+    def _user_rows(
+        self, snapshots: Dict[str, InboundSnapshot], username: str, tg_id: int,
+        sub_id: Optional[str], link: Optional[str],
+    ) -> Iterator[ClientRow]:
+        found = False
+        for node, snapshot in snapshots.items():
+            if username in snapshot.by_email:
+                found = True
+                yield self._client_row(node, snapshot, username, tg_id)
+        if not found:
+            yield ClientRow.model_construct(username=username, tg_id=tg_id, sub_id=sub_id or "", link=link or "")
+
+    def _client_row(self, node: str, snapshot: InboundSnapshot, email: str, tg_id: Optional[int]) -> ClientRow:
+        ib, raw = snapshot.by_email[email]
+        stat = ib.stats_by_email.get(email) or {}
+        # Rows come from validated panel data, skip the validation cost
+        return ClientRow.model_construct(
+            username=email,
+            tg_id=tg_id,
+            node=node,
+            inbound_id=ib.id,
+            uuid=raw.get("id") or None,
+            sub_id=raw.get("subId") or "",
+            enable=raw.get("enable", True),
+            expiry_time=raw.get("expiryTime") or 0,
+            total_gb=raw.get("totalGB") or 0,
+            up=stat.get("up", 0),
+            down=stat.get("down", 0),
+            link="\n".join(panel_registry.nodes[node].links.links(ib, raw)),
+        )
+
+    async def export_file(self, path: str, fmt: Optional[str] = None, part_size: int = 0) -> Tuple[List[str], int]:
+        """Write the export to ``path`` (split into parts above ``part_size``); return paths and row count."""
+        fmt = fmt or detect_format(path)
+        writer = ExportWriter(path, fmt, part_size)
+        count = 0
+        try:
+            async for rows in self.iter_rows():
+                await asyncio.to_thread(writer.write, rows)
+                count += len(rows)
+            if not writer.paths:
+                await asyncio.to_thread(writer.write, [])
+        finally:
+            await asyncio.to_thread(writer.close)
+        logger.info(f"Exported {count} clients to {', '.join(writer.paths)}")
+        return writer.paths, count
+
+    async def import_file(self, path: str, fmt: Optional[str] = None) -> ImportReport:
+        """Create clients and users listed in the file; existing clients are skipped."""
+        fmt = fmt or detect_format(path)
+        report = ImportReport()
+        # Taken once: clients created by this import are caught as duplicates by the panel
+        snapshots = await panel_registry.get_snapshots()
+        with (gzip.open(path, "rt", newline="") if path.endswith(".gz") else open(path, newline="")) as file:
+            records = self._read_records(file, fmt)
+            while batch := await asyncio.to_thread(lambda: list(islice(records, self.import_batch))):
+                await self._import_batch(batch, snapshots, report)
+        if report.created or report.users:
+            reconcile = await reconciler.reconcile(full=True)
+            report.links = len(reconcile.updated)
+        logger.info(f"Import of {path}: {report.created} created, {report.skipped} skipped, "
+                    f"{report.failed} failed, {report.invalid} invalid")
+        return report
+
+    @staticmethod
+    def _read_records(file: IO[str], fmt: str) -> Iterator[Tuple[int, object]]:
+        if fmt == "csv":
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+            return
+        for line_num, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_num, json.loads(line)
+            except ValueError as e:
+                yield line_num, e
+
+    async def _import_batch(
+        self, batch: List[Tuple[int, object]], snapshots: Dict[str, InboundSnapshot], report: ImportReport
+    ) -> None:
+        rows: List[Tuple[int, ClientRow]] = []
+        for line_num, record in batch:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                rows.append((line_num, ClientRow.model_validate(record)))
+            except (ValidationError, ValueError) as e:
+                report.error(line_num, e)
+
+        pending: List[Tuple[CreateClientSettings, Optional[Tuple[str, int]]]] = []
+        pending_lines: List[int] = []
+        for line_num, row in rows:
+            if any(row.username in snapshot.by_email for snapshot in snapshots.values()):
+                report.skipped += 1
+                continue
+            pending.append((self._create_settings(row), self._target(snapshots, row)))
+            pending_lines.append(line_num)
+
+        if pending:
+            results = await self.vless_service.bulk_provision(pending)
+            for line_num, result in zip(pending_lines, results):
+                if result.success:
+                    report.created += 1
+                elif result.duplicate:
+                    report.skipped += 1
+                else:
+                    report.failed += 1
+                    report.error(line_num, result.error)
+
+        users = [(row.username, row.tg_id) for _, row in rows if row.tg_id is not None]
+        report.users += await self.users_repo.import_users(users)
+
+    @staticmethod
+    def _create_settings(row: ClientRow) -> CreateClientSettings:
+        values = {
+            "email": row.username,
+            "enable": row.enable,
+            "expiryTime": row.expiry_time,
+            "totalGB": row.total_gb,
+            "tgId": str(row.tg_id) if row.tg_id is not None else "",
+        }
+        if row.uuid:
+            values["id"] = str(row.uuid)
+        if row.sub_id:
+            values["subId"] = row.sub_id
+        return CreateClientSettings(**values)
+
+    @staticmethod
+    def _target(snapshots: Dict[str, InboundSnapshot], row: ClientRow) -> Optional[Tuple[str, int]]:
+        """Keep the row's inbound when it exists, otherwise let placement decide."""
+        snapshot = snapshots.get(row.node)
+        if snapshot is None or row.inbound_id is None:
+            return None
+        if not any(ib.id == row.inbound_id for ib in snapshot.inbounds):
+            return None
+        return row.node, row.inbound_id
+
+
+client_transfer = ClientTransfer()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from database.base import db_manager
+
+    setup_logging()
+    await db_manager.init_db()
+    write_buffer.start()
+    try:
+        if args.command == "export":
+            paths, count = await client_transfer.export_file(args.path, args.format)
+            print(f"{count} rows written to {', '.join(paths)}")
+        else:
+            report = await client_transfer.import_file(args.path, args.format)
+            print(report.summary())
+    finally:
+        await panel_registry.close()
+        await write_buffer.stop()
+        await db_manager.close()
+        await logger.complete()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import clients")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="File path, a .gz suffix enables gzip")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    asyncio.run(_main(parser.parse_args()))
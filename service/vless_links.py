@@ -0,0 +1,188 @@
+"""VLESS share link generation."""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+from weakref import WeakKeyDictionary
+from loguru import logger
+from schemas.inbounds import LazyInbound
+from schemas.settings import StreamSettings
+
+# Query parameters that only make sense with TLS or Reality
+SECURITY_PARAMS = ("fp", "sni", "alpn", "allowInsecure", "pbk", "sid", "spx", "pqv")
+
+
+def _encode(value: Any) -> str:
+    return quote(str(value), safe="")
+
+
+def _address(host: str) -> str:
+    return f"[{host}]" if ":" in host and not host.startswith("[") else host
+
+
+def _network_params(stream: StreamSettings) -> Dict[str, str]:
+    network = stream.network
+    params: Dict[str, str] = {}
+    if network == "tcp" and stream.tcpSettings:
+        header = stream.tcpSettings.header or {}
+        if header.get("type") == "http":
+            request = header.get("request") or {}
+            params["headerType"] = "http"
+            params["path"] = ",".join(request.get("path") or ["/"])
+            host = (request.get("headers") or {}).get("Host") or []
+            if host:
+                params["host"] = ",".join(host)
+    elif network == "ws" and stream.wsSettings:
+        ws = stream.wsSettings
+        params["path"] = ws.path
+        host = ws.host or ws.headers.get("Host", "")
+        if host:
+            params["host"] = host
+    elif network == "grpc" and stream.grpcSettings:
+        grpc = stream.grpcSettings
+        params["serviceName"] = grpc.serviceName
+        if grpc.authority:
+            params["authority"] = grpc.authority
+        if grpc.multiMode:
+            params["mode"] = "multi"
+    elif network == "httpupgrade" and stream.httpupgradeSettings:
+        params["path"] = stream.httpupgradeSettings.path
+        if stream.httpupgradeSettings.host:
+            params["host"] = stream.httpupgradeSettings.host
+    elif network == "xhttp" and stream.xhttpSettings:
+        xhttp = stream.xhttpSettings
+        params["path"] = xhttp.path
+        if xhttp.host:
+            params["host"] = xhttp.host
+        params["mode"] = xhttp.mode
+    return params
+
+
+def _security_params(stream: StreamSettings, default_spider_x: str) -> Dict[str, str]:
+    params = {"security": stream.security}
+    if stream.security == "reality" and stream.realitySettings:
+        reality = stream.realitySettings
+        inner = reality.settings
+        params["pbk"] = inner.publicKey
+        params["fp"] = inner.fingerprint
+        params["sni"] = inner.serverName or (reality.serverNames[0] if reality.serverNames else "")
+        params["sid"] = reality.shortIds[0] if reality.shortIds else ""
+        params["spx"] = inner.spiderX or default_spider_x
+        if inner.mldsa65Verify:
+            params["pqv"] = inner.mldsa65Verify
+    elif stream.security == "tls" and stream.tlsSettings:
+        tls = stream.tlsSettings
+        if tls.settings.fingerprint:
+            params["fp"] = tls.settings.fingerprint
+        if tls.alpn:
+            params["alpn"] = ",".join(tls.alpn)
+        if tls.settings.allowInsecure:
+            params["allowInsecure"] = "1"
+        if tls.serverName:
+            params["sni"] = tls.serverName
+    return params
+
+
+@dataclass(frozen=True)
+class LinkEndpoint:
+    """One address of an inbound with everything but the client filled in."""
+    # "@host:port?query" without the flow parameter
+    address_query: str
+    # Whether the client's flow is added to the query
+    flow: bool
+    # Appended to the email in the link name, already URL-encoded
+    remark_suffix: str
+
+
+@dataclass(frozen=True)
+class InboundLinkTemplate:
+    """Precompiled links of one inbound; a client link is a plain concatenation."""
+    endpoints: Tuple[LinkEndpoint, ...]
+
+    def render(self, client: Dict[str, Any]) -> List[str]:
+        uuid = client.get("id", "")
+        email = _encode(client.get("email", ""))
+        flow = client.get("flow") or ""
+        flow_param = f"&flow={_encode(flow)}" if flow else ""
+        return [
+            f"vless://{uuid}{endpoint.address_query}"
+            f"{flow_param if endpoint.flow else ''}#{email}{endpoint.remark_suffix}"
+            for endpoint in self.endpoints
+        ]
+
+
+def compile_template(ib: LazyInbound, host: str, default_spider_x: str = "/") -> InboundLinkTemplate:
+    """Build the link template of a vless inbound.
+
+    Every external proxy of the inbound becomes its own endpoint; without
+    them the panel host and inbound port are used.
+    """
+    stream = ib.stream_settings
+    base = {"type": stream.network, "encryption": ib.raw_settings.get("decryption") or "none"}
+    base.update(_network_params(stream))
+    security = _security_params(stream, default_spider_x)
+
+    targets = [(proxy.dest, proxy.port, proxy.forceTls, proxy.remark) for proxy in stream.externalProxy]
+    if not targets:
+        targets = [(host, ib.port, "same", "")]
+
+    endpoints = []
+    for address, port, force_tls, remark in targets:
+        params = dict(base)
+        params.update(security)
+        if force_tls in ("tls", "none") and force_tls != stream.security:
+            params["security"] = force_tls
+            if force_tls == "none":
+                for key in SECURITY_PARAMS:
+                    params.pop(key, None)
+        query = "&".join(f"{key}={_encode(value)}" for key, value in params.items())
+        endpoints.append(LinkEndpoint(
+            address_query=f"@{_address(address)}:{port}?{query}",
+            flow=stream.network == "tcp" and params["security"] in ("tls", "reality"),
+            remark_suffix=_encode(f"-{remark}") if remark else "",
+        ))
+    return InboundLinkTemplate(tuple(endpoints))
+
+
+class VlessLinkBuilder:
+    """Share links of one panel node with templates cached per inbound.
+
+    Templates are keyed by the ``LazyInbound`` object, so they live as long
+    as the inbound snapshot they were compiled from.
+    """
+
+    def __init__(self, host: str, spx: str = "2F"):
+        self.host = host
+        # THREEX_SPX is the URL-encoded spiderX without the leading "%"
+        self.default_spider_x = unquote(f"%{spx}") if spx else "/"
+        self._templates: 'WeakKeyDictionary[LazyInbound, Optional[InboundLinkTemplate]]' = WeakKeyDictionary()
+
+    def template(self, ib: LazyInbound) -> Optional[InboundLinkTemplate]:
+        """Compiled template, None for inbounds that can't produce vless links."""
+        try:
+            return self._templates[ib]
+        except KeyError:
+            pass
+        template = None
+        if ib.protocol == "vless":
+            try:
+                template = compile_template(ib, self.host, self.default_spider_x)
+            except Exception as e:
+                logger.error(f"Cannot build links for inbound {ib.id}: {e}")
+        self._templates[ib] = template
+        return template
+
+    def links(self, ib: LazyInbound, client: Dict[str, Any]) -> List[str]:
+        """Links of one raw client dict of the inbound."""
+        template = self.template(ib)
+        return template.render(client) if template else []
+
+    def iter_inbound(self, ib: LazyInbound) -> Iterator[Tuple[str, str]]:
+        """Yield ``(email, link)`` for every client of the inbound."""
+        template = self.template(ib)
+        if template is None:
+            return
+        for client in ib.raw_clients:
+            email = client.get("email", "")
+            for link in template.render(client):
+                yield email, link
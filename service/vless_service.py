@@ -1,10 +1,20 @@
 """VLESS service module."""
 
-from typing import Optional
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
-from database.crud import UsersRepo
-from service.threex_ui_client import three_x_ui_client
 from config import settings
+from database.crud import UsersRepo
+from schemas.clients import CreateClientSettings
+from service.client_batcher import ClientCreateResult, client_queue
+from service.panel_registry import panel_registry
+from service.placement import placement_engine
+
+# Concurrent delClient requests of a bulk removal
+REMOVE_CONCURRENCY = 10
+
+REMOVED, NOT_FOUND, FAILED = "removed", "not_found", "failed"
 
 
 class VlessService:
@@ -20,8 +30,19 @@ class VlessService:
         if user and user.vless_link:
             return user.vless_link
         
-        vless_links = await three_x_ui_client.get_vless_url_by_username(username=username)
-        return vless_links[0] if vless_links else None
+        vless_links = await panel_registry.get_vless_url_by_username(username=username)
+        return "\n".join(vless_links) if vless_links else None
+
+    async def get_subscription_url(self, username: str) -> Optional[str]:
+        """Public subscription URL of the user, None when not configured."""
+        if not settings.SUB_URL:
+            return None
+        user = await self.users_repo.get_user_by_username(username=username)
+        sub_id = user.vless_uuid if user else None
+        if not sub_id:
+            client = await panel_registry.get_client_by_username(username=username)
+            sub_id = client.subId if client else None
+        return f"{settings.SUB_URL.rstrip('/')}/{sub_id}" if sub_id else None
 
     async def create_vless_client(self, username: str) -> bool:
         """Create new VLESS client."""
@@ -30,26 +51,114 @@ class VlessService:
             raise Exception('Client already exists')
         
         try:
-            await three_x_ui_client.add_client(
-                username=username,
-                inbound_id=settings.INBOUND_ID
+            panel, inbound_id = placement_engine.choose()
+            result = await client_queue.submit(
+                panel, inbound_id, CreateClientSettings(email=username)
             )
-            client = await three_x_ui_client.get_client_by_username(username=username)
+            if result.duplicate:
+                raise Exception('Client already exists')
+            if not result.success:
+                raise Exception(f'Failed to create client: {result.error}')
+            client = await panel_registry.get_client_by_username(username=username)
             if not client:
                 raise Exception('Failed to get created client')
             
             logger.info(f"Created VLESS client: {client}")
             
-            vless_links = await three_x_ui_client.get_vless_url_by_username(username=username)
+            vless_links = await panel_registry.get_vless_url_by_username(username=username)
             if not vless_links:
                 raise Exception('Failed to get VLESS URL')
             
             await self.users_repo.update_users_vless_link(
                 username=username,
-                vless_link=vless_links[0],
+                vless_link="\n".join(vless_links),
                 vless_uuid=client.subId
             )
             return True
         except Exception as e:
             logger.error(f"Failed to create VLESS client: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def remove_vless_clients(self, usernames: List[str]) -> Dict[str, str]:
+        """Delete clients from every node and clear their stored links.
+
+        Returns ``REMOVED``, ``NOT_FOUND`` or ``FAILED`` per username. A link
+        is cleared only once every node answered and none of them still has
+        the client; if a node did not answer or a deletion failed, the link
+        is kept and the result is ``FAILED``, so the removal can be retried.
+        Deletions run concurrently; Xray reloads are coalesced per node.
+        """
+        snapshots = await panel_registry.get_fresh_snapshots()
+        unanswered = [name for name in panel_registry.nodes if name not in snapshots]
+        semaphore = asyncio.Semaphore(REMOVE_CONCURRENCY)
+
+        async def delete(node: str, inbound_id: int, client_id: str) -> bool:
+            async with semaphore:
+                return await panel_registry.nodes[node].del_client(inbound_id, client_id)
+
+        targets: List[Tuple[str, str, int, str]] = []
+        for username in usernames:
+            for node, snapshot in snapshots.items():
+                entry = snapshot.by_email.get(username)
+                if entry is not None:
+                    ib, raw_client = entry
+                    targets.append((username, node, ib.id, raw_client["id"]))
+        deleted = await asyncio.gather(*(delete(node, ib_id, client_id) for _, node, ib_id, client_id in targets))
+
+        failed = {username for (username, *_), ok in zip(targets, deleted) if not ok}
+        if unanswered:
+            logger.warning(f"Nodes {unanswered} did not answer, keeping links of {len(usernames)} users")
+            failed.update(usernames)
+        removed = {username for (username, *_), ok in zip(targets, deleted) if ok}
+        # A buffered link write must not land after the link is cleared
+        await self.users_repo.write_buffer.flush()
+        stored = await self.users_repo.get_links(usernames)
+        # Links of users without a client on any node are stale anyway
+        cleared = [
+            username for username, (link, sub_id) in stored.items()
+            if username not in failed and (link or sub_id)
+        ]
+        await self.users_repo.set_links([(username, None, None) for username in cleared])
+        results = {}
+        for username in usernames:
+            if username in failed:
+                results[username] = FAILED
+            elif username in removed or username in cleared:
+                results[username] = REMOVED
+            else:
+                results[username] = NOT_FOUND
+        logger.info(f"Removed {list(results.values()).count(REMOVED)}/{len(usernames)} clients, "
+                    f"{len(failed)} failed")
+        return results
+
+    async def remove_vless_client(self, username: str) -> str:
+        """Delete the user's clients; ``REMOVED``, ``NOT_FOUND`` or ``FAILED``."""
+        results = await self.remove_vless_clients([username])
+        return results[username]
+
+    async def bulk_create_clients(self, usernames: List[str]) -> List[ClientCreateResult]:
+        """Provision many clients at once, one addClient call per inbound chunk."""
+        return await self.bulk_provision([(CreateClientSettings(email=username), None) for username in usernames])
+
+    async def bulk_provision(
+        self, clients: List[Tuple[CreateClientSettings, Optional[Tuple[str, int]]]]
+    ) -> List[ClientCreateResult]:
+        """Create prepared clients, each on its (node, inbound id) or a placed one."""
+        targets: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+        for index, (_, target) in enumerate(clients):
+            if target is None or target[0] not in panel_registry.nodes:
+                panel, inbound_id = placement_engine.choose()
+                target = (panel.name, inbound_id)
+            targets[target].append(index)
+
+        results: List[Optional[ClientCreateResult]] = [None] * len(clients)
+        for (node, inbound_id), indexes in targets.items():
+            created = await client_queue.submit_many(
+                panel_registry.nodes[node],
+                inbound_id,
+                [clients[index][0] for index in indexes],
+            )
+            for index, result in zip(indexes, created):
+                results[index] = result
+        logger.info(f"Bulk create: {sum(r.success for r in results)}/{len(clients)} created")
+        return results
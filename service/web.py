@@ -0,0 +1,128 @@
+"""HTTP server: Telegram webhook and auxiliary endpoints."""
+
+import asyncio
+import hmac
+from typing import List, Optional
+from aiohttp import web
+from loguru import logger
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from config import settings
+from service.metrics import CONTENT_TYPE, metrics
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebServer:
+    """aiohttp application runner shared by every HTTP endpoint of the bot."""
+
+    def __init__(
+        self,
+        host: str = settings.HTTP_HOST,
+        port: int = settings.HTTP_PORT,
+        metrics_path: Optional[str] = settings.METRICS_PATH if settings.METRICS_ENABLED else None,
+    ):
+        self.host = host
+        self.port = port
+        self.app = web.Application()
+        self._runner: Optional[web.AppRunner] = None
+        if metrics_path:
+            self.app.router.add_get(metrics_path, self.metrics)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class WebhookUpdateServer:
+    """Receive updates over a webhook and process them with a worker pool.
+
+    Requests are acknowledged as soon as the update is queued. When the
+    bounded queue is full the endpoint answers 503 and Telegram redelivers
+    the update later. Several processes may share one database: background
+    jobs run only in the process holding the leader lease, and cached users
+    expire after ``USER_CACHE_TTL`` seconds. A secret is required, otherwise
+    anyone who finds the URL could inject updates.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        path: str = settings.WEBHOOK_PATH,
+        secret: str = settings.WEBHOOK_SECRET,
+        workers: int = settings.WEBHOOK_WORKERS,
+        queue_size: int = settings.WEBHOOK_QUEUE_SIZE,
+    ):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET must be set in webhook mode")
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, app: web.Application) -> None:
+        app.router.add_post(self.path, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            logger.warning(f"Webhook request with invalid secret from {request.remote}")
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.error(f"Invalid webhook payload: {e}")
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logger.warning("Webhook update queue is full, asking Telegram to retry")
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logger.exception(f"Update {update.update_id} failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if settings.WEBHOOK_URL and settings.WEBHOOK_SET_ON_START:
+            await self.bot.set_webhook(
+                url=settings.WEBHOOK_URL.rstrip("/") + self.path,
+                secret_token=self.secret,
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+            logger.info(f"Webhook set to {settings.WEBHOOK_URL.rstrip('/')}{self.path}")
+        logger.info(f"Webhook mode: {self.workers} workers, queue {self.queue.maxsize}")
+
+    async def stop(self, timeout: float = settings.WEBHOOK_DRAIN_TIMEOUT) -> None:
+        """Finish queued updates, then stop the workers."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} queued updates on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,53 @@
+"""Shared fixtures: a temporary database and a client of the fake panel.
+
+Settings are read when the bot modules are imported, so the environment
+is set up here, before any of them is loaded.
+"""
+
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="3x-ui-bot-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:test")
+os.environ.setdefault("THREEX_HASH_PANEL", "test")
+os.environ["THREEX_RETRY_BASE"] = "0.001"
+os.environ["THREEX_RETRY_MAX"] = "0.001"
+
+import pytest
+from sqlalchemy import delete
+
+import database.models  # noqa: E402,F401  register tables before init_db
+from benchmarks.fake_panel import FakePanel
+from database.base import Base, db_manager
+from database.cache import user_cache
+from service.threex_ui_client import ThreeXUIClient
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def database():
+    await db_manager.init_db()
+    yield db_manager
+    await db_manager.close()
+
+
+@pytest.fixture(autouse=True)
+async def clean_database(database):
+    yield
+    async with database.get_session() as session:
+        for table in reversed(Base.metadata.sorted_tables):
+            await session.execute(delete(table))
+        await session.commit()
+    user_cache.clear()
+
+
+@pytest.fixture
+def panel() -> FakePanel:
+    return FakePanel(inbounds=1, clients=10)
+
+
+@pytest.fixture
+async def panel_client(panel):
+    client = ThreeXUIClient(name="test", transport=panel)
+    yield client
+    await client.close()
@@ -0,0 +1,35 @@
+import asyncio
+from database.crud import BroadcastRepo, UsersRepo
+from service.broadcast import Broadcaster
+
+
+class Bot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        self.sent.append((chat_id, text))
+
+
+async def test_broadcast_resumes_from_checkpoint():
+    await UsersRepo().import_users([(f"user{i}", 100 + i) for i in range(5)])
+    repo = BroadcastRepo()
+    broadcast = await repo.create("news", created_by=1)
+    first_page = await repo.get_recipients(0, 2)
+    # A previous process delivered the first page and stopped
+    await repo.checkpoint(broadcast.id, first_page[-1][0], sent=2, failed=0, blocked=0)
+
+    bot = Bot()
+    broadcaster = Broadcaster(repo=repo, rate=1000, chat_rate=1000, page_size=2)
+    await broadcaster.start(bot)
+    await broadcaster.resume()
+    try:
+        await asyncio.gather(*broadcaster._tasks.values())
+    finally:
+        await broadcaster.stop()
+
+    assert bot.sent[:-1] == [(100 + i, "news") for i in range(2, 5)]
+    assert bot.sent[-1][0] == 1 and "Доставлено: 5" in bot.sent[-1][1]
+    stored = await repo.get(broadcast.id)
+    assert (stored.status, stored.sent) == ("done", 5)
+    assert await repo.get_running() == []
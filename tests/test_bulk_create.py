@@ -0,0 +1,43 @@
+import pytest
+from service.handlers import BotHandlers
+from service.panel_registry import panel_registry
+
+
+class Chat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+        self.username = "admin"
+
+
+class Message:
+    def __init__(self, text: str, chat_id: int = 1):
+        self.chat = Chat(chat_id)
+        self.text = text
+        self.answers = []
+
+    async def answer(self, text: str, **kwargs) -> None:
+        self.answers.append(text)
+
+
+@pytest.fixture
+def admin(monkeypatch, panel_client):
+    monkeypatch.setattr("service.handlers.settings.ADMIN_IDS", [1])
+    monkeypatch.setattr(panel_registry, "nodes", {panel_client.name: panel_client})
+
+
+async def test_bulk_create_reports_created_and_existing(admin, panel):
+    message = Message("/bulkcreate new1 user1 new2 new1")
+
+    await BotHandlers().bulk_create(message)
+
+    assert message.answers == ["➕ Создано: 2 из 3\nУже существуют: user1"]
+    assert {"new1", "new2"} <= set(panel.emails)
+
+
+async def test_bulk_create_is_for_admins_only(admin, panel):
+    message = Message("/bulkcreate new1", chat_id=2)
+
+    await BotHandlers().bulk_create(message)
+
+    assert message.answers == ["❌ Команда доступна только администраторам"]
+    assert "new1" not in panel.emails
@@ -0,0 +1,75 @@
+import asyncio
+from schemas.clients import CreateClientSettings
+from service.client_batcher import ClientCreationQueue
+
+
+def new(email: str) -> CreateClientSettings:
+    return CreateClientSettings(email=email)
+
+
+async def test_duplicate_email_fails_only_that_client(panel, panel_client):
+    queue = ClientCreationQueue(window=0.05, max_size=10)
+
+    results = await queue.submit_many(panel_client, 1, [new("new1"), new("user3"), new("new2")])
+
+    assert [(r.email, r.success) for r in results] == [("new1", True), ("user3", False), ("new2", True)]
+    assert results[1].duplicate
+    # The panel rejected the first batch, the rest was resent without user3
+    assert panel.requests["addClient"] == 2
+    assert {"new1", "new2"} <= set(panel.emails)
+
+
+async def test_duplicate_within_batch_is_not_sent(panel, panel_client):
+    queue = ClientCreationQueue(window=0.05, max_size=10)
+
+    results = await queue.submit_many(panel_client, 1, [new("same"), new("same")])
+
+    assert [r.success for r in results] == [True, False]
+    assert results[1].duplicate
+    assert panel.requests["addClient"] == 1
+
+
+async def test_known_duplicate_skips_panel_with_fresh_snapshot(panel, panel_client):
+    queue = ClientCreationQueue(window=0.05, max_size=10)
+    await panel_client.inbound_cache.get()
+
+    results = await queue.submit_many(panel_client, 1, [new("user1")])
+
+    assert results[0].duplicate
+    assert panel.requests["addClient"] == 0
+
+
+async def test_lone_create_is_sent_without_waiting_for_window(panel, panel_client):
+    queue = ClientCreationQueue(window=10, max_size=10)
+
+    result = await asyncio.wait_for(queue.submit(panel_client, 1, new("alone")), 1)
+
+    assert result.success
+    assert panel.requests["addClient"] == 1
+
+
+async def test_concurrent_creates_share_batches(panel, panel_client):
+    queue = ClientCreationQueue(window=0.05, max_size=100)
+    emails = [f"burst{i}" for i in range(20)] + ["user5"]
+
+    results = await asyncio.gather(*(queue.submit(panel_client, 1, new(email)) for email in emails))
+
+    assert [r.email for r in results] == emails
+    assert all(r.success for r in results[:-1])
+    assert results[-1].duplicate
+    # The first create goes out alone, the rest are gathered while it is in flight;
+    # the duplicate costs one resend
+    assert panel.requests["addClient"] == 3
+    assert set(emails[:-1]) <= set(panel.emails)
+
+
+async def test_max_size_flushes_before_window(panel, panel_client):
+    queue = ClientCreationQueue(window=10, max_size=5)
+    emails = [f"full{i}" for i in range(11)]
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(queue.submit(panel_client, 1, new(email)) for email in emails)), 2
+    )
+
+    assert all(r.success for r in results)
+    assert panel.requests["addClient"] == 3
@@ -0,0 +1,134 @@
+import time
+import pytest
+from database.crud import NoticeRepo
+from service.broadcast import SENT
+from service.expiry import DISABLED_TEXT, EXPIRED, OVER_QUOTA, ExpiryScheduler
+from service.panel_registry import PanelRegistry
+
+DAY = 86400
+GB = 1024 ** 3
+
+
+class Notifier:
+    def __init__(self):
+        self.sent = []
+
+    async def notify(self, chat_id: int, text: str) -> str:
+        self.sent.append((chat_id, text))
+        return SENT
+
+
+def set_client(panel, email, stat=None, **values):
+    inbound = panel.inbounds[panel.emails[email]]
+    for client in inbound.clients:
+        if client["email"] == email:
+            client.update(values)
+    for item in inbound.stats:
+        if item["email"] == email:
+            item.update(stat or {})
+    inbound._settings_json = None
+
+
+def expires_in(seconds: float) -> int:
+    return int((time.time() + seconds) * 1000)
+
+
+@pytest.fixture
+def notifier():
+    return Notifier()
+
+
+@pytest.fixture
+def scheduler(panel_client, notifier):
+    return ExpiryScheduler(
+        registry=PanelRegistry([panel_client]),
+        notifier=notifier,
+        warn_before=[3 * DAY, DAY],
+        quota_warn_at=[0.8, 0.95],
+    )
+
+
+async def refresh(scheduler, panel_client):
+    panel_client.inbound_cache.invalidate()
+    scheduler.update(panel_client.name, await panel_client.inbound_cache.get())
+
+
+async def test_due_entries_are_sent_once_and_future_ones_wait(panel, panel_client, scheduler, notifier):
+    expiry = expires_in(2 * DAY)
+    set_client(panel, "user1", expiryTime=expiry, tgId="1001")
+    await refresh(scheduler, panel_client)
+
+    # Passed 3-day warning now, 1-day warning and disable later
+    assert len(scheduler) == 3
+    await scheduler.process_due()
+
+    assert notifier.sent == [(1001, "⏳ Доступ к VPN закончится через 2 дн.\n"
+                                    "Продлите его, чтобы не потерять подключение.")]
+    assert scheduler._heap[0][0] == pytest.approx(expiry / 1000 - DAY)
+    assert await NoticeRepo().get_all() == {("user1", "expire:259200"): expiry}
+
+    # A restarted scheduler loads the sent notices and does not repeat them
+    restarted = ExpiryScheduler(registry=scheduler.registry, notifier=notifier, warn_before=[3 * DAY, DAY])
+    restarted._sent = await NoticeRepo().get_all()
+    await refresh(restarted, panel_client)
+    await restarted.process_due()
+    assert len(notifier.sent) == 1
+
+
+async def test_unchanged_clients_are_not_rescheduled(panel, panel_client, scheduler):
+    set_client(panel, "user1", expiryTime=expires_in(10 * DAY))
+    await refresh(scheduler, panel_client)
+    queued = len(scheduler)
+
+    await refresh(scheduler, panel_client)
+
+    assert len(scheduler) == queued == 3
+
+
+async def test_outdated_entries_are_dropped(panel, panel_client, scheduler, notifier):
+    set_client(panel, "user1", expiryTime=expires_in(-1), tgId="1001")
+    await refresh(scheduler, panel_client)
+    # Renewed before the disable went out
+    set_client(panel, "user1", expiryTime=expires_in(10 * DAY))
+    await refresh(scheduler, panel_client)
+
+    await scheduler.process_due()
+
+    assert panel.requests["updateClient"] == 0
+    assert notifier.sent == []
+
+
+async def test_expired_clients_are_disabled_on_panel(panel, panel_client, scheduler, notifier):
+    for email in ("user1", "user2", "user3"):
+        set_client(panel, email, expiryTime=expires_in(-1), tgId="1001")
+    await refresh(scheduler, panel_client)
+
+    await scheduler.process_due()
+
+    assert panel.requests["updateClient"] == 3
+    disabled = [c["email"] for c in panel.inbounds[1].clients if not c["enable"]]
+    assert disabled == ["user1", "user2", "user3"]
+    assert notifier.sent == [(1001, DISABLED_TEXT[EXPIRED])] * 3
+    # The reloads of the disables are left to the node's debouncer
+    assert panel_client.reloads.pending == 3
+    assert len(scheduler) == 0
+
+
+async def test_quota_warning_then_disable(panel, panel_client, scheduler, notifier):
+    set_client(panel, "user1", stat={"up": 0, "down": 85 * GB}, totalGB=100 * GB, tgId="1001")
+    await refresh(scheduler, panel_client)
+
+    await scheduler.process_due()
+    assert notifier.sent == [(1001, "📊 Использовано 85% трафика: 85.0 из 100.0 ГБ")]
+
+    # Usage between thresholds queues nothing new
+    set_client(panel, "user1", stat={"down": 90 * GB})
+    await refresh(scheduler, panel_client)
+    assert len(scheduler) == 0
+
+    set_client(panel, "user1", stat={"down": 100 * GB})
+    await refresh(scheduler, panel_client)
+    await scheduler.process_due()
+
+    assert panel.requests["updateClient"] == 1
+    assert notifier.sent[-1] == (1001, DISABLED_TEXT[OVER_QUOTA])
@@ -0,0 +1,114 @@
+import asyncio
+from typing import List
+from schemas.inbounds import LazyInbound
+from service.inbound_cache import InboundCache
+
+
+def inbounds(*emails: str) -> List[LazyInbound]:
+    return [LazyInbound({"id": 1, "settings": {"clients": [{"email": email} for email in emails]}})]
+
+
+class GatedLoader:
+    """Loader whose calls block until released; each call returns its own data."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self) -> List[LazyInbound]:
+        self.calls += 1
+        call = self.calls
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("panel down")
+        return inbounds(f"v{call}")
+
+
+async def test_concurrent_gets_share_one_panel_request(panel, panel_client):
+    cache = panel_client.inbound_cache
+
+    snapshots = await asyncio.gather(*(cache.get() for _ in range(20)))
+
+    assert panel.requests["list"] == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert "user0" in snapshots[0].by_email
+    assert await cache.get() is snapshots[0]
+    assert (cache.hits, cache.refreshes) == (1, 1)
+
+
+async def test_stale_snapshot_is_served_while_refreshing():
+    loader = GatedLoader()
+    cache = InboundCache(loader, ttl=0.01, max_stale=10)
+    first = await cache.get()
+    await asyncio.sleep(0.02)
+    loader.gate.clear()
+
+    stale = await asyncio.wait_for(cache.get(), 0.5)
+
+    assert stale is first and cache.stale_hits == 1
+    loader.gate.set()
+    await asyncio.sleep(0)
+    fresh = await cache.get()
+    assert set(fresh.by_email) == {"v2"}
+    assert loader.calls == 2
+
+
+async def test_stale_snapshot_covers_failed_refresh_until_max_stale():
+    loader = GatedLoader()
+    cache = InboundCache(loader, ttl=0.01, max_stale=0.1)
+    first = await cache.get()
+    loader.fail = True
+    await asyncio.sleep(0.02)
+
+    assert await cache.get() is first
+    await asyncio.sleep(0.1)
+    assert await cache.get() is None
+
+
+async def test_invalidate_detaches_refresh_started_before_write():
+    loader = GatedLoader()
+    cache = InboundCache(loader, ttl=10, max_stale=10)
+    loader.gate.clear()
+    before_write = asyncio.ensure_future(cache.get())
+    await asyncio.sleep(0)
+
+    cache.invalidate()
+    after_write = asyncio.ensure_future(cache.get())
+    await asyncio.sleep(0)
+    loader.gate.set()
+
+    assert set((await before_write).by_email) == {"v1"}
+    assert set((await after_write).by_email) == {"v2"}
+    assert loader.calls == 2
+    # Only the refresh of the current generation becomes the cached snapshot
+    assert set(cache.peek().by_email) == {"v2"}
+
+
+async def test_invalidated_snapshot_is_not_served_as_stale():
+    loader = GatedLoader()
+    cache = InboundCache(loader, ttl=10, max_stale=10)
+    await cache.get()
+    cache.invalidate()
+    loader.gate.clear()
+
+    waiting = asyncio.ensure_future(cache.get())
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    loader.gate.set()
+
+    assert set((await waiting).by_email) == {"v2"}
+    assert cache.stale_hits == 0
+
+
+async def test_listeners_get_every_current_snapshot():
+    loader = GatedLoader()
+    cache = InboundCache(loader, ttl=0, max_stale=0)
+    seen = []
+    cache.add_listener(lambda snapshot: seen.append(set(snapshot.by_email)))
+
+    await cache.get()
+    await cache.get()
+
+    assert seen == [{"v1"}, {"v2"}]
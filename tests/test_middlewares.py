@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+from typing import List
+from aiogram.types import Chat, Message
+from service.middlewares import PanelGuardMiddleware
+
+ANSWERS: List[str] = []
+
+
+class RecordingMessage(Message):
+    async def answer(self, text: str, **kwargs) -> None:
+        ANSWERS.append(text)
+
+
+def message(text: str, chat_id: int = 1) -> RecordingMessage:
+    return RecordingMessage(
+        message_id=1,
+        date=datetime.datetime.now(),
+        chat=Chat(id=chat_id, type="private"),
+        text=text,
+    )
+
+
+def guard(**kwargs) -> PanelGuardMiddleware:
+    ANSWERS.clear()
+    options = dict(
+        user_rate=100, user_burst=100, command_per_minute={},
+        panel_commands=["vless", "create"], mutating_commands=["create"], max_concurrency=10,
+    )
+    options.update(kwargs)
+    return PanelGuardMiddleware(**options)
+
+
+async def test_repeated_mutating_command_joins_running_one():
+    middleware = guard()
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event.text)
+        await release.wait()
+        return "created"
+
+    first = asyncio.create_task(middleware(handler, message("/create"), {}))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(middleware(handler, message("/create"), {}))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(first, second) == ["created", "created"]
+    assert calls == ["/create"]
+    # Once finished the command runs again
+    assert await middleware(handler, message("/create"), {}) == "created"
+    assert len(calls) == 2
+
+
+async def test_commands_are_throttled_per_user_and_per_command():
+    middleware = guard(user_rate=0.001, user_burst=3, command_per_minute={"vless": 1})
+
+    async def handler(event, data):
+        return "ok"
+
+    results = [await middleware(handler, message(text), {}) for text in ("/vless", "/vless", "/start", "/start")]
+
+    assert results == ["ok", None, "ok", None]
+    assert ANSWERS == ["⏳ Слишком часто /vless, попробуйте позже", "⏳ Слишком много запросов, попробуйте позже"]
+    # Buckets are kept per user
+    assert await middleware(handler, message("/vless", chat_id=2), {}) == "ok"
+
+
+async def test_busy_answer_when_panel_concurrency_is_saturated():
+    middleware = guard(max_concurrency=1)
+    release = asyncio.Event()
+
+    async def handler(event, data):
+        await release.wait()
+        return "ok"
+
+    running = asyncio.create_task(middleware(handler, message("/vless"), {}))
+    await asyncio.sleep(0)
+
+    assert await middleware(handler, message("/vless", chat_id=2), {}) is None
+    assert ANSWERS == ["⏳ Сервер занят, повторите через несколько секунд"]
+    # Commands that do not touch the panel are not capped
+    assert await middleware(lambda event, data: asyncio.sleep(0, "help"), message("/help", chat_id=2), {}) == "help"
+
+    release.set()
+    assert await running == "ok"
@@ -0,0 +1,28 @@
+from schemas.inbounds import LazyInbound
+from service.placement import InboundLoad
+
+
+def inbound(total: int, up: int, down: int, client_traffic: int) -> LazyInbound:
+    return LazyInbound({
+        "id": 1, "enable": True, "total": total, "up": up, "down": down,
+        "clientStats": [{"email": "user0", "up": client_traffic, "down": 0, "allTime": client_traffic}],
+        "settings": '{"clients": []}',
+    })
+
+
+def test_quota_is_checked_against_inbound_counters():
+    # Stats of deleted or reset clients are gone, the inbound counters keep them
+    spent = InboundLoad.from_inbound("a", inbound(total=100, up=60, down=40, client_traffic=10))
+    assert spent.remaining == 0
+    assert not spent.available
+    assert spent.traffic == 10
+
+    left = InboundLoad.from_inbound("a", inbound(total=100, up=30, down=20, client_traffic=90))
+    assert left.remaining == 50
+    assert left.available
+
+
+def test_inbound_without_quota_is_unlimited():
+    load = InboundLoad.from_inbound("a", inbound(total=0, up=500, down=500, client_traffic=0))
+    assert load.remaining is None
+    assert load.available
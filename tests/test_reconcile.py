@@ -0,0 +1,89 @@
+import asyncio
+import time
+import pytest
+from benchmarks.fake_panel import make_client
+from database.crud import UsersRepo
+from service.panel_registry import PanelRegistry
+from service.reconcile import Reconciler
+
+
+@pytest.fixture
+async def reconciler(panel, panel_client):
+    # Distinct update times so that the high-water mark splits the clients
+    for index, client in enumerate(panel.inbounds[1].clients):
+        client["updated_at"] = 1000 + index
+    panel.inbounds[1]._settings_json = None
+    users = [f"user{i}" for i in range(10)]
+    await UsersRepo().import_users([(username, 100 + i) for i, username in enumerate(users)])
+    await UsersRepo().set_links([(username, "vless://old", None) for username in users])
+    reconciler = Reconciler(registry=PanelRegistry([panel_client], node_timeout=0.2), interval=0)
+    assert (await reconciler.reconcile()).dirty == 10
+    return reconciler
+
+
+async def stored_link(username: str):
+    return (await UsersRepo().get_links([username]))[username][0]
+
+
+def delete_client(panel, email: str) -> None:
+    inbound = panel.inbounds[1]
+    inbound.clients = [client for client in inbound.clients if client["email"] != email]
+    inbound._settings_json = None
+    del panel.emails[email]
+
+
+async def test_clients_below_high_water_mark_are_skipped(panel, panel_client, reconciler):
+    await UsersRepo().set_links([("user2", "vless://old", None)])
+    panel.inbounds[1].clients[5]["updated_at"] = 5000
+    panel.inbounds[1]._settings_json = None
+    panel_client.inbound_cache.invalidate()
+
+    report = await reconciler.reconcile()
+
+    # The client at the mark is checked again, the one updated since is new
+    assert report.dirty == 2
+    assert report.updated == []
+    assert not report.deletions_checked
+    assert await stored_link("user2") == "vless://old"
+
+    full = await reconciler.reconcile(full=True)
+    assert full.dirty == 10 and full.updated == ["user2"]
+
+
+async def test_deletions_use_fresh_snapshot(panel, panel_client, reconciler):
+    delete_client(panel, "user1")
+    panel_client.inbound_cache.invalidate()
+    await panel_client.inbound_cache.get()
+    # Created after the cached snapshot was loaded
+    panel.inbounds[1].add(make_client("newbie", int(time.time() * 1000)))
+    panel.emails["newbie"] = 1
+    await UsersRepo().import_users([("newbie", 200)])
+    await UsersRepo().set_links([("newbie", "vless://newbie", None)])
+
+    report = await reconciler.reconcile()
+
+    assert report.deletions_checked
+    assert report.cleared == ["user1"]
+    assert await stored_link("newbie") is not None
+
+
+async def test_deletions_are_skipped_while_a_node_does_not_answer(panel, panel_client, reconciler):
+    link = await stored_link("user1")
+    delete_client(panel, "user1")
+    panel_client.inbound_cache.invalidate()
+    await panel_client.inbound_cache.get()
+    panel.latency = 0.3
+
+    report = await reconciler.reconcile()
+
+    assert report.deletions_skipped and not report.deletions_checked
+    assert report.cleared == []
+    assert await stored_link("user1") == link
+
+    # The next run checks again once the late answer has been loaded
+    panel.latency = 0
+    while not panel_client.inbound_cache.is_fresh():
+        await asyncio.sleep(0.05)
+    report = await reconciler.reconcile()
+    assert report.cleared == ["user1"]
+    assert await stored_link("user1") is None
@@ -0,0 +1,80 @@
+import asyncio
+from service.reload_debouncer import ReloadDebouncer
+
+
+class Reloads:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.times = []
+
+    async def __call__(self) -> bool:
+        self.times.append(asyncio.get_running_loop().time())
+        return self.results.pop(0) if self.results else True
+
+
+async def test_burst_is_covered_by_one_reload_after_window():
+    reloads = Reloads()
+    debouncer = ReloadDebouncer("test", reloads, window=0.05, max_delay=1)
+    start = asyncio.get_running_loop().time()
+
+    for _ in range(10):
+        debouncer.schedule()
+        await asyncio.sleep(0.01)
+    assert reloads.times == []
+    await asyncio.sleep(0.1)
+
+    assert len(reloads.times) == 1
+    # The window restarts with every request
+    assert reloads.times[0] - start >= 0.09 + 0.05
+    assert debouncer.pending == 0
+
+
+async def test_steady_stream_is_reloaded_every_max_delay():
+    reloads = Reloads()
+    debouncer = ReloadDebouncer("test", reloads, window=0.05, max_delay=0.15)
+    start = asyncio.get_running_loop().time()
+
+    for _ in range(30):
+        debouncer.schedule()
+        await asyncio.sleep(0.02)
+
+    assert 2 <= len(reloads.times) <= 5
+    assert reloads.times[0] - start < 0.15 + 0.05
+
+
+async def test_failed_reload_is_retried_after_max_delay():
+    reloads = Reloads(False, True)
+    debouncer = ReloadDebouncer("test", reloads, window=0.01, max_delay=0.1)
+
+    debouncer.schedule()
+    await asyncio.sleep(0.05)
+    assert len(reloads.times) == 1 and debouncer.pending == 1
+
+    await asyncio.sleep(0.1)
+    assert len(reloads.times) == 2 and debouncer.pending == 0
+    assert reloads.times[1] - reloads.times[0] >= 0.1
+
+
+async def test_close_sends_waiting_reload_at_once():
+    reloads = Reloads()
+    debouncer = ReloadDebouncer("test", reloads, window=10, max_delay=10)
+    debouncer.schedule()
+    debouncer.schedule()
+
+    await debouncer.close()
+
+    assert len(reloads.times) == 1
+    await debouncer.close()
+    assert len(reloads.times) == 1
+
+
+async def test_panel_changes_share_one_reload(panel, panel_client):
+    panel_client.reloads = ReloadDebouncer("test", panel_client.reload_xray, window=0.05, max_delay=1)
+    inbound = (await panel_client.get_all_inbounds_lazy())[0]
+
+    for client in inbound.raw_clients[:5]:
+        assert await panel_client.update_client(inbound.id, {**client, "enable": False})
+    await asyncio.sleep(0.1)
+
+    assert panel.requests["updateClient"] == 5
+    assert panel.requests["reload"] == 1
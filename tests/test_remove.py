@@ -0,0 +1,109 @@
+import pytest
+from benchmarks.fake_panel import FakePanel
+from database.crud import UsersRepo
+from service.handlers import BotHandlers
+from service.panel_registry import panel_registry
+from service.threex_ui_client import ThreeXUIClient
+
+
+class Chat:
+    def __init__(self, username: str, chat_id: int):
+        self.username = username
+        self.id = chat_id
+
+
+class Message:
+    def __init__(self, username: str, chat_id: int = 1001, text: str = ""):
+        self.chat = Chat(username, chat_id)
+        self.text = text
+        self.answers = []
+
+    async def answer(self, text: str, **kwargs) -> None:
+        self.answers.append(text)
+
+
+@pytest.fixture
+async def nodes(monkeypatch):
+    panels = {"a": FakePanel(clients=3), "b": FakePanel(clients=3, seed=1)}
+    clients = {name: ThreeXUIClient(name=name, transport=panel) for name, panel in panels.items()}
+    monkeypatch.setattr(panel_registry, "nodes", clients)
+    monkeypatch.setattr(panel_registry, "node_timeout", 0.2)
+    for client in clients.values():
+        await client.login()
+    yield panels
+    for client in clients.values():
+        await client.close()
+
+
+async def store_link(username: str, tg_id: int = 1001) -> None:
+    repo = UsersRepo()
+    await repo.import_users([(username, tg_id)])
+    await repo.set_links([(username, "vless://stored", "sub-id")])
+
+
+async def stored_link(username: str):
+    return (await UsersRepo().get_links([username])).get(username)
+
+
+async def test_remove_deletes_client_on_every_node(nodes):
+    await store_link("user1")
+    message = Message("user1")
+
+    await BotHandlers().remove_client(message)
+
+    assert message.answers == ["✅ Профиль удалён"]
+    assert all("user1" not in panel.emails for panel in nodes.values())
+    assert await stored_link("user1") == (None, None)
+
+
+async def test_remove_keeps_link_when_a_node_does_not_answer(nodes):
+    await store_link("user1")
+    nodes["b"].latency = 1
+    message = Message("user1")
+
+    await BotHandlers().remove_client(message)
+
+    assert message.answers == ["❌ Не удалось удалить профиль: сервер недоступен. Попробуйте позже."]
+    assert "user1" in nodes["b"].emails
+    assert await stored_link("user1") == ("vless://stored", "sub-id")
+
+    # Once the node is back a retry finishes the removal
+    nodes["b"].latency = 0
+    retry = Message("user1")
+    await BotHandlers().remove_client(retry)
+    assert retry.answers == ["✅ Профиль удалён"]
+    assert "user1" not in nodes["b"].emails
+    assert await stored_link("user1") == (None, None)
+
+
+async def test_remove_without_client(nodes):
+    message = Message("nobody")
+
+    await BotHandlers().remove_client(message)
+
+    assert message.answers == ["У вас нет ни одного профиля"]
+    assert nodes["a"].requests["delClient"] == 0
+
+
+async def test_stale_link_is_cleared_only_when_every_node_answered(nodes):
+    await store_link("gone")
+    nodes["a"].latency = 1
+    message = Message("gone")
+
+    await BotHandlers().remove_client(message)
+    assert await stored_link("gone") == ("vless://stored", "sub-id")
+
+    nodes["a"].latency = 0
+    await BotHandlers().remove_client(message)
+    assert message.answers[-1] == "✅ Профиль удалён"
+    assert await stored_link("gone") == (None, None)
+
+
+async def test_bulk_remove_reports_failed_and_missing(nodes, monkeypatch):
+    monkeypatch.setattr("service.handlers.settings.ADMIN_IDS", [1])
+    nodes["b"].latency = 1
+    message = Message("admin", chat_id=1, text="/bulkremove user1 nobody")
+
+    await BotHandlers().bulk_remove(message)
+
+    assert message.answers == ["🗑 Удалено: 0 из 2\nНе удалены, повторите позже: user1, nobody"]
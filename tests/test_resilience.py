@@ -0,0 +1,112 @@
+import asyncio
+import time
+import pytest
+from service.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, hedged
+
+
+class Calls:
+    """Call factory with one delay and outcome per copy."""
+
+    def __init__(self, *plans):
+        self.plans = list(plans)
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        delay, outcome = self.plans[self.started]
+        self.started += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+async def test_fast_call_is_not_hedged():
+    calls, hedges = Calls((0, "first")), []
+
+    assert await hedged(calls, 0.05, lambda: hedges.append(1)) == "first"
+    assert calls.started == 1 and not hedges
+
+
+async def test_slow_call_is_raced_and_loser_cancelled():
+    calls, hedges = Calls((1, "first"), (0, "second")), []
+
+    assert await hedged(calls, 0.01, lambda: hedges.append(1)) == "second"
+    await asyncio.sleep(0)
+    assert calls.started == 2 and calls.cancelled == 1 and hedges == [1]
+
+
+async def test_failed_copy_waits_for_the_other():
+    calls = Calls((0.05, "first"), (0, RuntimeError("second")))
+
+    assert await hedged(calls, 0.01) == "first"
+
+
+async def test_both_copies_failing_raise_last_error():
+    calls = Calls((0.02, ValueError("first")), (0.04, RuntimeError("second")))
+
+    with pytest.raises(RuntimeError, match="second"):
+        await hedged(calls, 0.01)
+
+
+@pytest.mark.parametrize("cancel_after", [0.005, 0.02])
+async def test_cancelled_caller_leaves_no_copy_running(cancel_after):
+    calls = Calls((1, "first"), (1, "second"))
+    task = asyncio.ensure_future(hedged(calls, 0.01))
+    await asyncio.sleep(cancel_after)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+
+    assert calls.cancelled == calls.started
+
+
+def test_breaker_opens_after_threshold_and_probes_after_reset():
+    breaker = CircuitBreaker("test", threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    # One probe at a time
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow() and breaker.failures == 0
+
+
+def test_breaker_with_zero_threshold_never_opens():
+    breaker = CircuitBreaker("test", threshold=0, reset_timeout=30)
+    for _ in range(100):
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+async def test_open_circuit_stops_requests_to_failing_panel(panel, panel_client):
+    panel_client.breaker = CircuitBreaker("test", threshold=3, reset_timeout=30)
+    await panel_client.login()
+    panel.error_rate = 1.0
+
+    assert await panel_client.get_all_inbounds_lazy() is None
+    # The first call and its two retries each answered 500
+    assert panel.requests["list"] == 3
+    assert panel_client.breaker.state == OPEN
+
+    assert await panel_client.get_all_inbounds_lazy() is None
+    assert panel.requests["list"] == 3
+    with pytest.raises(CircuitOpenError):
+        await panel_client._send("GET", "/panel/api/inbounds/list")
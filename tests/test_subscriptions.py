@@ -0,0 +1,35 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from service.panel_registry import PanelRegistry
+from service.subscriptions import SubscriptionService
+
+
+@pytest.fixture
+async def subscriptions(panel, panel_client):
+    service = SubscriptionService(registry=PanelRegistry([panel_client]))
+    app = web.Application()
+    service.register(app, path="/sub")
+    async with TestClient(TestServer(app)) as client:
+        yield client
+
+
+async def test_matching_etag_is_answered_with_304(panel, subscriptions):
+    sub_id = panel.inbounds[1].clients[0]["subId"]
+
+    first = await subscriptions.get(f"/sub/{sub_id}")
+    assert first.status == 200
+    etag = first.headers["ETag"]
+    assert await first.read()
+
+    repeated = await subscriptions.get(f"/sub/{sub_id}", headers={"If-None-Match": etag})
+    assert repeated.status == 304
+    assert repeated.headers["ETag"] == etag
+    assert await repeated.read() == b""
+
+    stale = await subscriptions.get(f"/sub/{sub_id}", headers={"If-None-Match": '"other"'})
+    assert stale.status == 200
+
+
+async def test_unknown_subscription_is_404(subscriptions):
+    assert (await subscriptions.get("/sub/missing")).status == 404
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+import pytest
+from database.crud import PanelSessionRepo
+from schemas.clients import CreateClientSettings
+from service.threex_ui_client import ThreeXUIClient
+
+
+async def test_requests_share_one_pooled_client(panel, panel_client):
+    await panel_client.get_all_inbounds_lazy()
+    http = panel_client.client
+
+    await panel_client.get_inbound_lazy(1)
+    await panel_client.get_online()
+
+    assert panel_client.client is http
+    assert panel.requests["login"] == 1
+
+
+async def test_expired_session_is_renewed_and_request_resent(panel, panel_client):
+    await panel_client.get_all_inbounds_lazy()
+    panel._session = None
+
+    inbounds = await panel_client.get_all_inbounds_lazy()
+
+    assert inbounds is not None and len(inbounds[0].raw_clients) == 10
+    assert panel.requests["login"] == 2
+    # The rejected request and its resend after the login
+    assert panel.requests["list"] == 3
+
+
+async def test_write_after_expired_session_is_resent_once(panel, panel_client):
+    await panel_client.login()
+    panel._session = None
+
+    success, _ = await panel_client.add_clients(1, [CreateClientSettings(email="fresh")])
+
+    assert success
+    assert panel.requests["addClient"] == 2
+    assert "fresh" in panel.emails
+
+
+async def test_concurrent_requests_share_one_login(panel, panel_client):
+    await asyncio.gather(*(panel_client.get_inbound_lazy(1) for _ in range(10)))
+    assert panel.requests["login"] == 1
+
+    panel._session = None
+    inbounds = await asyncio.gather(*(panel_client.get_inbound_lazy(1) for _ in range(10)))
+
+    assert all(ib is not None and ib.id == 1 for ib in inbounds)
+    # Requests rejected with the same session wait for one re-login
+    assert panel.requests["login"] == 2
+
+
+async def test_stored_session_is_restored(panel, panel_client):
+    await panel_client.login()
+
+    restarted = ThreeXUIClient(name="test", transport=panel)
+    try:
+        assert await restarted.get_all_inbounds_lazy() is not None
+    finally:
+        await restarted.close()
+
+    assert panel.requests["login"] == 1
+
+
+@pytest.mark.parametrize("change", [
+    {"username": "other-admin"},
+    {"port": 1234},
+])
+async def test_stored_session_of_another_panel_or_user_is_ignored(panel, panel_client, change):
+    await panel_client.login()
+
+    other = ThreeXUIClient(name="test", transport=panel, **change)
+    try:
+        assert await other.get_all_inbounds_lazy() is not None
+    finally:
+        await other.close()
+
+    assert panel.requests["login"] == 2
+
+
+async def test_stored_session_about_to_expire_is_not_reused(panel, panel_client):
+    await panel_client.login()
+    stored = await PanelSessionRepo().get("test")
+    await PanelSessionRepo().save(
+        "test", stored.panel_url, stored.username, json.loads(stored.cookies),
+        int(time.time() + panel_client.session_refresh_before / 2),
+    )
+
+    restarted = ThreeXUIClient(name="test", transport=panel)
+    try:
+        assert await restarted.get_all_inbounds_lazy() is not None
+    finally:
+        await restarted.close()
+
+    assert panel.requests["login"] == 2
@@ -0,0 +1,119 @@
+import json
+import pytest
+from benchmarks.fake_panel import make_stream_settings
+from schemas.inbounds import LazyInbound
+from service.vless_links import VlessLinkBuilder
+
+UUID = "3f1c2d4e-0000-4000-8000-000000000001"
+
+
+def inbound(stream, protocol="vless", decryption="none", clients=()):
+    return LazyInbound({
+        "id": 1,
+        "port": 443,
+        "protocol": protocol,
+        "settings": json.dumps({"clients": list(clients), "decryption": decryption}),
+        "streamSettings": json.dumps(stream),
+    })
+
+
+def client(email="alice", flow=""):
+    return {"id": UUID, "email": email, "flow": flow}
+
+
+def tls(**settings):
+    return {"serverName": "vpn.example.com", "alpn": ["h2", "http/1.1"], "settings": settings}
+
+
+STREAMS = {
+    "tcp-reality": (
+        make_stream_settings(443),
+        "type=tcp&encryption=none&security=reality&pbk=public-key&fp=chrome"
+        "&sni=example.com&sid=0123abcd&spx=%2F&flow=xtls-rprx-vision",
+    ),
+    "tcp-http-none": (
+        {"network": "tcp", "security": "none", "tcpSettings": {
+            "acceptProxyProtocol": False,
+            "header": {"type": "http", "request": {"path": ["/a", "/b"], "headers": {"Host": ["h.example"]}}},
+        }},
+        "type=tcp&encryption=none&headerType=http&path=%2Fa%2C%2Fb&host=h.example&security=none",
+    ),
+    "ws-tls": (
+        {"network": "ws", "security": "tls", "wsSettings": {"path": "/ws", "headers": {"Host": "cdn.example"}},
+         "tlsSettings": tls(fingerprint="firefox", allowInsecure=True)},
+        "type=ws&encryption=none&path=%2Fws&host=cdn.example&security=tls&fp=firefox"
+        "&alpn=h2%2Chttp%2F1.1&allowInsecure=1&sni=vpn.example.com",
+    ),
+    "grpc-tls": (
+        {"network": "grpc", "security": "tls", "grpcSettings": {"serviceName": "svc", "multiMode": True},
+         "tlsSettings": tls()},
+        "type=grpc&encryption=none&serviceName=svc&mode=multi&security=tls"
+        "&alpn=h2%2Chttp%2F1.1&sni=vpn.example.com",
+    ),
+    "httpupgrade-none": (
+        {"network": "httpupgrade", "security": "none", "httpupgradeSettings": {"path": "/up", "host": "up.example"}},
+        "type=httpupgrade&encryption=none&path=%2Fup&host=up.example&security=none",
+    ),
+    "xhttp-reality": (
+        {**make_stream_settings(443), "network": "xhttp", "xhttpSettings": {"path": "/x", "mode": "packet-up"}},
+        "type=xhttp&encryption=none&path=%2Fx&mode=packet-up&security=reality&pbk=public-key"
+        "&fp=chrome&sni=example.com&sid=0123abcd&spx=%2F",
+    ),
+}
+
+
+@pytest.mark.parametrize("name", STREAMS)
+def test_link_per_transport_and_security(name):
+    stream, query = STREAMS[name]
+    builder = VlessLinkBuilder("panel.example", spx="2F")
+
+    links = builder.links(inbound(stream), client(flow="xtls-rprx-vision"))
+
+    assert links == [f"vless://{UUID}@panel.example:443?{query}#alice"]
+
+
+def test_external_proxies_get_own_links():
+    stream = make_stream_settings(443)
+    stream["externalProxy"] = [
+        {"forceTls": "same", "dest": "edge.example", "port": 8443, "remark": "edge"},
+        {"forceTls": "none", "dest": "2001:db8::1", "port": 80, "remark": "plain v6"},
+    ]
+    builder = VlessLinkBuilder("panel.example")
+
+    links = builder.links(inbound(stream), client(email="bob@home", flow="xtls-rprx-vision"))
+
+    assert links == [
+        f"vless://{UUID}@edge.example:8443?type=tcp&encryption=none&security=reality&pbk=public-key"
+        "&fp=chrome&sni=example.com&sid=0123abcd&spx=%2F&flow=xtls-rprx-vision#bob%40home-edge",
+        # Without TLS the security parameters and the flow are dropped
+        f"vless://{UUID}@[2001:db8::1]:80?type=tcp&encryption=none&security=none#bob%40home-plain%20v6",
+    ]
+
+
+def test_default_spider_x_and_decryption():
+    stream = make_stream_settings(443)
+    stream["realitySettings"]["settings"]["spiderX"] = ""
+    builder = VlessLinkBuilder("panel.example", spx="2Fpath")
+
+    [link] = builder.links(inbound(stream, decryption="mlkem768x25519plus"), client())
+
+    assert "encryption=mlkem768x25519plus" in link
+    assert "&spx=%2Fpath" in link
+    assert "flow=" not in link
+
+
+def test_non_vless_and_broken_inbounds_have_no_links():
+    builder = VlessLinkBuilder("panel.example")
+
+    assert builder.links(inbound(make_stream_settings(443), protocol="vmess"), client()) == []
+    assert builder.links(inbound({"security": "tls"}), client()) == []
+
+
+def test_template_is_compiled_once_per_inbound():
+    builder = VlessLinkBuilder("panel.example")
+    ib = inbound(make_stream_settings(443), clients=[client("alice"), client("bob")])
+
+    assert builder.template(ib) is builder.template(ib)
+    links = list(builder.iter_inbound(ib))
+    assert [email for email, _ in links] == ["alice", "bob"]
+    assert links[1][1] == builder.links(ib, client("bob"))[0]
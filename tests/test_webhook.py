@@ -0,0 +1,46 @@
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from service.web import SECRET_HEADER, WebhookUpdateServer
+
+
+@pytest.fixture
+async def bot():
+    bot = Bot("123456:test")
+    yield bot
+    await bot.session.close()
+
+
+@pytest.fixture
+async def webhook(bot):
+    server = WebhookUpdateServer(Dispatcher(), bot, path="/webhook", secret="s3cret", queue_size=1)
+    app = web.Application()
+    server.register(app)
+    async with TestClient(TestServer(app)) as client:
+        yield server, client
+
+
+def test_webhook_mode_requires_secret(bot):
+    with pytest.raises(ValueError, match="WEBHOOK_SECRET"):
+        WebhookUpdateServer(Dispatcher(), bot, secret="")
+
+
+@pytest.mark.parametrize("headers", [{}, {SECRET_HEADER: "wrong"}])
+async def test_update_without_valid_secret_is_rejected(webhook, headers):
+    server, client = webhook
+
+    response = await client.post("/webhook", json={"update_id": 1}, headers=headers)
+
+    assert response.status == 401
+    assert server.queue.empty()
+
+
+async def test_update_is_queued_until_queue_is_full(webhook):
+    server, client = webhook
+    headers = {SECRET_HEADER: "s3cret"}
+
+    assert (await client.post("/webhook", json={"update_id": 1}, headers=headers)).status == 200
+    assert (await client.post("/webhook", json={"update_id": 2}, headers=headers)).status == 503
+    assert (await client.post("/webhook", data="not json", headers=headers)).status == 400
+    assert server.queue.get_nowait().update_id == 1
@@ -0,0 +1,117 @@
+from sqlalchemy import select
+from database.base import db_manager
+from database.models import Users
+from database.write_buffer import UserWriteBuffer, released_username
+
+
+async def rows():
+    async with db_manager.get_session() as session:
+        result = await session.execute(select(Users.tg_id, Users.username, Users.vless_link).order_by(Users.tg_id))
+        return [tuple(row) for row in result]
+
+
+async def test_apply_shows_pending_user_and_link():
+    buffer = UserWriteBuffer(interval=60, batch_size=1000)
+    buffer.add_user("alice", 1)
+    buffer.set_link("alice", "vless://alice", "uuid-a")
+
+    by_name = buffer.apply(None, username="alice")
+    by_id = buffer.apply(None, tg_id=1)
+
+    for user in (by_name, by_id):
+        assert (user.username, user.tg_id, user.vless_link, user.vless_uuid) == (
+            "alice", 1, "vless://alice", "uuid-a")
+    assert buffer.apply(None, username="bob") is None
+    assert await rows() == []
+
+
+async def test_apply_merges_pending_rename_over_stored_row():
+    buffer = UserWriteBuffer(interval=60, batch_size=1000)
+    buffer.add_user("alice", 1)
+    buffer.set_link("alice", "vless://alice", "uuid-a")
+    await buffer.flush()
+    async with db_manager.get_session() as session:
+        stored = (await session.execute(select(Users).where(Users.tg_id == 1))).scalar_one()
+
+    buffer.add_user("alice2", 1)
+    user = buffer.apply(stored)
+
+    assert (user.id, user.username, user.tg_id) == (stored.id, "alice2", 1)
+    assert user.vless_link == "vless://alice"
+    # Rows without pending writes of their own are returned as they are
+    other = UserWriteBuffer(interval=60, batch_size=1000)
+    other.set_link("bob", None, None)
+    assert other.apply(stored) is stored
+
+
+async def test_flush_writes_users_and_links_in_one_go():
+    buffer = UserWriteBuffer(interval=60, batch_size=1000)
+    buffer.add_user("alice", 1)
+    buffer.add_user("bob", 2)
+    buffer.set_link("bob", "vless://bob", "uuid-b")
+
+    assert await buffer.flush() == 3
+
+    assert await rows() == [(1, "alice", None), (2, "bob", "vless://bob")]
+    assert buffer.pending == 0
+    assert buffer.apply(None, username="bob") is None
+
+
+async def test_username_taken_by_another_account():
+    buffer = UserWriteBuffer(interval=60, batch_size=1000)
+    buffer.add_user("alice", 1)
+    buffer.set_link("alice", "vless://alice", "uuid-a")
+    await buffer.flush()
+
+    # The username now belongs to account 2; account 1 has not been seen since
+    buffer.add_user("alice", 2)
+    await buffer.flush()
+
+    assert await rows() == [(1, released_username(1), None), (2, "alice", None)]
+
+
+async def test_username_swap_within_one_batch():
+    buffer = UserWriteBuffer(interval=60, batch_size=1000)
+    buffer.add_user("alice", 1)
+    buffer.set_link("alice", "vless://alice", "uuid-a")
+    await buffer.flush()
+
+    buffer.add_user("bob", 1)
+    buffer.add_user("alice", 2)
+    buffer.add_user("carol", 3)
+    buffer.add_user("carol", 4)
+    await buffer.flush()
+
+    # A renamed user keeps the row with its link; of two claims the latest wins
+    assert await rows() == [
+        (1, "bob", "vless://alice"), (2, "alice", None), (3, released_username(3), None), (4, "carol", None),
+    ]
+
+
+async def test_failed_batch_falls_back_to_row_by_row(monkeypatch):
+    buffer = UserWriteBuffer(interval=60, batch_size=1000)
+    write = buffer._write
+
+    async def fail_batches(users, links):
+        if len(users) + len(links) > 1:
+            raise RuntimeError("database is locked")
+        return await write(users, links)
+
+    monkeypatch.setattr(buffer, "_write", fail_batches)
+    buffer.add_user("alice", 1)
+    buffer.add_user("bob", 2)
+    buffer.set_link("bob", "vless://bob", "uuid-b")
+    await buffer.flush()
+
+    assert await rows() == [(1, "alice", None), (2, "bob", "vless://bob")]
+    assert buffer.pending == 0
+
+
+async def test_batch_size_triggers_flush():
+    buffer = UserWriteBuffer(interval=60, batch_size=2)
+    buffer.add_user("alice", 1)
+    buffer.add_user("bob", 2)
+
+    await buffer._flush_task
+
+    assert [row[1] for row in await rows()] == ["alice", "bob"]